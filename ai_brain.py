@@ -1,44 +1,117 @@
-import sqlite3
-import json
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
-import google.generativeai as genai
-from google.generativeai.types import FunctionDeclaration, Tool
+import re
+from typing import Awaitable, Callable, Dict, List, Optional
 import asyncio
+import threading
+import time
+from db_pool import db_connection
+from migrations import ensure_schema
+from occupancy import get_occupancy
+from reservations import reserve_table
+from restaurant_cache import get_cache
+from log_writer import get_log_writer, utc_timestamp
+from async_db import run_db
+from session_store import get_session_store
+from conversation_memory import get_conversation_memory, parse_history, shared_view
+from slot_extractor import extract_slots, is_past, should_book
+from keyword_matcher import get_keyword_matcher
+from metrics import Trace, get_counters, get_metrics, timed
+from intent_router import IntentMatch, get_intent_router, normalize
+from response_cache import CACHEABLE_TOOLS, get_response_cache, is_cacheable_question
+from llm_gateway import LLMUnavailable, RateLimitedError, StreamInterrupted, get_llm_gateway, is_transient
+from ai_tools import AITools
+from model_backends import GeminiBackend
 
 logger = logging.getLogger(__name__)
 
+CONTEXT_CACHE_TTL_MINUTES = 60
+# Сбой создания кэша контекста (сеть, квота) - без кэша до следующей попытки, паузы растут
+CONTEXT_CACHE_RETRY_BASE = 30.0  # секунд
+CONTEXT_CACHE_RETRY_MAX = 30 * 60.0
+# Кэш невозможен в принципе (инструкция меньше минимального размера, модель без кэша)
+_CACHE_UNSUPPORTED = re.compile(r'too small|min_total_token_count|not supported|does not support|unsupported', re.IGNORECASE)
+
+# Бюджет цикла function calling на одно сообщение
+MAX_AGENT_STEPS = 5
+AGENT_TIME_BUDGET = 25.0  # секунд
+
 class AIBrain:
    """
    Настоящий AI-мозг системы с Function Calling
    ИИ принимает решения, извлекает данные, управляет диалогом
    """
    
-   def __init__(self, gemini_key: str, db_path: str = 'restaurant.db'):
+   def __init__(self, gemini_key: str, db_path: str = 'restaurant.db', restaurant_id: int = 1,
+                prompt_mode: str = 'system', use_context_cache: bool = True, use_fast_path: bool = True,
+                use_response_cache: bool = True, use_direct_booking: bool = True, backend=None):
        self.db_path = db_path
+       self.restaurant_id = restaurant_id
+       ensure_schema(db_path)
        
-       # Настройка Gemini с Function Calling
-       genai.configure(api_key=gemini_key)
+       # Занятость столиков по интервалам
+       self.occupancy = get_occupancy(db_path)
        
-       # Создаем модель с tools
-       self.model = genai.GenerativeModel(
-           'gemini-1.5-flash',
-           tools=[Tool(function_declarations=self._get_function_declarations())]
-       )
+       # Кэш профиля ресторана и меню
+       self.cache = get_cache(db_path)
        
-       # Защита от Prompt Injection
-       self.dangerous_patterns = [
-           'ignore', 'forget', 'delete', 'system', 'admin', 'root',
-           'drop table', 'truncate', 'bypass', 'override', 'disable'
-       ]
+       # Логи диалогов и решений пишутся в фоне пакетами
+       self.log_writer = get_log_writer(db_path)
+       
+       # Последние реплики активных пользователей в памяти
+       self.sessions = get_session_store(db_path)
+       
+       # Контекст диалога в пределах бюджета токенов: сводка старых реплик и данные брони
+       self.memory = get_conversation_memory(db_path)
+       
+       # Все данные брони собраны - бронь без запроса к модели
+       self.use_direct_booking = use_direct_booking
+       
+       # Простые вопросы (часы, адрес, меню, мои брони) - по шаблону без Gemini
+       self.intents = get_intent_router()
+       self.use_fast_path = use_fast_path
+       
+       # Ответы ИИ на типовые вопросы о ресторане (меню, часы, адрес) по версии данных
+       self.response_cache = get_response_cache(db_path)
+       self.use_response_cache = use_response_cache
+       
+       # Все запросы к модели - через общий шлюз (лимиты, повторы, circuit breaker)
+       self.gateway = get_llm_gateway()
+       
+       # Ответы без модели, когда она недоступна
+       self.ai_tools = AITools(db_path, restaurant_id)
+       
+       # Бюджет цикла function calling
+       self.max_agent_steps = MAX_AGENT_STEPS
+       self.agent_time_budget = AGENT_TIME_BUDGET
+       
+       # Модель: Gemini или детерминированная замена без сети (model_backends.ScriptedBackend)
+       self.backend = backend or GeminiBackend(gemini_key)
+       
+       # Создаем модель с tools (описания функций в формат бэкенда)
+       self.tools = self.backend.create_tools(self._get_function_declarations())
+       self.model = self.backend.create_model(self.tools)
+       
+       # system - правила и профиль ресторана в системной инструкции (и в кэше контекста),
+       # inline - старый режим, все правила в тексте каждого сообщения
+       self.prompt_mode = prompt_mode
+       self.use_context_cache = use_context_cache
+       self._turn_model = None
+       self._turn_model_version = None
+       self._turn_model_expires = 0.0
+       self._cached_content = None
+       self._context_cache_failures = 0
+       self._context_cache_retry_at = 0.0
+       self._model_lock = threading.Lock()
+       
+       # Ключевые фразы эвристик (защита от Prompt Injection и др.) - один проход по тексту
+       self.keywords = get_keyword_matcher(restaurant_id)
        
        logger.info("🧠 AI-мозг инициализирован с Function Calling")
    
-   def _get_function_declarations(self) -> List[FunctionDeclaration]:
-       """Функции которые ИИ может вызывать"""
+   def _get_function_declarations(self) -> List[Dict]:
+       """Функции которые ИИ может вызывать (name, description, parameters)"""
        return [
-           FunctionDeclaration(
+           dict(
                name="search_tables",
                description="Найти доступные столики на дату и время",
                parameters={
@@ -52,7 +125,7 @@ class AIBrain:
                    "required": ["date", "time", "guests"]
                }
            ),
-           FunctionDeclaration(
+           dict(
                name="create_booking",
                description="Создать новое бронирование",
                parameters={
@@ -69,7 +142,7 @@ class AIBrain:
                    "required": ["name", "phone", "date", "time", "guests", "table_id"]
                }
            ),
-           FunctionDeclaration(
+           dict(
                name="find_bookings",
                description="Найти бронирования клиента по телефону",
                parameters={
@@ -80,7 +153,7 @@ class AIBrain:
                    "required": ["phone"]
                }
            ),
-           FunctionDeclaration(
+           dict(
                name="get_menu",
                description="Получить меню ресторана",
                parameters={
@@ -90,7 +163,7 @@ class AIBrain:
                    }
                }
            ),
-           FunctionDeclaration(
+           dict(
                name="get_restaurant_info",
                description="Получить информацию о ресторане",
                parameters={
@@ -102,12 +175,10 @@ class AIBrain:
    
    def sanitize_input(self, text: str) -> str:
        """Защита от Prompt Injection"""
-       text_lower = text.lower()
-       
-       for pattern in self.dangerous_patterns:
-           if pattern in text_lower:
-               logger.warning(f"🚨 Обнаружен опасный паттерн: {pattern}")
-               return "Извините, не могу обработать этот запрос."
+       patterns = self.keywords.phrases(text, 'injection')
+       if patterns:
+           logger.warning(f"🚨 Обнаружен опасный паттерн: {', '.join(sorted(patterns))}")
+           return "Извините, не могу обработать этот запрос."
        
        if len(text) > 2000:
            logger.warning(f"🚨 Слишком длинный текст: {len(text)}")
@@ -115,9 +186,12 @@ class AIBrain:
        
        return text
    
-   async def process_message(self, user_id: int, user_text: str, conversation_history: List[str]) -> str:
+   async def process_message(self, user_id: int, user_text: str, conversation_history: List[str],
+                             on_text: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
        """
        ГЛАВНАЯ ФУНКЦИЯ: ИИ обрабатывает сообщение и принимает решения
+       on_text - потоковый режим: фрагменты ответа передаются по мере генерации,
+       возвращается полный текст
        """
        try:
            # Защита от инъекций
@@ -125,11 +199,53 @@ class AIBrain:
            if clean_text != user_text:
                return clean_text
            
-           # Формируем контекст для ИИ
-           context = self._build_ai_context(user_id, user_text, conversation_history)
+           # Данные брони из сообщения - один раз, в память диалога клиента
+           if not self.memory.is_loaded(user_id, self.restaurant_id):
+               await run_db(self.memory.load, user_id, self.restaurant_id)
+           found = extract_slots(user_text)
+           before = self.memory.slots(user_id, self.restaurant_id)
+           slots = self.memory.pin(user_id, found, self.restaurant_id)
+           
+           # Быстрый путь: уверенное простое намерение - ответ из базы по шаблону
+           if self.use_fast_path:
+               answer = await self._try_fast_path(user_text)
+               if answer is not None:
+                   self._log_ai_decision(user_id, user_text, answer)
+                   return answer
+           
+           # Все данные брони есть - сразу create_booking (при конфликте или без столиков решает ИИ)
+           if self.use_direct_booking and should_book(user_text, before, found):
+               answer = await self._try_direct_booking(user_id, slots)
+               if answer is not None:
+                   self._log_ai_decision(user_id, user_text, answer)
+                   return answer
+           
+           # Кэш ответов: только вопросы о ресторане, не о пользователе и не о брони
+           cache_version = None
+           if self.use_response_cache and is_cacheable_question(user_text):
+               cache_version = await run_db(self.cache.version, self.restaurant_id)
+               cached = self.response_cache.get(self.restaurant_id, cache_version, user_text)
+               if cached is not None:
+                   logger.info("🗃️ Ответ из кэша ответов")
+                   self._log_ai_decision(user_id, user_text, cached)
+                   return cached
+           
+           # Формируем контекст для ИИ (память диалога и новое сообщение);
+           # ответ для кэша - без истории и данных клиента, иначе он уйдет другим клиентам
+           context = self._build_ai_context(user_id, user_text, conversation_history, shared=cache_version is not None)
            
            # ИИ анализирует и принимает решения
-           response = await self._call_ai_with_functions(context)
+           turn = {}
+           with timed('llm_turn'):
+               response = await self._call_ai_with_functions(context, on_text, turn, user_id)
+           
+           # В кэш - только полноценный ответ, для которого хватило данных ресторана
+           if cache_version is not None and turn.get('answered') and turn['tools'] and set(turn['tools']) <= CACHEABLE_TOOLS:
+               self.response_cache.put(self.restaurant_id, cache_version, user_text, response)
+           
+           # Бронь создана - дата, время и гости больше не закреплены
+           if turn.get('booked'):
+               self.memory.forget(user_id, self.restaurant_id)
            
            # Логируем действие ИИ
            self._log_ai_decision(user_id, user_text, response)
@@ -140,26 +256,134 @@ class AIBrain:
            logger.error(f"❌ Ошибка обработки сообщения: {e}")
            return "Извините, произошла техническая ошибка. Попробуйте еще раз."
    
-   def _build_ai_context(self, user_id: int, user_text: str, history: List[str]) -> str:
-       """Формируем контекст для ИИ"""
+   async def _try_fast_path(self, user_text: str) -> Optional[str]:
+       """Ответ без Gemini или None (намерение не распознано или для шаблона не хватает данных)"""
+       started = time.perf_counter()
+       match = self.intents.classify(user_text)
+       answer = None
+       if match is not None:
+           try:
+               answer = await run_db(self._answer_intent, match, user_text)
+           except Exception as e:
+               logger.error(f"❌ Ошибка быстрого ответа ({match.intent}): {e}")
+       
+       seconds = time.perf_counter() - started
+       self.intents.record(match, answer is not None, seconds)
+       if answer is not None:
+           logger.info(f"⚡ Быстрый ответ без ИИ: {match.intent} ({match.source}) за {seconds * 1000:.1f}мс")
+       return answer
+   
+   def _answer_intent(self, match: IntentMatch, user_text: str) -> Optional[str]:
+       """Шаблонный ответ на простое намерение из данных ресторана"""
+       if match.intent == 'my_bookings':
+           return self._answer_bookings(user_text)
+       if match.intent == 'menu':
+           return self._answer_menu(user_text)
+       
+       info = self._get_restaurant_info()
+       if not info.get("success"):
+           return None
+       
+       if match.intent == 'hours':
+           return f"Мы работаем {info['hours']}. Хотите забронировать столик?" if info['hours'] else None
+       if match.intent == 'address':
+           return f"Наш адрес: {info['address']}. Телефон для связи: {info['phone']}." if info['address'] else None
+       if match.intent == 'contacts':
+           return f"Телефон ресторана: {info['phone']}. Адрес: {info['address']}." if info['phone'] else None
+       if match.intent == 'greeting':
+           return info['greeting'] or f"Здравствуйте! Ресторан {info['name']} на связи. Чем могу помочь?"
+       return None
+   
+   def _answer_menu(self, user_text: str) -> Optional[str]:
+       """Меню целиком или одна категория, если она названа в вопросе"""
+       menu = self._get_menu()
+       if not menu.get("success") or not menu['menu']:
+           return None
+       
+       words = normalize(user_text).split()
+       categories = []
+       for item in menu['menu']:
+           if item['category'] not in categories:
+               categories.append(item['category'])
+       # Совпадение по основе слова: "горячего" -> "Горячие блюда", "десерты" -> "Десерты"
+       asked = [category for category in categories
+                if any(word[:5] == category.lower().replace('ё', 'е')[:5] for word in words if len(word) >= 5)]
+       
+       if not asked and 'меню' not in words and not any(word.startswith('блюд') for word in words):
+           return None  # "есть ли у вас ..." не про категорию меню - пусть решает ИИ
+       
+       lines = []
+       for category in asked or categories:
+           lines.append(f"\n{category}:")
+           for item in menu['menu']:
+               if item['category'] == category:
+                   lines.append(f"• {item['name']} - {item['price']}₽")
+       title = "Вот что у нас есть:" if asked else "Наше меню:"
+       return title + "\n" + "\n".join(lines).strip() + "\n\nЧто-нибудь подсказать или забронировать столик?"
+   
+   def _answer_bookings(self, user_text: str) -> Optional[str]:
+       """Брони по телефону из сообщения (без телефона уточнит ИИ)"""
+       phone = re.search(r'\+?\d[\d\s\-()]{8,}\d', user_text)
+       if not phone:
+           return None
+       phone = re.sub(r'[\s\-()]', '', phone.group())
+       
+       found = self._find_bookings(phone)
+       if not found.get("success"):
+           return None
+       if not found['bookings']:
+           return f"По номеру {phone} бронирований не найдено. Хотите забронировать столик?"
+       
+       lines = [f"Ваши бронирования по номеру {phone}:"]
+       for booking in found['bookings']:
+           table = f", столик №{booking['table_number']}" if booking['table_number'] else ""
+           lines.append(f"📅 {booking['date']} в {booking['time']}, гостей: {booking['guests']}{table} ({booking['status']})")
+       return "\n".join(lines)
+   
+   async def _try_direct_booking(self, user_id: int, slots: Dict) -> Optional[str]:
+       """Бронь по собранным данным без ИИ или None (нет подходящего столика или конфликт)"""
+       started = time.perf_counter()
+       try:
+           result = await run_db(self._book_directly, slots)
+       except Exception as e:
+           logger.error(f"❌ Ошибка прямого бронирования: {e}")
+           return None
+       
+       seconds = time.perf_counter() - started
+       get_metrics().record('direct_booking', seconds)
+       if result is None or not result.get("success"):
+           return None
+       
+       get_counters().add('direct_bookings', 1)
+       self.memory.forget(user_id, self.restaurant_id)
+       logger.info(f"⚡ Бронь #{result['booking_id']} без ИИ за {seconds * 1000:.1f}мс")
+       return (f"✅ Готово! Столик №{result['table_number']} забронирован на имя {slots['name']}: "
+               f"{slots['date']} в {slots['time']}, гостей: {slots['guests']}. "
+               f"Номер брони: {result['booking_id']}. Ждем вас!")
+   
+   def _book_directly(self, slots: Dict) -> Optional[Dict]:
+       """Самый маленький подходящий свободный столик и create_booking"""
+       if is_past(slots):
+           return None
+       found = self._search_tables(slots['date'], slots['time'], slots['guests'], slots.get('location'))
+       if not found.get("success") or not found['tables']:
+           return None
+       table = min(found['tables'], key=lambda table: table['seats'])
+       return self._create_booking(slots['name'], slots['phone'], slots['date'], slots['time'],
+                                   slots['guests'], table['id'])
+   
+   def _build_system_instruction(self) -> str:
+       """Статическая часть промпта: роль, правила и профиль ресторана (одна на ресторан)"""
        
        # Получаем информацию о ресторане
        restaurant_info = self._get_restaurant_context()
        
-       # Последние сообщения
-       recent_history = "\n".join(history[-5:]) if history else "Первое сообщение"
-       
-       context = f"""
+       return f"""
 Ты умный голосовой помощник ресторана. Ты ДОЛЖЕН использовать доступные функции для реальных действий.
 
 ИНФОРМАЦИЯ О РЕСТОРАНЕ:
 {restaurant_info}
 
-ИСТОРИЯ ДИАЛОГА:
-{recent_history}
-
-НОВОЕ СООБЩЕНИЕ КЛИЕНТА: {user_text}
-
 ИНСТРУКЦИИ:
 1. Анализируй что хочет клиент
 2. Если нужно найти столики - вызови search_tables
@@ -169,21 +393,103 @@ class AIBrain:
 6. ВСЕГДА используй функции для реальных действий, не выдумывай данные
 7. Отвечай кратко и по делу
 8. Будь вежливым и профессиональным
-
-Что будешь делать?
+9. Если create_booking вернул conflict - столик только что заняли, предложи клиенту столики из alternatives
+10. Можно вызывать несколько функций за один ответ и по цепочке (search_tables, затем create_booking) - не переспрашивай клиента, если данных достаточно
 """
+   
+   def _build_ai_context(self, user_id: int, user_text: str, history: List[str], shared: bool = False) -> str:
+       """
+       Формируем контекст для ИИ (только меняющаяся часть - память диалога и новое сообщение)
+       shared - вопрос о ресторане, ответ попадет в общий кэш: без истории и данных клиента
+       """
+       if shared:
+           view = shared_view(user_text)
+       else:
+           view = self.memory.build(user_id, user_text, parse_history(history), self.restaurant_id)
+       context = view.text
+       
+       # Размер запроса на каждую реплику
+       get_counters().add('context_tokens', view.tokens)
+       logger.info(f"🧠 Контекст ~{view.tokens} токенов: дословно {view.verbatim} реплик, "
+                   f"в сводке {view.summarized}, данных брони {view.slots}")
+       
+       # Старый режим: все правила в каждом сообщении (для сравнения в benchmark_prompt_tokens.py)
+       if self.prompt_mode == 'inline':
+           context = self._build_system_instruction() + context + "\nЧто будешь делать?\n"
        return context
    
+   def _get_model(self):
+       """
+       Модель с системной инструкцией ресторана
+       Пересоздается при изменении профиля (версия данных) или истечении кэша контекста
+       """
+       if self.prompt_mode == 'inline':
+           return self.model
+       
+       version = self.cache.version(self.restaurant_id)
+       with self._model_lock:
+           if self._turn_model is not None and self._turn_model_version == version and time.monotonic() < self._turn_model_expires:
+               return self._turn_model
+           
+           instruction = self._build_system_instruction()
+           model = None
+           if self.use_context_cache and time.monotonic() >= self._context_cache_retry_at:
+               model = self._cached_model(instruction)
+           if model is None:
+               model = self.backend.create_model(self.tools, instruction)
+               # Кэш отложен после сбоя - модель живет до следующей попытки
+               self._turn_model_expires = self._context_cache_retry_at if self.use_context_cache else float('inf')
+           
+           self._turn_model = model
+           self._turn_model_version = version
+           return model
+   
+   def _cached_model(self, instruction: str):
+       """Модель поверх кэша контекста (None, если кэш недоступен)"""
+       try:
+           if self._cached_content is not None:
+               try:
+                   self.backend.delete_cached(self._cached_content)
+               except Exception:
+                   pass
+               self._cached_content = None
+           
+           model, self._cached_content = self.backend.create_cached_model(
+               self.tools, instruction, f"restaurant-{self.restaurant_id}", CONTEXT_CACHE_TTL_MINUTES
+           )
+           # Пересоздаем заранее, до истечения TTL на стороне Gemini
+           self._turn_model_expires = time.monotonic() + CONTEXT_CACHE_TTL_MINUTES * 60 - 60
+           self._context_cache_failures = 0
+           logger.info(f"🗂️ Кэш контекста создан для ресторана #{self.restaurant_id}")
+           return model
+           
+       except Exception as e:
+           if _CACHE_UNSUPPORTED.search(str(e)):
+               # Инструкция короче минимального размера кэша - работаем без него
+               logger.info(f"ℹ️ Кэш контекста недоступен, использую системную инструкцию: {e}")
+               self.use_context_cache = False
+               return None
+           
+           # Временный сбой - системная инструкция сейчас, кэш позже
+           self._context_cache_failures += 1
+           delay = min(CONTEXT_CACHE_RETRY_MAX, CONTEXT_CACHE_RETRY_BASE * 2 ** (self._context_cache_failures - 1))
+           self._context_cache_retry_at = time.monotonic() + delay
+           logger.warning(f"⚠️ Не удалось создать кэш контекста, повтор через {delay:.0f} с: {e}")
+           return None
+   
+   def _record_usage(self, response, trace: Trace):
+       """Токены запроса к модели из usage_metadata"""
+       usage = getattr(response, 'usage_metadata', None)
+       if usage is None:
+           return
+       trace.count('prompt_tokens', getattr(usage, 'prompt_token_count', 0) or 0)
+       trace.count('cached_tokens', getattr(usage, 'cached_content_token_count', 0) or 0)
+       trace.count('output_tokens', getattr(usage, 'candidates_token_count', 0) or 0)
+   
    def _get_restaurant_context(self) -> str:
        """Получаем информацию о ресторане для контекста"""
        try:
-           conn = sqlite3.connect(self.db_path)
-           cursor = conn.cursor()
-           
-           cursor.execute("SELECT name, phone, address, working_hours FROM restaurants WHERE id = 1")
-           restaurant = cursor.fetchone()
-           
-           conn.close()
+           restaurant = self._get_restaurant_row()
            
            if restaurant:
                return f"Ресторан: {restaurant[0]}, Телефон: {restaurant[1]}, Адрес: {restaurant[2]}, Часы работы: {restaurant[3]}"
@@ -194,37 +500,193 @@ class AIBrain:
            logger.error(f"❌ Ошибка получения контекста ресторана: {e}")
            return "Ошибка загрузки информации о ресторане"
    
-   async def _call_ai_with_functions(self, context: str) -> str:
-       """Вызов ИИ с возможностью использования функций"""
+   def _get_restaurant_row(self):
+       """Профиль ресторана из кэша (запрос к базе только после изменения данных)"""
+       def load(conn):
+           return conn.execute("""
+               SELECT name, phone, address, working_hours, greeting_message, ai_personality
+               FROM restaurants WHERE id = ?
+           """, (self.restaurant_id,)).fetchone()
+       
+       return self.cache.get(self.restaurant_id, 'profile', load)
+   
+   async def _call_ai_with_functions(self, context: str,
+                                     on_text: Optional[Callable[[str], Awaitable[None]]] = None,
+                                     turn: Optional[Dict] = None, user_id: Optional[int] = None) -> str:
+       """
+       Цикл вызова ИИ с функциями
+       Все function_call из ответа выполняются параллельно, результаты
+       возвращаются модели, и так до текстового ответа или исчерпания
+       бюджета шагов / времени
+       turn заполняется итогами: вызванные функции (tools) и answered - ответ
+       модели, а не сообщение об ошибке или таймауте
+       """
+       turn = turn if turn is not None else {}
+       turn['tools'] = []
+       turn['answered'] = False
+       turn['booked'] = False
+       trace = Trace(get_metrics())
+       deadline = time.monotonic() + self.agent_time_budget
+       contents = [{'role': 'user', 'parts': [context]}]
+       streamed: List[str] = []
+       
+       async def emit(piece: str):
+           streamed.append(piece)
+           await on_text(piece)
+       
        try:
-           # Отправляем запрос к ИИ
-           response = await asyncio.to_thread(self.model.generate_content, context)
-           
-           # Проверяем использовал ли ИИ функции
-           if response.candidates[0].content.parts:
-               for part in response.candidates[0].content.parts:
-                   if hasattr(part, 'function_call') and part.function_call:
-                       # ИИ вызвал функцию - выполняем её
-                       function_result = await self._execute_function(part.function_call)
-                       
-                       # Отправляем результат функции обратно ИИ
-                       follow_up = await asyncio.to_thread(self.model.generate_content, [
-                           context,
-                           response,
-                           genai.types.FunctionResponse(
-                               name=part.function_call.name,
-                               response=function_result
-                           )
-                       ])
-                       
-                       return follow_up.text
-           
-           # ИИ ответил без функций
-           return response.text
+           # Модель с системной инструкцией ресторана (профиль может потребовать запрос к базе)
+           with trace.step("model"):
+               model = await asyncio.to_thread(self._get_model)
+           
+           for step in range(1, self.max_agent_steps + 1):
+               remaining = deadline - time.monotonic()
+               if remaining <= 0:
+                   break
+               
+               # Ответ - текст только итогового шага, без текста шагов с вызовом функций
+               streamed.clear()
+               response = await self._generate(model, contents, remaining, trace, f"llm#{step}",
+                                               emit if on_text else None, user_id)
+               
+               content = response.candidates[0].content
+               calls = [part.function_call for part in content.parts
+                        if getattr(part, 'function_call', None) and part.function_call.name]
+               
+               # ИИ ответил без функций
+               if not calls:
+                   turn['answered'] = True
+                   return ''.join(streamed) if streamed else response.text
+               
+               turn['tools'].extend(call.name for call in calls)
+               
+               # Независимые вызовы одного шага - параллельно
+               results = await asyncio.gather(*(self._execute_traced(call, trace) for call in calls))
+               turn['booked'] = turn['booked'] or any(
+                   call.name == 'create_booking' and result.get('success') for call, result in zip(calls, results)
+               )
+               
+               contents.append(content)
+               contents.append({
+                   'role': 'user',
+                   'parts': [
+                       self.backend.function_response(call.name, result)
+                       for call, result in zip(calls, results)
+                   ]
+               })
            
+           # Бюджет исчерпан - просим итоговый ответ без функций
+           remaining = deadline - time.monotonic()
+           if remaining > 0:
+               streamed.clear()
+               logger.warning(f"⚠️ Бюджет шагов ИИ исчерпан ({self.max_agent_steps}), запрашиваю итоговый ответ")
+               response = await self._generate(model, contents, remaining, trace, "llm#final",
+                                               emit if on_text else None, user_id,
+                                               tool_config={'function_calling_config': {'mode': 'NONE'}})
+               return ''.join(streamed) if streamed else response.text
+           
+           logger.warning(f"⏱️ Бюджет времени ИИ исчерпан ({self.agent_time_budget} с)")
+           return "Извините, обработка заняла слишком много времени. Попробуйте еще раз."
+           
+       except asyncio.TimeoutError:
+           logger.warning(f"⏱️ Бюджет времени ИИ исчерпан ({self.agent_time_budget} с)")
+           return "Извините, обработка заняла слишком много времени. Попробуйте еще раз."
+       except RateLimitedError as e:
+           logger.warning(f"🚦 Лимит запросов к ИИ: {e}")
+           return "Вы отправляете сообщения слишком часто. Подождите немного и повторите, пожалуйста."
+       except LLMUnavailable as e:
+           logger.warning(f"🔌 ИИ недоступен: {e}")
+           return self.ai_tools.get_fallback_response('error')
        except Exception as e:
            logger.error(f"❌ Ошибка вызова ИИ: {e}")
+           if is_transient(e):
+               # Повторы шлюза не помогли
+               return self.ai_tools.get_fallback_response('error')
            return "Извините, не могу обработать ваш запрос в данный момент."
+       finally:
+           logger.info(f"⏱️ Шаги ИИ: {trace.format()}")
+   
+   async def _generate(self, model, contents, timeout: float, trace: Trace, name: str,
+                       on_text: Optional[Callable[[str], Awaitable[None]]] = None,
+                       user_id: Optional[int] = None, **kwargs):
+       """
+       Один запрос к модели через шлюз (очередь, лимиты, повторы)
+       С on_text ответ читается потоком (stream=True) в потоке шлюза, текст
+       передается по мере генерации, а возвращается собранный ответ целиком.
+       Шаг с вызовом функции - не ответ клиенту: после function_call текст
+       шага в on_text не передается
+       """
+       if on_text is None:
+           with trace.step(name):
+               response = await self.gateway.call(model.generate_content, contents, user_id=user_id,
+                                                  timeout=timeout, **kwargs)
+           self._record_usage(response, trace)
+           return response
+       
+       loop = asyncio.get_running_loop()
+       pieces: asyncio.Queue = asyncio.Queue()
+       
+       def produce():
+           emitted = False
+           calling = False
+           try:
+               response = model.generate_content(contents, stream=True, **kwargs)
+               for chunk in response:
+                   calling = calling or self._chunk_has_call(chunk)
+                   text = self._chunk_text(chunk)
+                   if text and not calling:
+                       emitted = True
+                       loop.call_soon_threadsafe(pieces.put_nowait, text)
+               return response
+           except Exception as e:
+               if emitted:
+                   raise StreamInterrupted(str(e)) from e
+               raise
+       
+       started = time.perf_counter()
+       ends_at = time.monotonic() + timeout
+       first = True
+       with trace.step(name):
+           producer = asyncio.ensure_future(self.gateway.call(produce, user_id=user_id, timeout=timeout))
+           # Конец потока - когда шлюз закончил (с повторами) или сдался
+           producer.add_done_callback(lambda _: pieces.put_nowait(None))
+           try:
+               while True:
+                   piece = await asyncio.wait_for(pieces.get(), max(0.0, ends_at - time.monotonic()))
+                   if piece is None:
+                       break
+                   if first:
+                       trace.add(f"{name}:first_text", time.perf_counter() - started)
+                       first = False
+                   await on_text(piece)
+           finally:
+               # По таймауту шлюз сам завершит запрос, его ошибка уже никому не нужна
+               if not producer.done():
+                   producer.add_done_callback(lambda task: task.cancelled() or task.exception())
+           response = await producer
+       self._record_usage(response, trace)
+       return response
+   
+   @staticmethod
+   def _chunk_text(chunk) -> str:
+       """Текст фрагмента потока (chunk.text падает на фрагментах с function_call)"""
+       try:
+           parts = chunk.candidates[0].content.parts
+       except (AttributeError, IndexError):
+           return ''
+       return ''.join(part.text for part in parts if getattr(part, 'text', ''))
+   
+   @staticmethod
+   def _chunk_has_call(chunk) -> bool:
+       try:
+           parts = chunk.candidates[0].content.parts
+       except (AttributeError, IndexError):
+           return False
+       return any(getattr(part, 'function_call', None) and part.function_call.name for part in parts)
+   
+   async def _execute_traced(self, function_call, trace: Trace) -> Dict:
+       with trace.step(f"tool:{function_call.name}"):
+           return await self._execute_function(function_call)
    
    async def _execute_function(self, function_call) -> Dict:
        """Выполнение функции которую вызвал ИИ"""
@@ -235,15 +697,15 @@ class AIBrain:
        
        try:
            if function_name == "search_tables":
-               return self._search_tables(**args)
+               return await run_db(self._search_tables, **args)
            elif function_name == "create_booking":
-               return self._create_booking(**args)
+               return await run_db(self._create_booking, **args)
            elif function_name == "find_bookings":
-               return self._find_bookings(**args)
+               return await run_db(self._find_bookings, **args)
            elif function_name == "get_menu":
-               return self._get_menu(**args)
+               return await run_db(self._get_menu, **args)
            elif function_name == "get_restaurant_info":
-               return self._get_restaurant_info()
+               return await run_db(self._get_restaurant_info)
            else:
                return {"error": f"Неизвестная функция: {function_name}"}
                
@@ -252,28 +714,13 @@ class AIBrain:
            return {"error": f"Ошибка выполнения функции: {str(e)}"}
    
    def _log_ai_decision(self, user_id: int, user_text: str, ai_response: str):
-       """Логирование решений ИИ"""
+       """Логирование решений ИИ (в очередь фоновой записи)"""
        try:
-           conn = sqlite3.connect(self.db_path)
-           cursor = conn.cursor()
-           
-           cursor.execute("""
-               CREATE TABLE IF NOT EXISTS ai_decisions_log (
-                   id INTEGER PRIMARY KEY AUTOINCREMENT,
-                   user_id INTEGER,
-                   user_message TEXT,
-                   ai_response TEXT,
-                   timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-               )
-           """)
-           
-           cursor.execute("""
-               INSERT INTO ai_decisions_log (user_id, user_message, ai_response)
-               VALUES (?, ?, ?)
-           """, (user_id, user_text, ai_response))
-           
-           conn.commit()
-           conn.close()
+           self.log_writer.write(
+               'ai_decisions_log',
+               ('restaurant_id', 'user_id', 'user_message', 'ai_response', 'timestamp'),
+               (self.restaurant_id, user_id, user_text, ai_response, utc_timestamp())
+           )
            
        except Exception as e:
            logger.error(f"❌ Ошибка логирования: {e}")
@@ -283,45 +730,36 @@ class AIBrain:
    def _search_tables(self, date: str, time: str, guests: int, location: str = None) -> Dict:
        """Поиск доступных столиков"""
        try:
-           conn = sqlite3.connect(self.db_path)
-           cursor = conn.cursor()
-           
-           # Базовый запрос
-           query = """
-               SELECT t.id, t.table_number, t.seats_count, t.location_type, t.description
-               FROM tables t
-               WHERE t.restaurant_id = 1 
-               AND t.status = 'active'
-               AND t.seats_count >= ?
-           """
-           params = [guests]
-           
-           # Фильтр по расположению
-           if location:
-               query += " AND t.location_type = ?"
-               params.append(location)
-           
-           cursor.execute(query, params)
-           all_tables = cursor.fetchall()
-           
-           # Проверяем занятость
-           cursor.execute("""
-               SELECT DISTINCT table_id 
-               FROM bookings 
-               WHERE booking_date = ? 
-               AND booking_time = ? 
-               AND status != 'отменено'
-               AND table_id IS NOT NULL
-           """, (date, time))
-           
-           occupied_ids = [row[0] for row in cursor.fetchall()]
-           conn.close()
+           with db_connection(self.db_path) as conn:
+               cursor = conn.cursor()
+               
+               # Базовый запрос
+               query = """
+                   SELECT t.id, t.table_number, t.seats_count, t.location_type, t.description
+                   FROM tables t
+                   WHERE t.restaurant_id = ? 
+                   AND t.status = 'active'
+                   AND t.seats_count >= ?
+               """
+               params = [self.restaurant_id, guests]
+               
+               # Фильтр по расположению
+               if location:
+                   query += " AND t.location_type = ?"
+                   params.append(location)
+               
+               cursor.execute(query, params)
+               all_tables = cursor.fetchall()
+           
+           # Проверяем занятость по интервалам посадки
+           free_ids = set(self.occupancy.free_tables(date, time, guests, [table[0] for table in all_tables],
+                                                     restaurant_id=self.restaurant_id))
            
            # Свободные столики
            available = []
            for table in all_tables:
                table_id, number, seats, loc, desc = table
-               if table_id not in occupied_ids:
+               if table_id in free_ids:
                    available.append({
                        'id': table_id,
                        'number': number,
@@ -341,50 +779,10 @@ class AIBrain:
            return {"success": False, "error": str(e)}
    
    def _create_booking(self, name: str, phone: str, date: str, time: str, guests: int, table_id: int, requests: str = "") -> Dict:
-       """Создание бронирования"""
+       """Создание бронирования (атомарно, с альтернативами при конфликте)"""
        try:
-           conn = sqlite3.connect(self.db_path)
-           cursor = conn.cursor()
-           
-           # Проверяем свободен ли столик
-           cursor.execute("""
-               SELECT COUNT(*) FROM bookings 
-               WHERE table_id = ? 
-               AND booking_date = ? 
-               AND booking_time = ? 
-               AND status != 'отменено'
-           """, (table_id, date, time))
-           
-           if cursor.fetchone()[0] > 0:
-               conn.close()
-               return {"success": False, "error": "Столик уже занят на это время"}
-           
-           # Создаем бронирование
-           cursor.execute("""
-               INSERT INTO bookings 
-               (restaurant_id, table_id, customer_name, customer_phone, booking_date, booking_time, guests_count, status, special_requests)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-           """, (1, table_id, name, phone, date, time, guests, 'новое', requests))
-           
-           booking_id = cursor.lastrowid
-           
-           # Получаем инфо о столике
-           cursor.execute("""
-               SELECT table_number, location_type, description
-               FROM tables WHERE id = ?
-           """, (table_id,))
-           
-           table_info = cursor.fetchone()
-           conn.commit()
-           conn.close()
-           
-           return {
-               "success": True,
-               "booking_id": booking_id,
-               "table_number": table_info[0],
-               "table_location": table_info[1],
-               "table_description": table_info[2]
-           }
+           return reserve_table(self.db_path, table_id, name, phone, date, time, guests, requests,
+                                restaurant_id=self.restaurant_id)
            
        except Exception as e:
            logger.error(f"❌ Ошибка создания бронирования: {e}")
@@ -393,22 +791,21 @@ class AIBrain:
    def _find_bookings(self, phone: str) -> Dict:
        """Поиск бронирований клиента"""
        try:
-           conn = sqlite3.connect(self.db_path)
-           cursor = conn.cursor()
-           
-           cursor.execute("""
-               SELECT b.id, b.customer_name, b.booking_date, b.booking_time, 
-                      b.guests_count, b.status, b.special_requests, 
-                      t.table_number, t.location_type
-               FROM bookings b
-               LEFT JOIN tables t ON b.table_id = t.id
-               WHERE b.customer_phone = ? 
-               ORDER BY b.booking_date DESC, b.booking_time DESC
-               LIMIT 10
-           """, (phone,))
-           
-           bookings = cursor.fetchall()
-           conn.close()
+           with db_connection(self.db_path) as conn:
+               cursor = conn.cursor()
+               
+               cursor.execute("""
+                   SELECT b.id, b.customer_name, b.booking_date, b.booking_time, 
+                          b.guests_count, b.status, b.special_requests, 
+                          t.table_number, t.location_type
+                   FROM bookings b
+                   LEFT JOIN tables t ON b.table_id = t.id
+                   WHERE b.restaurant_id = ? AND b.customer_phone = ? 
+                   ORDER BY b.booking_date DESC, b.booking_time DESC
+                   LIMIT 10
+               """, (self.restaurant_id, phone))
+               
+               bookings = cursor.fetchall()
            
            result = []
            for booking in bookings:
@@ -437,24 +834,20 @@ class AIBrain:
    def _get_menu(self, category: str = None) -> Dict:
        """Получение меню"""
        try:
-           conn = sqlite3.connect(self.db_path)
-           cursor = conn.cursor()
-           
-           if category:
-               cursor.execute("""
-                   SELECT name, description, price FROM menu_items 
-                   WHERE category = ? AND restaurant_id = 1
-                   ORDER BY name
-               """, (category,))
-           else:
-               cursor.execute("""
+           def load(conn):
+               if category:
+                   return conn.execute("""
+                       SELECT name, description, price FROM menu_items 
+                       WHERE category = ? AND restaurant_id = ?
+                       ORDER BY name
+                   """, (category, self.restaurant_id)).fetchall()
+               return conn.execute("""
                    SELECT category, name, description, price FROM menu_items 
-                   WHERE restaurant_id = 1
+                   WHERE restaurant_id = ?
                    ORDER BY category, name
-               """)
+               """, (self.restaurant_id,)).fetchall()
            
-           items = cursor.fetchall()
-           conn.close()
+           items = self.cache.get(self.restaurant_id, ('menu', category), load)
            
            menu_data = []
            for item in items:
@@ -485,16 +878,7 @@ class AIBrain:
    def _get_restaurant_info(self) -> Dict:
        """Информация о ресторане"""
        try:
-           conn = sqlite3.connect(self.db_path)
-           cursor = conn.cursor()
-           
-           cursor.execute("""
-               SELECT name, phone, address, working_hours, greeting_message, ai_personality
-               FROM restaurants WHERE id = 1
-           """)
-           
-           restaurant = cursor.fetchone()
-           conn.close()
+           restaurant = self._get_restaurant_row()
            
            if restaurant:
                return {
@@ -514,46 +898,41 @@ class AIBrain:
            return {"success": False, "error": str(e)}
    
    def save_conversation(self, user_id: int, user_name: str, message_text: str, bot_response: str):
-       """Сохранение диалога"""
+       """Сохранение диалога (в память сессии и в очередь фоновой записи)"""
        try:
-           conn = sqlite3.connect(self.db_path)
-           cursor = conn.cursor()
-           
-           cursor.execute("""
-               INSERT INTO conversations (user_id, user_name, message_text, bot_response)
-               VALUES (?, ?, ?, ?)
-           """, (user_id, user_name, message_text, bot_response))
-           
-           conn.commit()
-           conn.close()
+           self.sessions.record(user_id, user_name, message_text, bot_response, self.restaurant_id)
+           self.memory.observe(user_id, self.restaurant_id)
            
        except Exception as e:
            logger.error(f"❌ Ошибка сохранения диалога: {e}")
    
    def get_conversation_history(self, user_id: int, limit: int = 10) -> List[str]:
-       """Получение истории диалогов"""
+       """Получение истории диалогов (из памяти, база - только при первом обращении)"""
        try:
-           conn = sqlite3.connect(self.db_path)
-           cursor = conn.cursor()
-           
-           cursor.execute("""
-               SELECT message_text, bot_response FROM conversations 
-               WHERE user_id = ? 
-               ORDER BY timestamp DESC 
-               LIMIT ?
-           """, (user_id, limit))
-           
-           history = cursor.fetchall()
-           conn.close()
-           
-           # Формируем список диалогов
-           result = []
-           for message, response in reversed(history):
-               result.append(f"Клиент: {message}")
-               result.append(f"Бот: {response}")
-           
-           return result
+           return self._format_history(self.sessions.history(user_id, limit, self.restaurant_id))
            
        except Exception as e:
            logger.error(f"❌ Ошибка получения истории: {e}")
-           return []
\ No newline at end of file
+           return []
+   
+   @staticmethod
+   def _format_history(turns) -> List[str]:
+       """Формируем список диалогов"""
+       result = []
+       for message, response in turns:
+           result.append(f"Клиент: {message}")
+           result.append(f"Бот: {response}")
+       return result
+   
+   # ========== ASYNC-API ДЛЯ ОБРАБОТЧИКОВ TELEGRAM ==========
+   
+   async def get_conversation_history_async(self, user_id: int, limit: int = 10) -> List[str]:
+       """История диалогов без блокировки event loop"""
+       turns = self.sessions.peek(user_id, limit, self.restaurant_id)
+       if turns is not None:
+           return self._format_history(turns)
+       return await run_db(self.get_conversation_history, user_id, limit)
+   
+   async def get_restaurant_info_async(self) -> Dict:
+       """Информация о ресторане без блокировки event loop"""
+       return await run_db(self._get_restaurant_info)
\ No newline at end of file
@@ -1,12 +1,32 @@
-import sqlite3
 import re
 from datetime import datetime, timedelta
+from db_pool import db_connection
+from migrations import ensure_schema
+from occupancy import get_occupancy, parse_time, format_time
+from reservations import reserve_table
+from log_writer import get_log_writer, utc_timestamp
+from async_db import AsyncProxy
+from keyword_matcher import get_keyword_matcher
 
 class AITools:
     """Инструменты для AI с поддержкой confidence scoring, fallback логики и работы со столиками"""
     
-    def __init__(self, db_path='restaurant.db'):
+    def __init__(self, db_path='restaurant.db', restaurant_id=1):
         self.db_path = db_path
+        self.restaurant_id = restaurant_id
+        ensure_schema(db_path)
+        
+        # Занятость столиков по интервалам
+        self.occupancy = get_occupancy(db_path)
+        
+        # Фоновая пакетная запись логов
+        self.log_writer = get_log_writer(db_path)
+        
+        # Словари эвристик (уверенность, просьба позвать человека, предпочтения) - один проход по тексту
+        self.keywords = get_keyword_matcher(restaurant_id)
+        
+        # Async-доступ для обработчиков бота: await tools.aio.get_available_tables(...)
+        self.aio = AsyncProxy(self)
         
         # Fallback фразы для разных ситуаций
         self.fallback_phrases = {
@@ -37,45 +57,36 @@ class AITools:
     def get_available_tables(self, date, time, guests_count, location_preference=None):
         """Получить доступные столики на дату и время"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Получаем все подходящие столики
-            query = """
-                SELECT t.id, t.table_number, t.seats_count, t.location_type, t.description
-                FROM tables t
-                WHERE t.restaurant_id = 1 
-                AND t.status = 'active'
-                AND t.seats_count >= ?
-            """
-            params = [guests_count]
-            
-            # Добавляем фильтр по типу расположения если указан
-            if location_preference:
-                query += " AND t.location_type = ?"
-                params.append(location_preference)
-            
-            cursor.execute(query, params)
-            all_tables = cursor.fetchall()
-            
-            # Проверяем какие столики заняты на указанное время
-            cursor.execute("""
-                SELECT DISTINCT table_id 
-                FROM bookings 
-                WHERE booking_date = ? 
-                AND booking_time = ? 
-                AND status != 'отменено'
-                AND table_id IS NOT NULL
-            """, (date, time))
-            
-            occupied_table_ids = [row[0] for row in cursor.fetchall()]
-            conn.close()
+            with db_connection(self.db_path) as conn:
+                cursor = conn.cursor()
+                
+                # Получаем все подходящие столики
+                query = """
+                    SELECT t.id, t.table_number, t.seats_count, t.location_type, t.description
+                    FROM tables t
+                    WHERE t.restaurant_id = ? 
+                    AND t.status = 'active'
+                    AND t.seats_count >= ?
+                """
+                params = [self.restaurant_id, guests_count]
+                
+                # Добавляем фильтр по типу расположения если указан
+                if location_preference:
+                    query += " AND t.location_type = ?"
+                    params.append(location_preference)
+                
+                cursor.execute(query, params)
+                all_tables = cursor.fetchall()
+            
+            # Проверяем какие столики свободны на всё время посадки
+            free_table_ids = set(self.occupancy.free_tables(date, time, guests_count, [table[0] for table in all_tables],
+                                                            restaurant_id=self.restaurant_id))
             
             # Фильтруем свободные столики
             available_tables = []
             for table in all_tables:
                 table_id, number, seats, location, description = table
-                if table_id not in occupied_table_ids:
+                if table_id in free_table_ids:
                     available_tables.append({
                         'id': table_id,
                         'number': number,
@@ -94,29 +105,8 @@ class AITools:
     def get_table_by_preference(self, date, time, guests_count, preference_text):
         """Найти столик по предпочтениям клиента"""
         try:
-            # Определяем тип расположения по тексту клиента
-            preference_mapping = {
-                'окн': 'window',
-                'вид': 'window', 
-                'сцен': 'stage',
-                'музык': 'stage',
-                'тих': 'quiet',
-                'спокой': 'quiet',
-                'vip': 'vip',
-                'вип': 'vip',
-                'бар': 'bar',
-                'террас': 'terrace',
-                'банкет': 'banquet',
-                'больш': 'banquet'
-            }
-            
-            location_type = None
-            preference_lower = preference_text.lower()
-            
-            for keyword, location in preference_mapping.items():
-                if keyword in preference_lower:
-                    location_type = location
-                    break
+            # Определяем тип расположения по тексту клиента (категории location:* словаря)
+            location_type = self.keywords.first(preference_text, 'location:')
             
             # Ищем столики с учетом предпочтений
             available_tables = self.get_available_tables(date, time, guests_count, location_type)
@@ -134,38 +124,18 @@ class AITools:
             return []
     
     def book_specific_table(self, table_id, customer_name, customer_phone, booking_date, booking_time, guests_count, special_requests=""):
-        """Забронировать конкретный столик"""
+        """Забронировать конкретный столик (атомарно)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Проверяем доступность столика
-            cursor.execute("""
-                SELECT COUNT(*) FROM bookings 
-                WHERE table_id = ? 
-                AND booking_date = ? 
-                AND booking_time = ? 
-                AND status != 'отменено'
-            """, (table_id, booking_date, booking_time))
-            
-            if cursor.fetchone()[0] > 0:
-                conn.close()
-                print(f"❌ Столик #{table_id} уже занят на {booking_date} {booking_time}")
-                return None
-            
-            # Создаем бронирование с указанием столика
-            cursor.execute("""
-                INSERT INTO bookings 
-                (restaurant_id, table_id, customer_name, customer_phone, booking_date, booking_time, guests_count, status, special_requests)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (1, table_id, customer_name, customer_phone, booking_date, booking_time, guests_count, 'новое', special_requests))
+            result = reserve_table(self.db_path, table_id, customer_name, customer_phone,
+                                   booking_date, booking_time, guests_count, special_requests,
+                                   restaurant_id=self.restaurant_id)
             
-            booking_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            if not result["success"]:
+                print(f"❌ Столик #{table_id} не забронирован на {booking_date} {booking_time}: {result['error']}")
+                return None
             
-            print(f"✅ Создано бронирование #{booking_id} на столик #{table_id}")
-            return booking_id
+            print(f"✅ Создано бронирование #{result['booking_id']} на столик #{table_id}")
+            return result["booking_id"]
             
         except Exception as e:
             print(f"❌ Ошибка бронирования столика: {e}")
@@ -174,17 +144,16 @@ class AITools:
     def get_table_info(self, table_id):
         """Получить информацию о столике"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT table_number, seats_count, location_type, description, status
-                FROM tables 
-                WHERE id = ? AND restaurant_id = 1
-            """, (table_id,))
-            
-            result = cursor.fetchone()
-            conn.close()
+            with db_connection(self.db_path) as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    SELECT table_number, seats_count, location_type, description, status
+                    FROM tables 
+                    WHERE id = ? AND restaurant_id = ?
+                """, (table_id, self.restaurant_id))
+                
+                result = cursor.fetchone()
             
             if result:
                 return {
@@ -203,18 +172,17 @@ class AITools:
     def get_restaurant_tables_summary(self):
         """Получить сводку по всем столикам ресторана"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT location_type, COUNT(*), SUM(seats_count)
-                FROM tables 
-                WHERE restaurant_id = 1 AND status = 'active'
-                GROUP BY location_type
-            """)
-            
-            summary = cursor.fetchall()
-            conn.close()
+            with db_connection(self.db_path) as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    SELECT location_type, COUNT(*), SUM(seats_count)
+                    FROM tables 
+                    WHERE restaurant_id = ? AND status = 'active'
+                    GROUP BY location_type
+                """, (self.restaurant_id,))
+                
+                summary = cursor.fetchall()
             
             result = {}
             for location, count, total_seats in summary:
@@ -285,34 +253,18 @@ class AITools:
         reasons = []
         
         # 1. Проверяем фразы неуверенности в ответе ИИ
-        uncertainty_phrases = [
-            'возможно', 'наверное', 'кажется', 'не уверен', 'может быть',
-            'вероятно', 'думаю', 'предполагаю', 'не знаю точно'
-        ]
-        
-        uncertainty_count = sum(1 for phrase in uncertainty_phrases 
-                              if phrase in ai_response.lower())
+        uncertainty_count = self.keywords.count(ai_response, 'uncertainty')
         if uncertainty_count > 0:
             confidence_score -= min(0.4, uncertainty_count * 0.2)
             reasons.append(f"Неуверенные фразы: {uncertainty_count}")
         
         # 2. Проверяем наличие данных в ответе
-        data_missing_phrases = [
-            'не найден', 'нет информации', 'не могу найти', 
-            'недоступно', 'отсутствует', 'не указано'
-        ]
-        
-        if any(phrase in ai_response.lower() for phrase in data_missing_phrases):
+        if self.keywords.has(ai_response, 'data_missing'):
             confidence_score -= 0.3
             reasons.append("Данные не найдены")
         
         # 3. Анализируем сложность запроса клиента
-        complex_keywords = [
-            'банкет', 'корпоратив', 'свадьба', 'день рождения',
-            'особое меню', 'аллергия', 'диета', 'жалоба', 'проблема'
-        ]
-        
-        if any(keyword in user_text.lower() for keyword in complex_keywords):
+        if self.keywords.has(user_text, 'complex_request'):
             confidence_score -= 0.2
             should_escalate = True
             reasons.append("Сложный запрос")
@@ -354,22 +306,13 @@ class AITools:
         """Определяет нужна ли помощь человека"""
         
         # Явные запросы на человека
-        human_request_phrases = [
-            'хочу говорить с человеком', 'соедините с менеджером',
-            'позовите администратора', 'живой сотрудник',
-            'не хочу с ботом', 'вы робот?'
-        ]
-        
-        if any(phrase in user_text.lower() for phrase in human_request_phrases):
+        if self.keywords.has(user_text, 'human_request'):
             return True, "Клиент запросил человека"
         
         # Повторяющиеся проблемы
         if len(conversation_history) >= 3:
             recent_messages = conversation_history[-3:]
-            confusion_indicators = ['не понял', 'повторите', 'что?', 'как?']
-            
-            confusion_count = sum(1 for msg in recent_messages 
-                                if any(indicator in msg.lower() for indicator in confusion_indicators))
+            confusion_count = sum(1 for msg in recent_messages if self.keywords.has(msg, 'confusion'))
             
             if confusion_count >= 2:
                 return True, "Множественные недопонимания"
@@ -379,39 +322,20 @@ class AITools:
     def log_conversation_issue(self, user_id, user_text, ai_response, confidence_analysis, issue_type):
         """Логирование проблемных диалогов"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Создаем таблицу логов если её нет
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS conversation_issues (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    user_text TEXT,
-                    ai_response TEXT,
-                    confidence_score REAL,
-                    issue_type TEXT,
-                    reasons TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    resolved BOOLEAN DEFAULT FALSE
+            self.log_writer.write(
+                'conversation_issues',
+                ('restaurant_id', 'user_id', 'user_text', 'ai_response', 'confidence_score', 'issue_type', 'reasons', 'timestamp'),
+                (
+                    self.restaurant_id,
+                    user_id, 
+                    user_text, 
+                    ai_response,
+                    confidence_analysis['confidence'],
+                    issue_type,
+                    ', '.join(confidence_analysis['reasons']),
+                    utc_timestamp()
                 )
-            """)
-            
-            cursor.execute("""
-                INSERT INTO conversation_issues 
-                (user_id, user_text, ai_response, confidence_score, issue_type, reasons)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                user_id, 
-                user_text, 
-                ai_response,
-                confidence_analysis['confidence'],
-                issue_type,
-                ', '.join(confidence_analysis['reasons'])
-            ))
-            
-            conn.commit()
-            conn.close()
+            )
             
             print(f"🚨 Зафиксирована проблема: {issue_type} (confidence: {confidence_analysis['confidence']:.2f})")
             
@@ -423,21 +347,20 @@ class AITools:
     def get_user_bookings(self, user_phone):
         """Получить все бронирования пользователя по телефону"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT b.id, b.customer_name, b.booking_date, b.booking_time, b.guests_count, 
-                       b.status, b.notes, b.created_at, b.table_id, t.table_number, t.location_type
-                FROM bookings b
-                LEFT JOIN tables t ON b.table_id = t.id
-                WHERE b.customer_phone = ? 
-                ORDER BY b.booking_date DESC, b.booking_time DESC
-                LIMIT 10
-            """, (user_phone,))
-            
-            bookings = cursor.fetchall()
-            conn.close()
+            with db_connection(self.db_path) as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    SELECT b.id, b.customer_name, b.booking_date, b.booking_time, b.guests_count, 
+                           b.status, b.notes, b.created_at, b.table_id, t.table_number, t.location_type
+                    FROM bookings b
+                    LEFT JOIN tables t ON b.table_id = t.id
+                    WHERE b.restaurant_id = ? AND b.customer_phone = ? 
+                    ORDER BY b.booking_date DESC, b.booking_time DESC
+                    LIMIT 10
+                """, (self.restaurant_id, user_phone))
+                
+                bookings = cursor.fetchall()
             
             result = []
             for booking in bookings:
@@ -464,22 +387,20 @@ class AITools:
     def cancel_booking(self, booking_id, reason="Отменено по просьбе клиента"):
         """Отменить бронирование"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                UPDATE bookings 
-                SET status = 'отменено', notes = notes || ' | ОТМЕНА: ' || ?
-                WHERE id = ?
-            """, (reason, booking_id))
-            
-            if cursor.rowcount > 0:
-                conn.commit()
-                conn.close()
-                return True
-            else:
-                conn.close()
-                return False
+            with db_connection(self.db_path) as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    UPDATE bookings 
+                    SET status = 'отменено', notes = notes || ' | ОТМЕНА: ' || ?
+                    WHERE id = ? AND restaurant_id = ?
+                """, (reason, booking_id, self.restaurant_id))
+                
+                cancelled = cursor.rowcount > 0
+            
+            if cancelled:
+                self.occupancy.remove_booking(booking_id)
+            return cancelled
                 
         except Exception as e:
             print(f"❌ Ошибка отмены бронирования: {e}")
@@ -488,36 +409,37 @@ class AITools:
     def modify_booking(self, booking_id, new_date=None, new_time=None, new_guests=None):
         """Изменить бронирование"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            updates = []
-            values = []
-            
-            if new_date:
-                updates.append("booking_date = ?")
-                values.append(new_date)
-            
-            if new_time:
-                updates.append("booking_time = ?") 
-                values.append(new_time)
+            with db_connection(self.db_path) as conn:
+                cursor = conn.cursor()
                 
-            if new_guests:
-                updates.append("guests_count = ?")
-                values.append(new_guests)
-            
-            if updates:
-                values.append(booking_id)
-                query = f"UPDATE bookings SET {', '.join(updates)} WHERE id = ?"
+                updates = []
+                values = []
                 
-                cursor.execute(query, values)
+                if new_date:
+                    updates.append("booking_date = ?")
+                    values.append(new_date)
                 
-                if cursor.rowcount > 0:
-                    conn.commit()
-                    conn.close()
-                    return True
+                if new_time:
+                    new_time = format_time(parse_time(new_time))
+                    updates.append("booking_time = ?") 
+                    values.append(new_time)
+                    
+                if new_guests:
+                    updates.append("guests_count = ?")
+                    values.append(new_guests)
+                    updates.append("duration_minutes = ?")
+                    values.append(self.occupancy.duration_for(new_guests))
+                
+                if updates:
+                    values.extend([booking_id, self.restaurant_id])
+                    query = f"UPDATE bookings SET {', '.join(updates)} WHERE id = ? AND restaurant_id = ?"
+                    
+                    cursor.execute(query, values)
+                    
+                    if cursor.rowcount > 0:
+                        self.occupancy.move_booking(booking_id, date=new_date, time=new_time, guests=new_guests)
+                        return True
             
-            conn.close()
             return False
             
         except Exception as e:
@@ -527,19 +449,18 @@ class AITools:
     def check_availability(self, date, time):
         """Проверить доступность на дату и время"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT COUNT(*) FROM bookings 
-                WHERE booking_date = ? AND booking_time = ? AND status != 'отменено'
-            """, (date, time))
-            
-            count = cursor.fetchone()[0]
-            conn.close()
+            with db_connection(self.db_path) as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    SELECT id FROM tables 
+                    WHERE restaurant_id = ? AND status = 'active'
+                """, (self.restaurant_id,))
+                
+                table_ids = [row[0] for row in cursor.fetchall()]
             
-            # Предположим что у нас 10 столиков максимум
-            return count < 10
+            # Доступно если хотя бы один столик свободен на стандартную посадку
+            return bool(self.occupancy.free_tables(date, time, 2, table_ids, restaurant_id=self.restaurant_id))
             
         except Exception as e:
             print(f"❌ Ошибка проверки доступности: {e}")
@@ -548,24 +469,23 @@ class AITools:
     def get_menu_by_category(self, category=None):
         """Получить меню по категории"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            if category:
-                cursor.execute("""
-                    SELECT name, description, price FROM menu_items 
-                    WHERE category = ? AND restaurant_id = 1
-                    ORDER BY name
-                """, (category,))
-            else:
-                cursor.execute("""
-                    SELECT category, name, description, price FROM menu_items 
-                    WHERE restaurant_id = 1
-                    ORDER BY category, name
-                """)
-            
-            items = cursor.fetchall()
-            conn.close()
+            with db_connection(self.db_path) as conn:
+                cursor = conn.cursor()
+                
+                if category:
+                    cursor.execute("""
+                        SELECT name, description, price FROM menu_items 
+                        WHERE category = ? AND restaurant_id = ?
+                        ORDER BY name
+                    """, (category, self.restaurant_id))
+                else:
+                    cursor.execute("""
+                        SELECT category, name, description, price FROM menu_items 
+                        WHERE restaurant_id = ?
+                        ORDER BY category, name
+                    """, (self.restaurant_id,))
+                
+                items = cursor.fetchall()
             
             return items
             
@@ -0,0 +1,59 @@
+import asyncio
+import functools
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Размер executor совпадает с размером пула соединений (db_pool.ConnectionManager)
+DB_WORKERS = 8
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Отдельный executor для работы с SQLite (не общий to_thread, чтобы TTS/STT его не занимали)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='db')
+        return _executor
+
+
+async def run_db(func: Callable, *args, **kwargs) -> Any:
+    """Выполнить синхронную функцию работы с базой вне event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(func, *args, **kwargs))
+
+
+class AsyncProxy:
+    """
+    Async-обертка над синхронным репозиторием
+    await AsyncProxy(db).get_menu_items() выполняет db.get_menu_items() в потоке БД
+    """
+
+    def __init__(self, target: Any):
+        self._target = target
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        async def call(*args, **kwargs):
+            return await run_db(attribute, *args, **kwargs)
+
+        return call
+
+
+def shutdown_db_executor(wait: bool = True):
+    """Остановить executor (при завершении бота)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
\ No newline at end of file
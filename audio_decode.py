@@ -0,0 +1,83 @@
+"""
+Декодирование голосовых сообщений в памяти
+Байты OGG/Opus из Telegram идут в ffmpeg через stdin, PCM 16 кГц моно
+(s16le - родной формат распознавателя) читается из stdout. Без временных
+.ogg/.wav файлов и без повторного чтения WAV: буфер сразу отдается в
+sr.AudioData(pcm, SAMPLE_RATE, SAMPLE_WIDTH)
+
+Путь к ffmpeg - FFMPEG_BINARY (по умолчанию ffmpeg из PATH)
+"""
+import asyncio
+import os
+import subprocess
+import logging
+from typing import List, Union
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000  # Гц, родная частота моделей распознавания
+SAMPLE_WIDTH = 2     # байта (s16le)
+CHANNELS = 1
+DECODE_TIMEOUT = 15.0  # секунд
+
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+
+AudioBytes = Union[bytes, bytearray, memoryview]
+
+
+class AudioDecodeError(Exception):
+    """ffmpeg не смог декодировать сообщение (битый файл, нет ffmpeg, таймаут)"""
+
+
+def ffmpeg_command(sample_rate: int = SAMPLE_RATE) -> List[str]:
+    """ffmpeg: контейнер определяется по содержимому stdin, на выходе сырой PCM в stdout"""
+    return [
+        FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-nostdin',
+        '-i', 'pipe:0',
+        '-vn', '-ac', str(CHANNELS), '-ar', str(sample_rate),
+        '-f', 's16le', '-acodec', 'pcm_s16le',
+        'pipe:1'
+    ]
+
+
+def pcm_duration(pcm: AudioBytes, sample_rate: int = SAMPLE_RATE) -> float:
+    """Длительность PCM-буфера в секундах"""
+    return len(pcm) / (sample_rate * SAMPLE_WIDTH * CHANNELS)
+
+
+def decode_to_pcm(data: AudioBytes, sample_rate: int = SAMPLE_RATE, timeout: float = DECODE_TIMEOUT) -> bytes:
+    """OGG/Opus (или любой формат ffmpeg) -> PCM s16le моно (блокирующий вызов)"""
+    try:
+        result = subprocess.run(ffmpeg_command(sample_rate), input=memoryview(data),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    except FileNotFoundError as e:
+        raise AudioDecodeError(f"ffmpeg не найден: {FFMPEG_BINARY}") from e
+    except subprocess.TimeoutExpired as e:
+        raise AudioDecodeError(f"декодирование дольше {timeout:.0f} с") from e
+    if result.returncode != 0 or not result.stdout:
+        raise AudioDecodeError(result.stderr.decode('utf-8', 'replace').strip() or f"нет аудио на выходе (код выхода {result.returncode})")
+    return result.stdout
+
+
+async def decode_to_pcm_async(data: AudioBytes, sample_rate: int = SAMPLE_RATE,
+                              timeout: float = DECODE_TIMEOUT) -> bytes:
+    """То же без блокировки event loop и без потока: ffmpeg - дочерний процесс asyncio"""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *ffmpeg_command(sample_rate),
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+    except FileNotFoundError as e:
+        raise AudioDecodeError(f"ffmpeg не найден: {FFMPEG_BINARY}") from e
+
+    try:
+        pcm, errors = await asyncio.wait_for(process.communicate(memoryview(data)), timeout)
+    except asyncio.TimeoutError as e:
+        process.kill()
+        await process.wait()
+        raise AudioDecodeError(f"декодирование дольше {timeout:.0f} с") from e
+
+    if process.returncode != 0 or not pcm:
+        raise AudioDecodeError(errors.decode('utf-8', 'replace').strip() or f"нет аудио на выходе (код выхода {process.returncode})")
+    logger.debug(f"🎧 Декодировано {pcm_duration(pcm, sample_rate):.1f} с аудио")
+    return pcm
@@ -0,0 +1,140 @@
+"""
+Кодирование голосовых ответов в OGG/Opus
+gTTS отдает MP3, а голосовое сообщение Telegram - это OGG/Opus: только его
+клиент показывает как голосовое (с волной и ускорением). MP3 идет в ffmpeg
+через stdin, OGG/Opus читается из stdout. Кодирование - дочерние процессы
+ffmpeg, одновременно не больше, чем ядер (OPUS_WORKERS): event loop не
+занят, а всплеск ответов не выстраивает больше кодировщиков, чем есть CPU
+
+Настройка окружением:
+    VOICE_OPUS_BITRATE=24k  (битрейт голоса; 16k-32k достаточно для речи)
+    OPUS_WORKERS=4          (по умолчанию число ядер)
+"""
+import asyncio
+import os
+import shutil
+import subprocess
+import threading
+import time
+import logging
+from typing import List, Optional
+from audio_decode import FFMPEG_BINARY, AudioBytes
+from metrics import get_counters, get_metrics
+
+logger = logging.getLogger(__name__)
+
+OPUS_BITRATE = os.environ.get('VOICE_OPUS_BITRATE', '24k')
+OPUS_SAMPLE_RATE = 48000  # Гц, родная частота Opus
+ENCODE_TIMEOUT = 15.0  # секунд
+
+
+class AudioEncodeError(Exception):
+    """ffmpeg не смог перекодировать ответ"""
+
+
+def opus_command(bitrate: str = OPUS_BITRATE) -> List[str]:
+    """ffmpeg: любой вход из stdin -> OGG/Opus моно в stdout (режим voip - под речь)"""
+    return [
+        FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-nostdin',
+        '-i', 'pipe:0',
+        '-vn', '-ac', '1', '-ar', str(OPUS_SAMPLE_RATE),
+        '-c:a', 'libopus', '-b:a', bitrate, '-application', 'voip',
+        '-f', 'ogg', 'pipe:1'
+    ]
+
+
+_libopus: Optional[bool] = None
+
+
+def encoder_available() -> bool:
+    """
+    ffmpeg есть и собран с libopus (проверяется один раз: ffmpeg -encoders);
+    сборка без libopus падала бы на каждом ответе
+    """
+    global _libopus
+    if _libopus is None:
+        if shutil.which(FFMPEG_BINARY) is None:
+            _libopus = False
+        else:
+            try:
+                result = subprocess.run([FFMPEG_BINARY, '-hide_banner', '-encoders'],
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=ENCODE_TIMEOUT)
+                _libopus = b'libopus' in result.stdout
+            except (OSError, subprocess.TimeoutExpired):
+                _libopus = False
+            if not _libopus:
+                logger.warning(f"⚠️ {FFMPEG_BINARY} без кодировщика libopus - голосовые ответы в MP3")
+    return _libopus
+
+
+def encode_to_opus(data: AudioBytes, bitrate: str = OPUS_BITRATE, timeout: float = ENCODE_TIMEOUT) -> bytes:
+    """MP3 -> OGG/Opus (блокирующий вызов)"""
+    try:
+        result = subprocess.run(opus_command(bitrate), input=memoryview(data),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    except FileNotFoundError as e:
+        raise AudioEncodeError(f"ffmpeg не найден: {FFMPEG_BINARY}") from e
+    except subprocess.TimeoutExpired as e:
+        raise AudioEncodeError(f"кодирование дольше {timeout:.0f} с") from e
+    if result.returncode != 0 or not result.stdout:
+        raise AudioEncodeError(result.stderr.decode('utf-8', 'replace').strip() or f"нет аудио на выходе (код выхода {result.returncode})")
+    return result.stdout
+
+
+class OpusEncoder:
+    """Пул кодировщиков: процессы ffmpeg, не больше workers одновременно"""
+
+    def __init__(self, workers: int = None, bitrate: str = OPUS_BITRATE, timeout: float = ENCODE_TIMEOUT):
+        self.workers = workers or os.cpu_count() or 1
+        self.bitrate = bitrate
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(self.workers)
+
+    @property
+    def audio_format(self) -> str:
+        """Формат для ключа кэша речи: смена битрейта не отдает старые файлы"""
+        return f'ogg-opus-{self.bitrate}'
+
+    async def encode(self, data: AudioBytes) -> bytes:
+        """MP3 -> OGG/Opus без блокировки event loop"""
+        started = time.perf_counter()
+        async with self._slots:
+            ogg = await self._run(data)
+        get_metrics().record('audio_encode', time.perf_counter() - started)
+        get_counters().add('voice_mp3_bytes', len(data))
+        get_counters().add('voice_opus_bytes', len(ogg))
+        return ogg
+
+    async def _run(self, data: AudioBytes) -> bytes:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *opus_command(self.bitrate),
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+        except FileNotFoundError as e:
+            raise AudioEncodeError(f"ffmpeg не найден: {FFMPEG_BINARY}") from e
+
+        try:
+            ogg, errors = await asyncio.wait_for(process.communicate(memoryview(data)), self.timeout)
+        except asyncio.TimeoutError as e:
+            process.kill()
+            await process.wait()
+            raise AudioEncodeError(f"кодирование дольше {self.timeout:.0f} с") from e
+
+        if process.returncode != 0 or not ogg:
+            raise AudioEncodeError(errors.decode('utf-8', 'replace').strip() or f"нет аудио на выходе (код выхода {process.returncode})")
+        return ogg
+
+
+_encoder: Optional[OpusEncoder] = None
+_encoder_lock = threading.Lock()
+
+
+def get_opus_encoder() -> OpusEncoder:
+    """Общий пул кодировщиков процесса"""
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            workers = os.environ.get('OPUS_WORKERS')
+            _encoder = OpusEncoder(int(workers) if workers else None)
+        return _encoder
@@ -0,0 +1,120 @@
+"""
+Декодирование голосовых: временные файлы (pydub + sr.AudioFile) против pipe в ffmpeg
+Для каждого сообщения - задержка до готового sr.AudioData, пик выделенной
+Python-памяти (tracemalloc) и объем, записанный во временные файлы.
+Без --input сообщения генерируются ffmpeg (синус, OGG/Opus 48 кГц, как у Telegram)
+
+    python benchmark_audio_decode.py
+    python benchmark_audio_decode.py --input voice1.ogg --input voice2.ogg --repeat 20
+    python benchmark_audio_decode.py --durations 2 5 15 30
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+from audio_decode import FFMPEG_BINARY, SAMPLE_RATE, SAMPLE_WIDTH, decode_to_pcm, decode_to_pcm_async, pcm_duration
+
+
+def synthetic_voice(seconds: float) -> bytes:
+    """Голосовое как у Telegram: OGG/Opus, 48 кГц моно"""
+    return subprocess.run([
+        FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'sine=frequency=220:sample_rate=48000:duration={seconds}',
+        '-ac', '1', '-c:a', 'libopus', '-b:a', '32k', '-f', 'ogg', 'pipe:1'
+    ], stdout=subprocess.PIPE, check=True).stdout
+
+
+def legacy_decode(data: bytes):
+    """Прежний путь speech_to_text: .ogg -> pydub -> .wav -> sr.AudioFile"""
+    import speech_recognition as sr
+    from pydub import AudioSegment
+
+    with tempfile.NamedTemporaryFile(suffix='.ogg', delete=False) as temp_file:
+        temp_file.write(data)
+        temp_file_path = temp_file.name
+    wav_path = temp_file_path.replace('.ogg', '.wav')
+    try:
+        audio = AudioSegment.from_ogg(temp_file_path)
+        audio.export(wav_path, format="wav")
+        written = len(data) + os.path.getsize(wav_path)
+        with sr.AudioFile(wav_path) as source:
+            return sr.Recognizer().record(source), written
+    finally:
+        os.unlink(temp_file_path)
+        if os.path.exists(wav_path):
+            os.unlink(wav_path)
+
+
+def pipe_decode(data: bytes):
+    import speech_recognition as sr
+    return sr.AudioData(decode_to_pcm(data), SAMPLE_RATE, SAMPLE_WIDTH), 0
+
+
+def measure(decode: Callable, messages: List[bytes], repeat: int) -> Tuple[List[float], int, int]:
+    """Задержки (с), пик памяти (байт), записано на диск за одно прохождение (байт)"""
+    latencies = []
+    peak = 0
+    written = 0
+    for _ in range(repeat):
+        written = 0
+        for data in messages:
+            tracemalloc.start()
+            started = time.perf_counter()
+            _, disk = decode(data)
+            latencies.append(time.perf_counter() - started)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            written += disk
+    return latencies, peak, written
+
+
+def report(title: str, latencies: List[float], peak: int, written: int):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{title:<22} p50 {statistics.median(ordered) * 1000:7.1f} мс   p95 {p95 * 1000:7.1f} мс   "
+          f"пик памяти {peak / 1024:8.0f} КБ   на диск {written / 1024:8.0f} КБ")
+
+
+async def concurrent(messages: List[bytes]) -> float:
+    """Все сообщения сразу через asyncio-версию (как при нескольких голосовых одновременно)"""
+    started = time.perf_counter()
+    await asyncio.gather(*(decode_to_pcm_async(data) for data in messages))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Декодирование голосовых: временные файлы против pipe")
+    parser.add_argument('--input', action='append', help="OGG/Opus файл (можно несколько)")
+    parser.add_argument('--durations', type=float, nargs='+', default=[3, 8, 20], help="длительности синтетических, с")
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.input:
+        messages = []
+        for path in args.input:
+            with open(path, 'rb') as file:
+                messages.append(file.read())
+    else:
+        messages = [synthetic_voice(seconds) for seconds in args.durations]
+
+    audio_seconds = sum(pcm_duration(decode_to_pcm(data)) for data in messages)
+    print(f"🎤 Сообщений: {len(messages)}, аудио {audio_seconds:.1f} с, "
+          f"OGG {sum(len(data) for data in messages) / 1024:.0f} КБ, повторов: {args.repeat}")
+
+    report("pipe (audio_decode)", *measure(pipe_decode, messages, args.repeat))
+    try:
+        report("временные файлы", *measure(legacy_decode, messages, args.repeat))
+    except ImportError as e:
+        print(f"⚠️ Прежний путь не замерен: {e}")
+
+    elapsed = asyncio.run(concurrent(messages * 4))
+    print(f"⚡ {len(messages) * 4} сообщений параллельно (asyncio): {elapsed * 1000:.0f} мс")
+
+
+if __name__ == "__main__":
+    main()
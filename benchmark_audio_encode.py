@@ -0,0 +1,125 @@
+"""
+Голосовые ответы: MP3 от gTTS против OGG/Opus (audio_encode)
+1) Размер ответа для каждого битрейта Opus и время кодирования p50/p95
+2) Задержка до отправленного голосового: синтез + (кодирование) + загрузка
+   в Telegram, загрузка оценивается по пропускной способности --uplink-kbps
+3) Всплеск ответов: все фразы сразу через OpusEncoder на 1..N процессах
+
+Без --input фразы озвучиваются gTTS (нужна сеть), с --synthetic - тон из
+ffmpeg в MP3 32 кбит/с (как у gTTS; размер Opus для тона не показателен)
+
+    python benchmark_audio_encode.py
+    python benchmark_audio_encode.py --input reply1.mp3 --input reply2.mp3 --bitrates 16k 24k
+    python benchmark_audio_encode.py --synthetic --uplink-kbps 256
+"""
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import subprocess
+import time
+from typing import List, Tuple
+from audio_decode import FFMPEG_BINARY
+from audio_encode import OPUS_BITRATE, OpusEncoder, encode_to_opus
+
+PHRASES = [
+    "Добро пожаловать! Чем могу помочь?",
+    "Извините, не совсем понял. Можете повторить?",
+    "Отлично, столик у окна на завтра на девятнадцать ноль ноль свободен. На какое имя оформить бронь?",
+    "Мы работаем с десяти утра до одиннадцати вечера, адрес: улица Пушкина, дом один.",
+    "Ваша бронь подтверждена: завтра в семь вечера, четыре гостя, столик у окна. Ждем вас!",
+]
+
+
+def gtts_replies() -> List[Tuple[bytes, float]]:
+    """(MP3, время синтеза)"""
+    from gtts import gTTS
+
+    replies = []
+    for text in PHRASES:
+        started = time.perf_counter()
+        mp3 = io.BytesIO()
+        gTTS(text=text, lang='ru', slow=False).write_to_fp(mp3)
+        replies.append((mp3.getvalue(), time.perf_counter() - started))
+    return replies
+
+
+def synthetic_replies(durations: List[float]) -> List[Tuple[bytes, float]]:
+    return [(subprocess.run([
+        FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'sine=frequency=220:sample_rate=24000:duration={seconds}',
+        '-ac', '1', '-c:a', 'libmp3lame', '-b:a', '32k', '-f', 'mp3', 'pipe:1'
+    ], stdout=subprocess.PIPE, check=True).stdout, 0.0) for seconds in durations]
+
+
+def percentiles(values: List[float]) -> Tuple[float, float]:
+    ordered = sorted(values)
+    return statistics.median(ordered), ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+def upload_seconds(size: int, uplink_kbps: float) -> float:
+    return size * 8 / (uplink_kbps * 1000)
+
+
+async def burst(mp3s: List[bytes], workers: int, bitrate: str) -> float:
+    encoder = OpusEncoder(workers, bitrate)
+    started = time.perf_counter()
+    await asyncio.gather(*(encoder.encode(mp3) for mp3 in mp3s))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Голосовые ответы: MP3 против OGG/Opus")
+    parser.add_argument('--input', action='append', help="MP3 ответа (можно несколько)")
+    parser.add_argument('--synthetic', action='store_true', help="тон из ffmpeg вместо gTTS")
+    parser.add_argument('--durations', type=float, nargs='+', default=[2, 5, 10])
+    parser.add_argument('--bitrates', nargs='+', default=['16k', OPUS_BITRATE, '32k'])
+    parser.add_argument('--uplink-kbps', type=float, default=1000.0, help="скорость загрузки в Telegram, кбит/с")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    if args.input:
+        replies = []
+        for path in args.input:
+            with open(path, 'rb') as file:
+                replies.append((file.read(), 0.0))
+    elif args.synthetic:
+        replies = synthetic_replies(args.durations)
+    else:
+        replies = gtts_replies()
+    mp3s = [mp3 for mp3, _ in replies]
+
+    mp3_size = statistics.mean(len(mp3) for mp3 in mp3s)
+    print(f"🔊 Ответов: {len(replies)}, MP3 в среднем {mp3_size / 1024:.1f} КБ, загрузка {args.uplink_kbps:.0f} кбит/с")
+
+    mp3_total = [synthesis + upload_seconds(len(mp3), args.uplink_kbps) for mp3, synthesis in replies]
+    print(f"{'MP3 (сейчас)':<16} {mp3_size / 1024:7.1f} КБ        "
+          f"до отправки p50 {statistics.median(mp3_total) * 1000:7.0f} мс")
+
+    for bitrate in args.bitrates:
+        encode_times, sizes, totals = [], [], []
+        for _ in range(args.repeat):
+            for mp3, synthesis in replies:
+                started = time.perf_counter()
+                ogg = encode_to_opus(mp3, bitrate)
+                encode_time = time.perf_counter() - started
+                encode_times.append(encode_time)
+                sizes.append(len(ogg))
+                totals.append(synthesis + encode_time + upload_seconds(len(ogg), args.uplink_kbps))
+        p50, p95 = percentiles(encode_times)
+        size = statistics.mean(sizes)
+        print(f"{'Opus ' + bitrate:<16} {size / 1024:7.1f} КБ ({size / mp3_size:4.0%})   "
+              f"до отправки p50 {statistics.median(totals) * 1000:7.0f} мс   "
+              f"кодирование p50 {p50 * 1000:5.1f} мс, p95 {p95 * 1000:5.1f} мс")
+
+    batch = mp3s * args.repeat
+    for workers in sorted(set(args.workers)):
+        elapsed = asyncio.run(burst(batch, workers, OPUS_BITRATE))
+        print(f"⚡ {len(batch)} ответов сразу, {workers} проц.: {elapsed * 1000:.0f} мс "
+              f"({len(batch) / elapsed:.0f} в секунду)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Стресс-тест бронирований
+Сотни параллельных попыток забронировать одни и те же столики из нескольких
+процессов и потоков, затем проверка, что в базе нет ни одного пересечения
+
+    python benchmark_booking_race.py --processes 4 --threads 50 --attempts 20
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from migrations import migrate, DEFAULT_DURATION_MINUTES
+from reservations import reserve_table
+
+DATES = ['2025-12-26', '2025-12-27']
+TIMES = [f"{hour:02d}:{minute:02d}" for hour in range(17, 23) for minute in (0, 15, 30, 45)]
+
+
+def seed(db_path: str, tables: int):
+    migrate(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO restaurants (id, name) VALUES (1, 'Стресс-тест')")
+    conn.executemany(
+        "INSERT INTO tables (restaurant_id, table_number, seats_count, location_type) VALUES (1, ?, 8, 'center')",
+        [(str(i),) for i in range(1, tables + 1)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def worker(db_path: str, threads: int, attempts: int, tables: int, seed_value: int, results):
+    """Процесс с несколькими потоками, каждый делает attempts попыток бронирования"""
+    counters = {'success': 0, 'conflict': 0, 'error': 0}
+    lock = threading.Lock()
+
+    def run(thread_no):
+        rng = random.Random(seed_value * 1000 + thread_no)
+        for _ in range(attempts):
+            result = reserve_table(
+                db_path, rng.randint(1, tables), f"Гость {thread_no}", "+70000000000",
+                rng.choice(DATES), rng.choice(TIMES), rng.randint(1, 8)
+            )
+            key = 'success' if result['success'] else ('conflict' if result.get('conflict') else 'error')
+            with lock:
+                counters[key] += 1
+
+    pool = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(counters)
+
+
+def count_overlaps(db_path: str) -> int:
+    start = "(CAST(substr({t}.booking_time, 1, 2) AS INTEGER) * 60 + CAST(substr({t}.booking_time, 4, 2) AS INTEGER))"
+    conn = sqlite3.connect(db_path)
+    overlaps = conn.execute(f"""
+        SELECT COUNT(*) FROM bookings a JOIN bookings b
+        ON a.booking_date = b.booking_date AND a.table_id = b.table_id AND a.id < b.id
+        WHERE a.status != 'отменено' AND b.status != 'отменено'
+        AND {start.format(t='a')} < {start.format(t='b')} + COALESCE(b.duration_minutes, {DEFAULT_DURATION_MINUTES})
+        AND {start.format(t='b')} < {start.format(t='a')} + COALESCE(a.duration_minutes, {DEFAULT_DURATION_MINUTES})
+    """).fetchone()[0]
+    conn.close()
+    return overlaps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Стресс-тест параллельных бронирований")
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=50)
+    parser.add_argument('--attempts', type=int, default=20)
+    parser.add_argument('--tables', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'race.db')
+        seed(db_path, args.tables)
+
+        # spawn: каждый процесс открывает собственные соединения
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        processes = [
+            context.Process(target=worker, args=(db_path, args.threads, args.attempts, args.tables, i, results))
+            for i in range(args.processes)
+        ]
+
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        totals = {'success': 0, 'conflict': 0, 'error': 0}
+        for _ in processes:
+            for key, value in results.get().items():
+                totals[key] += value
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        attempts = sum(totals.values())
+        overlaps = count_overlaps(db_path)
+
+        print(f"🔁 Попыток: {attempts} ({args.processes} процессов × {args.threads} потоков × {args.attempts})")
+        print(f"⏱️ Время: {elapsed:.2f} с, {attempts / elapsed:.0f} попыток/с")
+        print(f"✅ Успешно: {totals['success']}  ⛔ Конфликтов: {totals['conflict']}  ❌ Ошибок: {totals['error']}")
+        print(f"{'✅' if overlaps == 0 else '❌'} Двойных бронирований: {overlaps}")
+
+        if overlaps or totals['error']:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Быстрый путь без Gemini: доля сообщений и сэкономленное время
+Прогоняет размеченные фразы через AIBrain.process_message и печатает долю
+ответов по шаблону, ошибки классификатора и задержку быстрого пути.
+С ключом Gemini остальные фразы уходят в модель, и по медианам llm_turn и
+fast_path оценивается сэкономленное время:
+
+    GEMINI_API_KEY=... python benchmark_intents.py
+"""
+import asyncio
+import os
+import tempfile
+import time
+from ai_brain import AIBrain
+from database import RestaurantDatabase
+from intent_router import get_intent_router
+from metrics import get_metrics
+
+# (фраза, ожидаемое намерение; other - должен отвечать ИИ)
+CORPUS = [
+    ("Какие у вас часы работы?", "hours"),
+    ("До скольки вы работаете?", "hours"),
+    ("Во сколько вы открываетесь?", "hours"),
+    ("Когда вы закрываетесь сегодня?", "hours"),
+    ("Какой у вас график?", "hours"),
+    ("Какой у вас адрес?", "address"),
+    ("Где вы находитесь?", "address"),
+    ("Как до вас добраться?", "address"),
+    ("Дайте ваш телефон", "contacts"),
+    ("Как с вами связаться?", "contacts"),
+    ("Покажи меню", "menu"),
+    ("Какое у вас меню?", "menu"),
+    ("Что есть из горячего?", "menu"),
+    ("Есть ли у вас десерты?", "menu"),
+    ("Какие у вас есть напитки?", "menu"),
+    ("Покажи мою бронь, телефон +994501112233", "my_bookings"),
+    ("Мои бронирования +994 50 111 22 33", "my_bookings"),
+    ("Здравствуйте", "greeting"),
+    ("Добрый вечер!", "greeting"),
+    ("Хочу столик на завтра на 19:00 на двоих", "other"),
+    ("Забронируйте на имя Анна", "other"),
+    ("Отмените мою бронь, телефон +994501112233", "other"),
+    ("Перенесите бронь на 20:00", "other"),
+    ("А у окна есть?", "other"),
+    ("Есть ли у вас парковка?", "other"),
+    ("Покажи мою бронь", "other"),
+    ("Можно с собакой?", "other"),
+    ("Что посоветуете на ужин для двоих с ребенком, у которого аллергия на орехи?", "other"),
+    ("Хочу говорить с человеком", "other"),
+    ("Спасибо, до свидания", "other"),
+]
+
+
+async def run(brain: AIBrain, use_llm: bool):
+    router = get_intent_router()
+    router.reset()
+    get_metrics().reset()
+    wrong = []
+    for user_id, (text, expected) in enumerate(CORPUS, start=1):
+        match = router.classify(text)
+        answered_before = router.stats()['fast_path']
+        started = time.perf_counter()
+        if use_llm:
+            answer = await brain.process_message(user_id, text, [])
+        else:
+            answer = await brain._try_fast_path(text) or '(ответил бы ИИ)'
+        elapsed = time.perf_counter() - started
+        
+        # Ошибка - только неверный ответ по шаблону (отказ шаблона просто передает фразу ИИ)
+        fast = router.stats()['fast_path'] > answered_before
+        if fast and match.intent != expected:
+            wrong.append((text, match.intent, expected))
+        print(f"{elapsed * 1000:8.1f}мс | {(match.intent if fast else 'ИИ'):<11} | {text} -> {answer[:60]!r}")
+    return wrong
+
+
+def main():
+    api_key = os.environ.get('GEMINI_API_KEY')
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'intents.db')
+        RestaurantDatabase(db_path)
+        brain = AIBrain(api_key or 'offline', db_path)
+        if not api_key:
+            print("⚠️ GEMINI_API_KEY не задан - фразы для ИИ только классифицируются")
+
+        wrong = asyncio.run(run(brain, bool(api_key)))
+
+    stats = get_intent_router().stats()
+    expected_fast = sum(1 for _, intent in CORPUS if intent != 'other')
+    fast = get_metrics().summary().get('fast_path', {})
+    print(f"\n⚡ Быстрым путем: {stats['fast_path']}/{stats['messages']} ({stats['hit_rate']:.0%}), "
+          f"размечено простых: {expected_fast}, отказ шаблона: {stats['declined']}")
+    print(f"⚡ По намерениям: {stats['by_intent']}")
+    if fast:
+        print(f"⚡ Быстрый путь p50/p95: {fast['p50']:.2f} / {fast['p95']:.2f} мс")
+    if stats['saved_seconds'] is not None:
+        print(f"⏱️ Сэкономлено времени ИИ: {stats['saved_seconds']:.1f} с")
+    for text, got, expected in wrong:
+        print(f"❌ {text!r}: {got}, ожидалось {expected}")
+
+
+if __name__ == "__main__":
+    main()
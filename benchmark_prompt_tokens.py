@@ -0,0 +1,87 @@
+"""
+Токены промпта и задержка: правила в каждом сообщении (inline) против
+системной инструкции ресторана и кэша контекста (system)
+
+С ключом Gemini прогоняет один и тот же диалог в обоих режимах и печатает
+prompt/cached/output токены из usage_metadata и задержку на сообщение:
+
+    GEMINI_API_KEY=... python benchmark_prompt_tokens.py --turns 6
+
+Без ключа печатает только размер статической и меняющейся частей промпта
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from ai_brain import AIBrain
+from database import RestaurantDatabase
+from metrics import get_counters, get_metrics
+
+DIALOG = [
+    "Здравствуйте! Какие у вас часы работы?",
+    "Что есть из горячего?",
+    "Хочу столик на завтра на 19:00 на двоих",
+    "А у окна есть?",
+    "Бронируйте на имя Анна, телефон +994501112233",
+    "Спасибо! Есть ли у вас десерты?",
+    "Какие у меня бронирования? Телефон +994501112233",
+    "До свидания"
+]
+
+
+async def run_dialog(brain: AIBrain, turns: int, user_id: int) -> list:
+    latencies = []
+    for text in DIALOG[:turns]:
+        history = await brain.get_conversation_history_async(user_id)
+        started = time.perf_counter()
+        answer = await brain.process_message(user_id, text, history)
+        latencies.append(time.perf_counter() - started)
+        brain.save_conversation(user_id, "Бенчмарк", text, answer)
+    return latencies
+
+
+def offline_report(db_path: str):
+    RestaurantDatabase(db_path)
+    brain = AIBrain('offline', db_path)
+    history = ["Клиент: Здравствуйте!", "Бот: Добрый день! Чем помочь?"] * 3
+    static = brain._build_system_instruction()
+    brain.prompt_mode = 'system'
+    dynamic = brain._build_ai_context(1, DIALOG[2], history)
+    brain.prompt_mode = 'inline'
+    inline = brain._build_ai_context(1, DIALOG[2], history)
+    print(f"📏 Статическая часть (системная инструкция): {len(static)} символов")
+    print(f"📏 Сообщение в режиме system: {len(dynamic)} символов")
+    print(f"📏 Сообщение в режиме inline: {len(inline)} символов")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Токены промпта: inline против системной инструкции")
+    parser.add_argument('--turns', type=int, default=6)
+    args = parser.parse_args()
+
+    api_key = os.environ.get('GEMINI_API_KEY')
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'prompt.db')
+        if not api_key:
+            print("⚠️ GEMINI_API_KEY не задан - только размер промпта без запросов к модели")
+            offline_report(db_path)
+            return
+
+        RestaurantDatabase(db_path)
+        print(f"{'режим':<8} | {'prompt/сообщ.':>13} | {'cached/сообщ.':>13} | {'output/сообщ.':>13} | {'p50, с':>7} | {'max, с':>7}")
+        for user_id, mode in enumerate(('inline', 'system'), start=1):
+            get_counters().reset()
+            get_metrics().reset()
+            brain = AIBrain(api_key, db_path, prompt_mode=mode, use_fast_path=False,
+                            use_response_cache=False)
+            latencies = sorted(asyncio.run(run_dialog(brain, args.turns, user_id)))
+
+            tokens = get_counters().summary()
+            per_turn = lambda name: tokens.get(name, {}).get('total', 0) / len(latencies)
+            print(f"{mode:<8} | {per_turn('prompt_tokens'):13.0f} | {per_turn('cached_tokens'):13.0f} | "
+                  f"{per_turn('output_tokens'):13.0f} | {latencies[len(latencies) // 2]:7.2f} | {latencies[-1]:7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Бенчмарк индексов схемы
+Заполняет временную базу синтетическими данными, замеряет запросы бота
+и админки до миграции с индексами и после нее
+
+    python benchmark_schema.py                       # 1М бронирований, 10М сообщений
+    python benchmark_schema.py --bookings 100000 --conversations 1000000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+from db_pool import db_connection
+from migrations import migrate
+
+BATCH = 50000
+
+# (название, SQL, параметры) - формы запросов из ai_brain.py, ai_tools.py, occupancy.py,
+# session_store.py, web_interface.py (с миграции 7 все запросы ограничены restaurant_id)
+QUERIES = [
+    ("Занятость дня (occupancy)", """
+        SELECT id, table_id, booking_time, guests_count FROM bookings
+        WHERE restaurant_id = ? AND booking_date = ? AND status != 'отменено' AND table_id IS NOT NULL
+    """, (1, '2025-07-15')),
+    ("Бронирования по телефону", """
+        SELECT b.id, b.customer_name, b.booking_date, b.booking_time, b.guests_count, b.status
+        FROM bookings b LEFT JOIN tables t ON b.table_id = t.id
+        WHERE b.restaurant_id = ? AND b.customer_phone = ?
+        ORDER BY b.booking_date DESC, b.booking_time DESC LIMIT 10
+    """, (1, '+7900000123')),
+    ("Дашборд: последние бронирования", """
+        SELECT b.customer_name, b.booking_date, b.booking_time FROM bookings b
+        WHERE b.restaurant_id = 1 ORDER BY b.created_at DESC LIMIT 5
+    """, ()),
+    ("Активные брони столика", """
+        SELECT COUNT(*) FROM bookings WHERE table_id = ? AND status NOT IN ('отменено', 'завершено')
+    """, (7,)),
+    ("История диалога", """
+        SELECT message_text, bot_response FROM conversations
+        WHERE restaurant_id = ? AND user_id = ? ORDER BY timestamp DESC, id DESC LIMIT 10
+    """, (1, 4242)),
+    ("Меню по категории", """
+        SELECT name, description, price FROM menu_items
+        WHERE category = ? AND restaurant_id = 1 ORDER BY name
+    """, ('Салаты',))
+]
+
+
+def fill(db_path: str, bookings: int, conversations: int):
+    """Синтетические данные: 10 столиков, ~2 года бронирований, 100к пользователей"""
+    start_day = date(2024, 1, 1)
+    statuses = ['новое', 'подтверждено', 'отменено', 'завершено']
+
+    with db_connection(db_path) as conn:
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("INSERT INTO restaurants (id, name) VALUES (1, 'Бенчмарк')")
+        conn.executemany(
+            "INSERT INTO tables (restaurant_id, table_number, seats_count, location_type) VALUES (1, ?, ?, 'center')",
+            [(str(i), 2 + i % 6) for i in range(1, 11)]
+        )
+        conn.executemany(
+            "INSERT INTO menu_items (restaurant_id, category, name, description, price) VALUES (1, ?, ?, '', ?)",
+            [(category, f"{category} {i}", 100 + i) for category in ('Салаты', 'Супы', 'Горячие блюда', 'Напитки') for i in range(50)]
+        )
+
+    def booking_rows(offset, count):
+        for i in range(offset, offset + count):
+            day = start_day + timedelta(days=i % 730)
+            yield (
+                1, 1 + i % 10, f"Гость {i}", f"+7900{i % 1000000:07d}", day.isoformat(),
+                f"{10 + i % 13:02d}:{(i * 7) % 4 * 15:02d}", 1 + i % 8, statuses[i % 4],
+                f"2024-01-01 00:{i % 60:02d}:00"
+            )
+
+    def conversation_rows(offset, count):
+        for i in range(offset, offset + count):
+            yield (i % 100000, f"user{i % 100000}", f"Сообщение {i}", f"Ответ {i}", f"2025-01-01 00:00:{i % 60:02d}.{i:09d}")
+
+    for offset in range(0, bookings, BATCH):
+        with db_connection(db_path) as conn:
+            conn.executemany("""
+                INSERT INTO bookings (restaurant_id, table_id, customer_name, customer_phone, booking_date,
+                                      booking_time, guests_count, status, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, booking_rows(offset, min(BATCH, bookings - offset)))
+
+    for offset in range(0, conversations, BATCH):
+        with db_connection(db_path) as conn:
+            conn.executemany("""
+                INSERT INTO conversations (user_id, user_name, message_text, bot_response, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            """, conversation_rows(offset, min(BATCH, conversations - offset)))
+
+
+def measure(db_path: str, repeat: int):
+    """Медиана времени каждого запроса в мс и план запроса"""
+    results = {}
+    with db_connection(db_path) as conn:
+        for name, sql, params in QUERIES:
+            plan = '; '.join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                conn.execute(sql, params).fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (statistics.median(timings), plan)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк индексов схемы")
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--conversations', type=int, default=10000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'benchmark.db')
+
+        # Схема без индексов (версия 2) и колонка restaurant_id логов (миграция 7),
+        # чтобы до и после замерялись одни и те же запросы
+        migrate(db_path, target_version=2)
+        with db_connection(db_path) as conn:
+            conn.execute("ALTER TABLE conversations ADD COLUMN restaurant_id INTEGER NOT NULL DEFAULT 1")
+        print(f"📦 Заполняю базу: {args.bookings:,} бронирований, {args.conversations:,} сообщений...")
+        started = time.perf_counter()
+        fill(db_path, args.bookings, args.conversations)
+        print(f"   готово за {time.perf_counter() - started:.1f} с")
+
+        before = measure(db_path, args.repeat)
+
+        started = time.perf_counter()
+        migrate(db_path)
+        print(f"🗄️ Индексы построены за {time.perf_counter() - started:.1f} с\n")
+
+        after = measure(db_path, args.repeat)
+
+        print(f"{'Запрос':<36} {'без индексов, мс':>18} {'с индексами, мс':>17}")
+        print("-" * 73)
+        for name, _, _ in QUERIES:
+            print(f"{name:<36} {before[name][0]:>18.3f} {after[name][0]:>17.3f}")
+        print()
+        for name, _, _ in QUERIES:
+            print(f"{name}: {after[name][1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Извлечение данных брони: точность, скорость и сэкономленные запросы к модели
+1) Размеченные реплики клиентов - точность и полнота по каждому полю
+   и время разбора одного сообщения (slot_extractor)
+2) То же на диалогах для прототипа из test_parsing.py (заново разбирает
+   последние 10 сообщений на каждой реплике) - время на реплику
+3) Диалоги через AIBrain с детерминированной моделью (ScriptedBackend):
+   запросы к модели и созданные брони с прямым бронированием и без него
+
+    python benchmark_slots.py
+    python benchmark_slots.py --repeat 2000
+"""
+import argparse
+import asyncio
+import os
+import re
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+from ai_brain import AIBrain
+from db_pool import db_connection
+from llm_gateway import LLMGateway
+from metrics import get_counters, get_metrics
+from model_backends import Latency, ScriptedBackend
+from replay_benchmark import prepare_database
+from slot_extractor import REQUIRED_SLOTS, SlotExtractor
+
+TODAY = datetime(2025, 6, 10)  # вторник
+
+# (реплика, ожидаемые поля)
+CORPUS = [
+    ("Здравствуйте, хочу забронировать столик", {}),
+    ("Хочу столик на завтра на 19:00 на двоих", {'date': '2025-06-11', 'time': '19:00', 'guests': 2}),
+    ("Меня зовут Анна", {'name': 'Анна'}),
+    ("меня зовут дмитрий, телефон 89161234567", {'name': 'Дмитрий', 'phone': '89161234567'}),
+    ("+994 50 111 22 33", {'phone': '+994501112233'}),
+    ("Мой номер 8 (916) 555-12-34", {'phone': '89165551234'}),
+    ("Нас будет 4 человека", {'guests': 4}),
+    ("на троих, у окна", {'guests': 3, 'location': 'window'}),
+    ("Будет шесть гостей", {'guests': 6}),
+    ("Компания из 8", {'guests': 8}),
+    ("В пятницу в 7 вечера", {'date': '2025-06-13', 'time': '19:00'}),
+    ("На субботу к 20:30, нас пятеро", {'date': '2025-06-14', 'time': '20:30', 'guests': 5}),
+    ("15 июня в 18.00 на 2 персоны", {'date': '2025-06-15', 'time': '18:00', 'guests': 2}),
+    ("на 21.06 в 19:30", {'date': '2025-06-21', 'time': '19:30'}),
+    ("Послезавтра в 13 часов", {'date': '2025-06-12', 'time': '13:00'}),
+    ("В пятницу в 7 часов вечера", {'date': '2025-06-13', 'time': '19:00'}),
+    ("Завтра в 2 часа дня на двоих", {'date': '2025-06-11', 'time': '14:00', 'guests': 2}),
+    ("Сегодня вечером в 9 вечера", {'date': '2025-06-10', 'time': '21:00'}),
+    ("2025-07-01 в 12:00", {'date': '2025-07-01', 'time': '12:00'}),
+    ("Забронируйте на имя Петр, +79031112233, завтра в 20:00 на 3 человека",
+     {'name': 'Петр', 'phone': '+79031112233', 'date': '2025-06-11', 'time': '20:00', 'guests': 3}),
+    ("Я Мария, 8-925-000-11-22", {'name': 'Мария', 'phone': '89250001122'}),
+    ("Имя: Олег", {'name': 'Олег'}),
+    ("Это Сергей. Хотим в VIP зал", {'name': 'Сергей', 'location': 'vip'}),
+    ("Какие у вас часы работы?", {}),
+    ("Покажите меню на завтра", {'date': '2025-06-11'}),
+    ("Спасибо, до свидания", {}),
+    ("А на 20:00 есть?", {'time': '20:00'}),
+    ("На какое имя оформить?", {}),
+    ("Отмените мою бронь на 12 июля", {'date': '2025-07-12'}),
+    ("Мы придем вдвоем, в среду", {'guests': 2, 'date': '2025-06-11'}),
+    ("Два человека, 30 июня, в 19 часов", {'guests': 2, 'date': '2025-06-30', 'time': '19:00'}),
+    ("Стол на двоих у окна в четверг", {'guests': 2, 'location': 'window', 'date': '2025-06-12'}),
+]
+
+# Диалоги: данные брони приходят по частям
+DIALOGS = [
+    ["Здравствуйте", "Хочу столик на завтра на 19:00 на двоих", "Меня зовут Анна", "+994501112233"],
+    ["Нужен стол в пятницу в 7 вечера", "Нас будет 4 человека", "Я Олег, 89161234567"],
+    ["Меня зовут Петр, телефон +79031112233", "Какие у вас часы работы?", "Забронируйте на субботу к 20:30 на троих"],
+    ["Хочу забронировать", "15 июня в 18.00", "на 2 персоны", "На имя Мария", "8-925-000-11-22"],
+    ["Столик на послезавтра в 13 часов на 6 гостей", "Имя: Сергей", "+994 50 123 45 67"],
+]
+
+
+def prototype(messages: List[str]) -> Dict[str, object]:
+    """Разбор из test_parsing.get_booking_in_progress (без запроса к базе)"""
+    booking_data = {}
+    for msg in messages:
+        name_match = re.search(r'меня зовут\s+(\w+)|на имя\s+(\w+)', msg, re.IGNORECASE)
+        if name_match:
+            booking_data['name'] = (name_match.group(1) or name_match.group(2)).capitalize()
+        phone_match = re.search(r'\+?\d[\d\s\-\(\)]{9,}', msg)
+        if phone_match:
+            booking_data['phone'] = re.sub(r'[\s\-\(\)]', '', phone_match.group(0))
+        guests_match = re.search(r'(\d+)\s*чел|(\d+)\s*человек|будет\s+(\d+)|на\s+(\d+)', msg, re.IGNORECASE)
+        if guests_match:
+            guests = int(guests_match.group(1) or guests_match.group(2) or guests_match.group(3) or guests_match.group(4))
+            if 1 <= guests <= 20:
+                booking_data['guests'] = guests
+    return booking_data
+
+
+def accuracy(extractor: SlotExtractor):
+    fields = ('name', 'phone', 'date', 'time', 'guests', 'location')
+    found = {field: [0, 0, 0] for field in fields}  # верно, лишнее, пропущено
+    errors = []
+    for text, expected in CORPUS:
+        got = extractor.extract(text, TODAY)
+        for field in fields:
+            if field in got and got[field] == expected.get(field):
+                found[field][0] += 1
+            else:
+                if field in got:
+                    found[field][1] += 1
+                if field in expected:
+                    found[field][2] += 1
+                if field in got or field in expected:
+                    errors.append((text, field, got.get(field), expected.get(field)))
+
+    print(f"{'поле':<10} {'точность':>9} {'полнота':>8}")
+    for field, (correct, extra, missed) in found.items():
+        precision = correct / (correct + extra) if correct + extra else 1.0
+        recall = correct / (correct + missed) if correct + missed else 1.0
+        print(f"{field:<10} {precision:>9.0%} {recall:>8.0%}")
+    for text, field, got, expected in errors:
+        print(f"❌ {text!r}: {field}={got!r}, ожидалось {expected!r}")
+
+
+def speed(extractor: SlotExtractor, repeat: int):
+    texts = [text for text, _ in CORPUS]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            extractor.extract(text, TODAY)
+    per_message = (time.perf_counter() - started) / (repeat * len(texts))
+
+    # На каждой реплике: прототип - последние 10 сообщений заново, модуль - одно новое
+    started = time.perf_counter()
+    turns = 0
+    for _ in range(repeat):
+        for dialog in DIALOGS:
+            for index in range(len(dialog)):
+                prototype(dialog[max(0, index - 9):index + 1])
+                turns += 1
+    per_turn_prototype = (time.perf_counter() - started) / turns
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for dialog in DIALOGS:
+            slots = {}
+            for text in dialog:
+                slots.update(extractor.extract(text, TODAY))
+    per_turn = (time.perf_counter() - started) / turns
+
+    print(f"\n⏱️ Разбор сообщения: {per_message * 1e6:.1f} мкс")
+    print(f"⏱️ На реплику диалога: модуль {per_turn * 1e6:.1f} мкс, прототип {per_turn_prototype * 1e6:.1f} мкс "
+          f"(прототип находит только имя, телефон и гостей)")
+
+
+async def replay_dialogs(brain: AIBrain) -> int:
+    for user_id, dialog in enumerate(DIALOGS, start=1):
+        for text in dialog:
+            history = await brain.get_conversation_history_async(user_id)
+            answer = await brain.process_message(user_id, text, history)
+            brain.save_conversation(user_id, "Bench", text, answer)
+    return sum(len(dialog) for dialog in DIALOGS)
+
+
+def llm_requests(direct: bool) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'slots.db')
+        prepare_database(db_path)
+        brain = AIBrain('offline', db_path, backend=ScriptedBackend(latency=Latency(0.001, 0.1)),
+                        use_response_cache=False, use_direct_booking=direct)
+        brain.gateway = LLMGateway(global_rate=1e6, global_burst=10 ** 6, user_rate=1e6, user_burst=10 ** 6)
+        get_metrics().reset()
+        get_counters().reset()
+        turns = asyncio.run(replay_dialogs(brain))
+        brain.log_writer.flush()
+        summary = get_metrics().summary()
+        with db_connection(db_path) as conn:
+            bookings = conn.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+        return {
+            'turns': turns,
+            'llm_turns': summary.get('llm_turn', {}).get('count', 0),
+            'llm_requests': summary.get('llm_service', {}).get('count', 0),
+            'bookings': bookings
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Извлечение данных брони: точность, скорость, запросы к модели")
+    parser.add_argument('--repeat', type=int, default=500, help="повторов корпуса для замера скорости")
+    args = parser.parse_args()
+
+    extractor = SlotExtractor()
+    print(f"📋 Реплик в корпусе: {len(CORPUS)}, обязательные поля: {', '.join(REQUIRED_SLOTS)}\n")
+    accuracy(extractor)
+    speed(extractor, args.repeat)
+
+    print(f"\n🎬 Диалогов: {len(DIALOGS)}, данные брони приходят по частям")
+    for direct in (False, True):
+        row = llm_requests(direct)
+        title = "с прямой бронью" if direct else "только ИИ     "
+        print(f"{title}: реплик {row['turns']}, реплик через ИИ {row['llm_turns']}, "
+              f"запросов к модели {row['llm_requests']}, создано броней {row['bookings']}")
+
+
+if __name__ == "__main__":
+    main()
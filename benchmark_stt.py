@@ -0,0 +1,142 @@
+"""
+Распознавание речи: скорость и качество движков stt_engines на репликах бронирования
+1) RTF (время распознавания / длительность аудио) по одной реплике
+   на одном процессе, p50/p95, и доля ошибок по словам (WER)
+2) Пропускная способность пула Vosk: все реплики сразу на 1..N процессах -
+   секунд аудио в секунду и на одно ядро
+3) Время прогрева пула (загрузка модели в каждом процессе)
+
+Корпус - каталог с manifest.jsonl ({"audio": "1.ogg", "text": "..."} в строке)
+или, без --corpus, реплики ниже, озвученные gTTS (нужна сеть) и
+декодированные тем же ffmpeg, что и голосовые (audio_decode)
+
+    python benchmark_stt.py --model models/vosk-model-small-ru-0.22
+    python benchmark_stt.py --corpus recordings/ --workers 1 2 4 --google
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import time
+from typing import List, Tuple
+from audio_decode import decode_to_pcm, pcm_duration
+from stt_engines import DEFAULT_VOSK_MODEL, GoogleEngine, VoskEngine
+
+# Числа словами: так их произносят и так их возвращает Vosk
+PHRASES = [
+    "здравствуйте хочу забронировать столик",
+    "на завтра на семь вечера на двоих",
+    "меня зовут анна",
+    "мой телефон восемь девятьсот шестнадцать пятьсот пятьдесят пять двенадцать тридцать четыре",
+    "нас будет четыре человека",
+    "можно столик у окна",
+    "в пятницу в восемь вечера",
+    "хотим отметить день рождения нужен большой стол",
+    "а какое у вас меню",
+    "во сколько вы работаете",
+    "какой у вас адрес",
+    "есть места на террасе",
+    "на субботу на шесть человек",
+    "подтверждаю бронь",
+    "отмените пожалуйста мою бронь",
+]
+
+
+def load_corpus(path: str) -> List[Tuple[bytes, str]]:
+    corpus = []
+    with open(os.path.join(path, 'manifest.jsonl'), encoding='utf-8') as manifest:
+        for line in manifest:
+            if line.strip():
+                item = json.loads(line)
+                with open(os.path.join(path, item['audio']), 'rb') as file:
+                    corpus.append((decode_to_pcm(file.read()), item['text']))
+    return corpus
+
+
+def synthesize_corpus() -> List[Tuple[bytes, str]]:
+    import io
+    from gtts import gTTS
+
+    corpus = []
+    for text in PHRASES:
+        mp3 = io.BytesIO()
+        gTTS(text=text, lang='ru', slow=False).write_to_fp(mp3)
+        corpus.append((decode_to_pcm(mp3.getvalue()), text))
+    return corpus
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r'\w+', (text or '').lower().replace('ё', 'е'))
+
+
+def word_errors(reference: str, hypothesis: str) -> int:
+    """Расстояние Левенштейна по словам"""
+    ref, hyp = _words(reference), _words(hypothesis)
+    row = list(range(len(hyp) + 1))
+    for i, word in enumerate(ref, 1):
+        previous, row[0] = row[0], i
+        for j, other in enumerate(hyp, 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (word != other))
+    return row[-1]
+
+
+async def single(engine, corpus: List[Tuple[bytes, str]]):
+    """RTF и WER по одной реплике за раз"""
+    rtfs = []
+    errors = 0
+    words = 0
+    for pcm, text in corpus:
+        started = time.perf_counter()
+        hypothesis = await engine.transcribe(pcm)
+        rtfs.append((time.perf_counter() - started) / pcm_duration(pcm))
+        errors += word_errors(text, hypothesis)
+        words += len(_words(text))
+    ordered = sorted(rtfs)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{engine.name:<8} RTF p50 {statistics.median(ordered):.3f}   p95 {p95:.3f}   "
+          f"WER {errors / max(1, words) * 100:.1f}%")
+
+
+async def throughput(engine: VoskEngine, corpus: List[Tuple[bytes, str]], repeat: int) -> float:
+    """Секунд аудио за секунду, все реплики одновременно"""
+    batch = [pcm for pcm, _ in corpus] * repeat
+    started = time.perf_counter()
+    await asyncio.gather(*(engine.transcribe(pcm) for pcm in batch))
+    return sum(pcm_duration(pcm) for pcm in batch) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Распознавание речи: RTF и пропускная способность")
+    parser.add_argument('--model', default=os.environ.get('VOSK_MODEL', DEFAULT_VOSK_MODEL))
+    parser.add_argument('--corpus', help="каталог с manifest.jsonl")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, os.cpu_count() or 1])
+    parser.add_argument('--repeat', type=int, default=4, help="повторов корпуса в замере пропускной способности")
+    parser.add_argument('--google', action='store_true', help="замерить и recognize_google (сеть)")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthesize_corpus()
+    print(f"🎤 Реплик: {len(corpus)}, аудио {sum(pcm_duration(pcm) for pcm, _ in corpus):.1f} с, "
+          f"ядер: {os.cpu_count()}")
+
+    engine = VoskEngine(args.model, workers=1)
+    engine.warm()
+    asyncio.run(single(engine, corpus))
+    engine.close()
+
+    if args.google:
+        asyncio.run(single(GoogleEngine(), corpus))
+
+    for workers in sorted(set(args.workers)):
+        engine = VoskEngine(args.model, workers=workers)
+        started = time.perf_counter()
+        engine.warm()
+        warm = time.perf_counter() - started
+        speed = asyncio.run(throughput(engine, corpus, args.repeat))
+        engine.close()
+        print(f"⚡ {workers} проц.: прогрев {warm:.1f} с, {speed:.1f} с аудио/с, {speed / workers:.1f} на ядро")
+
+
+if __name__ == "__main__":
+    main()
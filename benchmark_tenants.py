@@ -0,0 +1,137 @@
+"""
+Бенчмарк нескольких ресторанов
+Для 1, 10, 100 и 500 ресторанов (общая база и файл на ресторан) измеряет
+задержку типичных запросов бота к случайному ресторану: поиск свободных
+столиков, меню из кэша и бронирование. Задержка не должна расти с числом ресторанов
+
+    python benchmark_tenants.py --sizes 1,10,100,500 --requests 3000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from db_pool import db_connection
+from occupancy import get_occupancy
+from reservations import reserve_table
+from restaurant_cache import get_cache
+from tenants import TenantRouter
+
+TABLES_PER_TENANT = 12
+MENU_PER_TENANT = 30
+BOOKINGS_PER_TENANT = 200
+DATES = [f"2025-12-{day:02d}" for day in range(1, 31)]
+TIMES = [f"{hour:02d}:{minute:02d}" for hour in range(12, 23) for minute in (0, 30)]
+
+
+def seed_tenant(router: TenantRouter, restaurant_id: int, rng: random.Random):
+    tenant = router.provision(restaurant_id, f"Ресторан {restaurant_id}")
+    with db_connection(tenant.db_path) as conn:
+        conn.executemany(
+            "INSERT INTO tables (restaurant_id, table_number, seats_count, location_type) VALUES (?, ?, ?, ?)",
+            [(restaurant_id, str(number), rng.choice([2, 4, 6, 8]), rng.choice(['window', 'center', 'vip']))
+             for number in range(1, TABLES_PER_TENANT + 1)]
+        )
+        conn.executemany(
+            "INSERT INTO menu_items (restaurant_id, category, name, description, price) VALUES (?, ?, ?, ?, ?)",
+            [(restaurant_id, rng.choice(['Салаты', 'Горячее', 'Десерты']), f"Блюдо {i}", "", 10.0 + i)
+             for i in range(MENU_PER_TENANT)]
+        )
+        table_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM tables WHERE restaurant_id = ?", (restaurant_id,)
+        ).fetchall()]
+    for _ in range(BOOKINGS_PER_TENANT):
+        reserve_table(tenant.db_path, rng.choice(table_ids), "Гость", "+70000000000",
+                      rng.choice(DATES), rng.choice(TIMES), rng.randint(1, 6), restaurant_id=restaurant_id)
+
+
+def search_tables(tenant, date: str, time_value: str, guests: int):
+    """То же, что AIBrain._search_tables"""
+    with db_connection(tenant.db_path) as conn:
+        tables = conn.execute("""
+            SELECT t.id, t.table_number, t.seats_count, t.location_type, t.description
+            FROM tables t
+            WHERE t.restaurant_id = ? AND t.status = 'active' AND t.seats_count >= ?
+        """, (tenant.restaurant_id, guests)).fetchall()
+    return get_occupancy(tenant.db_path).free_tables(
+        date, time_value, guests, [table[0] for table in tables], restaurant_id=tenant.restaurant_id
+    )
+
+
+def get_menu(tenant):
+    """То же, что AIBrain._get_menu"""
+    def load(conn):
+        return conn.execute("""
+            SELECT category, name, description, price FROM menu_items
+            WHERE restaurant_id = ? ORDER BY category, name
+        """, (tenant.restaurant_id,)).fetchall()
+    return get_cache(tenant.db_path).get(tenant.restaurant_id, ('menu', None), load)
+
+
+def percentile(samples, fraction: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+
+
+def run(mode: str, tenants: int, requests: int, workdir: str, max_open: int) -> dict:
+    router = TenantRouter(mode, os.path.join(workdir, 'shared.db'), os.path.join(workdir, 'tenants'),
+                          max_open_tenants=max_open)
+    rng = random.Random(tenants)
+    for restaurant_id in range(1, tenants + 1):
+        seed_tenant(router, restaurant_id, rng)
+
+    # Прогрев: первый запрос к ресторану загружает кэш меню и индекс занятости
+    for restaurant_id in range(1, tenants + 1):
+        tenant = router.get(restaurant_id)
+        get_menu(tenant)
+        search_tables(tenant, DATES[0], TIMES[0], 2)
+
+    latencies = {'search': [], 'menu': [], 'booking': []}
+    for _ in range(requests):
+        tenant = router.get(rng.randint(1, tenants))
+        date, time_value, guests = rng.choice(DATES), rng.choice(TIMES), rng.randint(1, 6)
+        roll = rng.random()
+
+        started = time.perf_counter()
+        if roll < 0.7:
+            kind = 'search'
+            search_tables(tenant, date, time_value, guests)
+        elif roll < 0.9:
+            kind = 'menu'
+            get_menu(tenant)
+        else:
+            kind = 'booking'
+            free = search_tables(tenant, date, time_value, guests)
+            if free:
+                reserve_table(tenant.db_path, free[0], "Гость", "+70000000000", date, time_value, guests,
+                              restaurant_id=tenant.restaurant_id)
+        latencies[kind].append(time.perf_counter() - started)
+
+    return {kind: sorted(samples) for kind, samples in latencies.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка запросов при росте числа ресторанов")
+    parser.add_argument('--sizes', default='1,10,100,500')
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--modes', default='shared,per_file')
+    parser.add_argument('--max-open', type=int, default=128,
+                        help="per_file: сколько файлов держат открытые соединения")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    print(f"🏢 Ресторанов: {sizes}, запросов на прогон: {args.requests}")
+    print(f"{'режим':<9} {'ресторанов':>10} | {'поиск p50/p95, мс':>18} | {'меню p50/p95, мс':>17} | {'бронь p50/p95, мс':>18}")
+
+    for mode in args.modes.split(','):
+        for size in sizes:
+            with tempfile.TemporaryDirectory() as workdir:
+                result = run(mode, size, args.requests, workdir, args.max_open)
+            cells = []
+            for kind in ('search', 'menu', 'booking'):
+                samples = result[kind]
+                cells.append(f"{percentile(samples, 0.5):7.3f} / {percentile(samples, 0.95):7.3f}" if samples else "-")
+            print(f"{mode:<9} {size:>10} | {cells[0]:>18} | {cells[1]:>17} | {cells[2]:>18}")
+
+
+if __name__ == "__main__":
+    main()
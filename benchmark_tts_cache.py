@@ -0,0 +1,108 @@
+"""
+Кэш синтезированной речи: задержка озвучки ответа без кэша и с tts_cache
+Поток ответов бота, в котором часть фраз повторяется (приветствие, запасные
+фразы, ответы о меню и часах работы), озвучивается три раза:
+без кэша, с прогретым кэшем в памяти и после "перезапуска" (только диск).
+Синтез - gTTS (--gtts, нужна сеть) или имитация с логнормальной задержкой
+
+    python benchmark_tts_cache.py
+    python benchmark_tts_cache.py --gtts --replies 60
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from typing import List
+from model_backends import Latency
+from tts_cache import TTSCache
+
+UNIQUE_SHARE = 0.3  # доля ответов, которые не повторяются
+
+
+def reply_stream(count: int, rng: random.Random) -> List[str]:
+    static = [
+        "Извините, не совсем понял. Можете повторить?",
+        "Минутку, проверяю информацию...",
+        "Это важный запрос. Передаю менеджеру",
+        "Добро пожаловать в наш ресторан! Чем могу помочь?",
+        "Мы работаем с 10:00 до 23:00.",
+        "Наш адрес: ул. Пушкина, 1.",
+        "Извините, произошла техническая ошибка. Попробуйте еще раз.",
+        "На какое имя оформить бронь?",
+        "Сколько будет гостей?",
+    ]
+    return [f"Ваш столик номер {index} забронирован на {rng.randint(12, 22)}:00." if rng.random() < UNIQUE_SHARE
+            else rng.choice(static) for index in range(count)]
+
+
+def simulated_synthesis(latency: Latency, rng: random.Random):
+    async def synthesize(text: str) -> bytes:
+        await asyncio.sleep(latency.sample(rng))
+        return text.encode('utf-8') * 200  # порядок размера MP3 короткой фразы
+    return synthesize
+
+
+def gtts_synthesis():
+    import io
+    from gtts import gTTS
+
+    def blocking(text: str) -> bytes:
+        mp3 = io.BytesIO()
+        gTTS(text=text, lang='ru', slow=False).write_to_fp(mp3)
+        return mp3.getvalue()
+
+    async def synthesize(text: str) -> bytes:
+        return await asyncio.to_thread(blocking, text)
+    return synthesize
+
+
+async def voice(replies: List[str], synthesize, cache: TTSCache = None) -> List[float]:
+    latencies = []
+    for text in replies:
+        started = time.perf_counter()
+        if cache is None:
+            await synthesize(text)
+        else:
+            await cache.get_or_synthesize(text, synthesize)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def report(title: str, latencies: List[float]):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{title:<28} p50 {statistics.median(ordered) * 1000:8.2f} мс   p95 {p95 * 1000:8.2f} мс   "
+          f"всего {sum(ordered):6.2f} с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Кэш синтезированной речи")
+    parser.add_argument('--replies', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.8, help="медиана имитации синтеза, с")
+    parser.add_argument('--gtts', action='store_true', help="настоящий gTTS вместо имитации")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    replies = reply_stream(args.replies, rng)
+    synthesize = gtts_synthesis() if args.gtts else simulated_synthesis(Latency(args.latency, 0.3), rng)
+    print(f"🔊 Ответов: {len(replies)}, разных: {len(set(replies))}, "
+          f"синтез: {'gTTS' if args.gtts else f'имитация {args.latency:.2f} с'}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        report("без кэша", asyncio.run(voice(replies, synthesize)))
+
+        cache = TTSCache(directory)
+        report("tts_cache, первый проход", asyncio.run(voice(replies, synthesize, cache)))
+        report("tts_cache, память", asyncio.run(voice(replies, synthesize, cache)))
+
+        restarted = TTSCache(directory)
+        report("tts_cache, после перезапуска", asyncio.run(voice(replies, synthesize, restarted)))
+        print(f"📊 Память: {cache.stats()}")
+        print(f"📊 После перезапуска: {restarted.stats()}")
+
+
+if __name__ == "__main__":
+    main()
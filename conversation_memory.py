@@ -0,0 +1,273 @@
+import json
+import os
+import re
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+from db_pool import db_connection
+from log_writer import get_log_writer, utc_timestamp
+from slot_extractor import drop_past_dates
+
+logger = logging.getLogger(__name__)
+
+MEMORY_COLUMNS = ('restaurant_id', 'user_id', 'summary', 'slots', 'turns', 'folded', 'updated_at')
+
+TOKEN_BUDGET = 700    # история + сводка + данные брони + новое сообщение
+SUMMARY_BUDGET = 200  # сводка старых реплик (старые строки сводки вытесняются)
+CHARS_PER_TOKEN = 3   # оценка для русского текста
+
+SLOT_TITLES = {
+    'name': 'имя',
+    'phone': 'телефон',
+    'date': 'дата',
+    'time': 'время',
+    'guests': 'гостей',
+    'location': 'место'
+}
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = ' '.join(text.split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + '…'
+
+
+def _first_sentence(text: str) -> str:
+    match = re.search(r'[.!?…](\s|$)', text)
+    return text[:match.end()].strip() if match else text
+
+
+def parse_history(history: List[str]) -> List[Tuple[str, str]]:
+    """Строки 'Клиент: ...' / 'Бот: ...' (AIBrain._format_history) обратно в пары реплик"""
+    turns = []
+    message = None
+    for line in history:
+        if line.startswith('Клиент: '):
+            message = line[len('Клиент: '):]
+        elif line.startswith('Бот: ') and message is not None:
+            turns.append((message, line[len('Бот: '):]))
+            message = None
+    return turns
+
+
+class _UserMemory:
+    __slots__ = ('summary', 'slots', 'turns', 'folded', 'loaded', 'last_seen', 'lock')
+
+    def __init__(self):
+        self.summary: List[str] = []
+        self.slots: Dict[str, object] = {}
+        self.turns = 0    # всего реплик клиента
+        self.folded = 0   # реплик, вошедших в сводку (номер последней)
+        self.loaded = False
+        self.last_seen = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class MemoryView:
+    """Контекст одного запроса к ИИ и его размер"""
+
+    __slots__ = ('text', 'tokens', 'verbatim', 'summarized', 'slots')
+
+    def __init__(self, text: str, tokens: int, verbatim: int, summarized: int, slots: int):
+        self.text = text
+        self.tokens = tokens
+        self.verbatim = verbatim
+        self.summarized = summarized
+        self.slots = slots
+
+
+def shared_view(user_text: str) -> MemoryView:
+    """Контекст без истории и данных клиента: ответ можно отдавать другим клиентам (кэш ответов)"""
+    text = f"\nИСТОРИЯ ДИАЛОГА:\nПервое сообщение\n\nНОВОЕ СООБЩЕНИЕ КЛИЕНТА: {user_text}\n"
+    return MemoryView(text, estimate_tokens(text), 0, 0, 0)
+
+
+class ConversationMemory:
+    """
+    Память диалога в пределах бюджета токенов
+    Последние реплики идут в контекст дословно (пары вопрос-ответ целиком,
+    от новых к старым, пока хватает бюджета). Реплики, которые вышли из окна,
+    один раз сворачиваются в строку сводки - сводка дописывается, а не
+    пересчитывается, самые старые строки вытесняются по SUMMARY_BUDGET.
+    Данные брони (имя, телефон, дата, время, гости, место) закрепляются
+    отдельно и не теряются вместе со старыми репликами.
+    Состояние клиента хранится в conversation_memory (запись через журнал)
+    """
+
+    def __init__(self, db_path: str = 'restaurant.db', token_budget: int = TOKEN_BUDGET,
+                 summary_budget: int = SUMMARY_BUDGET, max_users: int = 10000):
+        self.db_path = db_path
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.max_users = max_users
+        self.log_writer = get_log_writer(db_path)
+
+        self._users: 'OrderedDict[Tuple[int, int], _UserMemory]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _user(self, key: Tuple[int, int]) -> _UserMemory:
+        with self._lock:
+            memory = self._users.get(key)
+            if memory is None:
+                memory = _UserMemory()
+                self._users[key] = memory
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            else:
+                self._users.move_to_end(key)
+            memory.last_seen = time.monotonic()
+            return memory
+
+    def is_loaded(self, user_id: int, restaurant_id: int = 1) -> bool:
+        memory = self._users.get((restaurant_id, user_id))
+        return memory is not None and memory.loaded
+
+    def load(self, user_id: int, restaurant_id: int = 1):
+        """Состояние клиента из базы (один запрос при первом обращении; блокирующий - через run_db)"""
+        memory = self._user((restaurant_id, user_id))
+        if memory.loaded:
+            return
+        self.log_writer.flush()
+        with db_connection(self.db_path) as conn:
+            row = conn.execute("""
+                SELECT summary, slots, turns, folded FROM conversation_memory
+                WHERE restaurant_id = ? AND user_id = ?
+            """, (restaurant_id, user_id)).fetchone()
+        with memory.lock:
+            if memory.loaded:
+                return
+            if row:
+                # Реплики, пришедшие до загрузки, добавляются к сохраненным
+                memory.summary = [line for line in row[0].split('\n') if line] + memory.summary
+                # Дата прошлого визита не должна попасть в новую бронь
+                memory.slots = drop_past_dates({**json.loads(row[1] or '{}'), **memory.slots})
+                memory.turns += row[2]
+                memory.folded = max(memory.folded, row[3])
+            memory.loaded = True
+            self._persist(restaurant_id, user_id, memory)
+
+    def observe(self, user_id: int, restaurant_id: int = 1):
+        """Реплика клиента сохранена: счетчик реплик (без запросов к базе)"""
+        memory = self._user((restaurant_id, user_id))
+        with memory.lock:
+            memory.turns += 1
+            if memory.loaded:
+                self._persist(restaurant_id, user_id, memory)
+
+    def pin(self, user_id: int, slots: Dict[str, object], restaurant_id: int = 1) -> Dict[str, object]:
+        """Закрепить данные брони из нового сообщения (slot_extractor); вернуть все собранные"""
+        memory = self._user((restaurant_id, user_id))
+        with memory.lock:
+            if slots:
+                memory.slots = drop_past_dates({**memory.slots, **slots})
+                if memory.loaded:
+                    self._persist(restaurant_id, user_id, memory)
+            return dict(memory.slots)
+
+    def slots(self, user_id: int, restaurant_id: int = 1) -> Dict[str, object]:
+        memory = self._users.get((restaurant_id, user_id))
+        return dict(memory.slots) if memory else {}
+
+    def build(self, user_id: int, user_text: str, history: List[Tuple[str, str]],
+              restaurant_id: int = 1) -> MemoryView:
+        """
+        Контекст запроса: закрепленные данные, сводка, последние реплики и новое сообщение
+        history - последние реплики по порядку (пары сообщение-ответ), последняя - самая новая
+        """
+        memory = self._user((restaurant_id, user_id))
+        pinned = dict(memory.slots)
+        message_part = f"\nНОВОЕ СООБЩЕНИЕ КЛИЕНТА: {user_text}\n"
+
+        with memory.lock:
+            # Счетчик мог отстать (история старше памяти) - номера по истории
+            memory.turns = max(memory.turns, len(history))
+            first_index = memory.turns - len(history) + 1
+
+            slots_part = self._render_slots(pinned)
+            budget = (self.token_budget - self.summary_budget
+                      - estimate_tokens(slots_part) - estimate_tokens(message_part))
+
+            # Дословно - новые пары целиком, пока хватает бюджета
+            verbatim: List[str] = []
+            used = 0
+            keep = 0
+            for position in range(len(history) - 1, -1, -1):
+                if first_index + position <= memory.folded:
+                    break
+                message, response = history[position]
+                pair = f"Клиент: {message}\nБот: {response}"
+                cost = estimate_tokens(pair)
+                if used + cost > budget:
+                    if verbatim:
+                        break
+                    # Самая новая пара не влезает целиком - сокращаем ответ, но пару не режем
+                    pair = f"Клиент: {_shorten(message, 300)}\nБот: {_shorten(response, max(80, budget * CHARS_PER_TOKEN - 320))}"
+                    cost = estimate_tokens(pair)
+                verbatim.insert(0, pair)
+                used += cost
+                keep += 1
+
+            # Вышедшие из окна реплики - в сводку, каждая один раз
+            folded_now = 0
+            for position in range(len(history) - keep):
+                index = first_index + position
+                if index <= memory.folded:
+                    continue
+                message, response = history[position]
+                memory.summary.append(f"- Клиент: {_shorten(message, 90)} → Бот: {_shorten(_first_sentence(response), 110)}")
+                memory.folded = index
+                folded_now += 1
+            while memory.summary and estimate_tokens('\n'.join(memory.summary)) > self.summary_budget:
+                memory.summary.pop(0)
+            if folded_now and memory.loaded:
+                self._persist(restaurant_id, user_id, memory)
+
+            parts = []
+            if slots_part:
+                parts.append(slots_part)
+            if memory.summary:
+                parts.append("КРАТКО О РАНЕЕ СКАЗАННОМ:\n" + '\n'.join(memory.summary))
+            parts.append("ИСТОРИЯ ДИАЛОГА:\n" + ('\n'.join(verbatim) if verbatim else "Первое сообщение"))
+            text = '\n' + '\n\n'.join(parts) + '\n' + message_part
+            return MemoryView(text, estimate_tokens(text), keep, memory.folded, len(pinned))
+
+    def forget(self, user_id: int, restaurant_id: int = 1):
+        """Сбросить данные брони (например, после успешного бронирования)"""
+        memory = self._user((restaurant_id, user_id))
+        with memory.lock:
+            # Имя и телефон пригодятся для следующей брони
+            memory.slots = {key: value for key, value in memory.slots.items() if key in ('name', 'phone')}
+            if memory.loaded:
+                self._persist(restaurant_id, user_id, memory)
+
+    @staticmethod
+    def _render_slots(slots: Dict[str, object]) -> str:
+        if not slots:
+            return ''
+        values = '; '.join(f"{SLOT_TITLES[key]}: {slots[key]}" for key in SLOT_TITLES if key in slots)
+        return f"ДАННЫЕ КЛИЕНТА (уже названы, не переспрашивай): {values}"
+
+    def _persist(self, restaurant_id: int, user_id: int, memory: _UserMemory):
+        self.log_writer.write('conversation_memory', MEMORY_COLUMNS, (
+            restaurant_id, user_id, '\n'.join(memory.summary), json.dumps(memory.slots, ensure_ascii=False),
+            memory.turns, memory.folded, utc_timestamp()
+        ))
+
+
+_memories: Dict[str, ConversationMemory] = {}
+_memories_lock = threading.Lock()
+
+
+def get_conversation_memory(db_path: str = 'restaurant.db') -> ConversationMemory:
+    """Общая память диалогов для файла базы (одна на процесс)"""
+    key = os.path.abspath(db_path)
+    with _memories_lock:
+        memory = _memories.get(key)
+        if memory is None:
+            memory = ConversationMemory(db_path)
+            _memories[key] = memory
+        return memory
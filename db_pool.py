@@ -0,0 +1,147 @@
+import os
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Настройки SQLite для всех соединений пула
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',          # читатели не блокируют писателя (бот и админка работают параллельно)
+    'synchronous': 'NORMAL',        # в режиме WAL безопасно и без fsync на каждый коммит
+    'busy_timeout': 5000,           # ждем блокировку до 5 секунд вместо мгновенной ошибки
+    'cache_size': -16000,           # ~16 МБ кэша страниц на соединение
+    'mmap_size': 128 * 1024 * 1024, # чтение через mmap (128 МБ)
+    'temp_store': 'MEMORY'
+}
+
+
+class ConnectionManager:
+    """
+    Пул соединений SQLite для одного файла базы
+    Соединение выдается потоку (или задаче в executor) на время блока with
+    и возвращается в пул, вместо connect/close на каждый запрос
+    """
+
+    def __init__(self, db_path: str = 'restaurant.db', pool_size: int = 8, pragmas: Optional[Dict] = None):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _open(self) -> sqlite3.Connection:
+        """Открываем новое соединение и применяем pragma"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.pragmas['busy_timeout'] / 1000,
+            check_same_thread=False
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._open()
+
+    def _release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """
+        Выдает соединение на время блока with
+        Коммит при успешном выходе, откат при исключении.
+        Вложенные блоки в том же потоке используют то же соединение,
+        коммит делает только внешний блок
+        """
+        depth = getattr(self._local, 'depth', 0)
+        if depth:
+            self._local.depth = depth + 1
+            try:
+                yield self._local.conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._local.depth = 0
+            self._local.conn = None
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self, immediate: bool = True):
+        """
+        Явная транзакция: BEGIN IMMEDIATE сразу берет блокировку записи,
+        поэтому проверка и вставка выполняются атомарно даже между процессами
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            yield conn
+
+    def close_all(self):
+        """Закрыть все свободные соединения пула"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_managers: Dict[str, ConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(db_path: str = 'restaurant.db') -> ConnectionManager:
+    """Общий менеджер соединений для файла базы (один на процесс)"""
+    key = os.path.abspath(db_path)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = ConnectionManager(db_path)
+            _managers[key] = manager
+            logger.info(f"💾 Пул соединений создан для {db_path}")
+        return manager
+
+
+def db_connection(db_path: str = 'restaurant.db'):
+    """
+    Соединение из общего пула:
+
+        with db_connection(self.db_path) as conn:
+            conn.execute(...)
+    """
+    return get_manager(db_path).connection()
+
+
+def db_transaction(db_path: str = 'restaurant.db', immediate: bool = True):
+    """Транзакция BEGIN IMMEDIATE на соединении из общего пула"""
+    return get_manager(db_path).transaction(immediate)
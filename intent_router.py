@@ -0,0 +1,276 @@
+"""
+Локальный классификатор намерений
+Простые вопросы (часы работы, адрес, телефон, меню, мои брони, приветствие)
+распознаются правилами до вызова Gemini и получают ответ по шаблону из данных
+базы. Все остальное, в том числе любые действия с бронью, уходит в ИИ.
+
+Дополнительно можно обучить легкую модель (наивный Байес по словам и парам
+слов, работает на CPU без зависимостей) на размеченных фразах:
+
+    python intent_router.py train intents.jsonl --out intent_model.json
+    python intent_router.py eval intents.jsonl --model intent_model.json
+
+Формат строки: {"text": "до скольки вы открыты", "intent": "hours"},
+фразы для ИИ размечаются intent "other"
+"""
+import argparse
+import json
+import math
+import os
+import re
+import threading
+import logging
+from typing import Dict, List, Optional, Tuple
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = 'intent_model.json'
+MODEL_THRESHOLD = 0.9
+MAX_WORDS = 15  # длинные сообщения почти всегда содержат больше одного вопроса
+
+# Намерение -> шаблоны (по нормализованному тексту)
+INTENT_RULES = {
+    'hours': [
+        r'\bчасы работы\b', r'\bвремя работы\b', r'\bрежим работы\b', r'\bграфик\b',
+        r'\bдо скольки\b', r'\bво сколько (вы )?(открыва|закрыва)',
+        r'\bкогда (вы )?(открыва|закрыва|работа)', r'\bвы (сейчас )?открыты\b'
+    ],
+    'address': [
+        r'\bадрес\b', r'\bгде (вы )?(находит|расположен)', r'\bкак (к вам |до вас )?(добраться|проехать|пройти)'
+    ],
+    'contacts': [
+        r'\b(ваш|ресторана) (номер|телефон)\b', r'\bтелефон (ресторана|для связи)\b', r'\bкак (с вами )?связаться\b'
+    ],
+    'menu': [
+        r'\bменю\b', r'\bкакие (у вас )?блюда\b', r'\bчто (у вас )?(можно )?(поесть|покушать)\b',
+        r'\bчто (у вас )?есть из\b', r'\bесть ли у вас\b', r'\bкакие (у вас )?есть\b'
+    ],
+    'my_bookings': [
+        r'\bмо(я|ю|и|е|ей|его|их) (брон|бронирован)', r'\bпровер\w* (мою |мои )?брон', r'\bпокажи\w* (мою |мои )?брон'
+    ],
+    'greeting': [
+        r'^(здравствуй(те)?|привет(ствую)?|добрый (день|вечер)|доброе утро|салам)$'
+    ]
+}
+
+# Действия и уточнения - только через ИИ (функции бронирования)
+HANDOFF_RULES = [
+    r'брониру|забронир|бронь на\b|столик', r'отмен', r'перен[еос]', r'измен|поменя', r'заказ',
+    r'\bчеловек|\bгост|\bперсон', r'\bне\b.*\b(работает|понял)'
+]
+
+_WORD = re.compile(r'[a-zа-я0-9+]+')
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр, ё -> е, без пунктуации"""
+    return ' '.join(_WORD.findall(text.lower().replace('ё', 'е')))
+
+
+class IntentMatch:
+    """Результат классификации: намерение, уверенность и источник (rules / model)"""
+
+    __slots__ = ('intent', 'confidence', 'source')
+
+    def __init__(self, intent: str, confidence: float, source: str):
+        self.intent = intent
+        self.confidence = confidence
+        self.source = source
+
+    def __repr__(self):
+        return f"IntentMatch({self.intent}, {self.confidence:.2f}, {self.source})"
+
+
+class NaiveBayesIntentModel:
+    """Мультиномиальный наивный Байес по словам и парам слов"""
+
+    def __init__(self):
+        self.class_counts: Dict[str, int] = {}
+        self.feature_counts: Dict[str, Dict[str, int]] = {}
+        self.totals: Dict[str, int] = {}
+        self.vocabulary: set = set()
+
+    @staticmethod
+    def features(text: str) -> List[str]:
+        words = normalize(text).split()
+        return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+    def train(self, examples: List[Tuple[str, str]]) -> 'NaiveBayesIntentModel':
+        for text, intent in examples:
+            self.class_counts[intent] = self.class_counts.get(intent, 0) + 1
+            counts = self.feature_counts.setdefault(intent, {})
+            for feature in self.features(text):
+                counts[feature] = counts.get(feature, 0) + 1
+                self.totals[intent] = self.totals.get(intent, 0) + 1
+                self.vocabulary.add(feature)
+        return self
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """(намерение, вероятность)"""
+        features = [feature for feature in self.features(text) if feature in self.vocabulary]
+        examples = sum(self.class_counts.values())
+        vocabulary = len(self.vocabulary)
+
+        scores = {}
+        for intent, count in self.class_counts.items():
+            counts = self.feature_counts.get(intent, {})
+            denominator = self.totals.get(intent, 0) + vocabulary
+            score = math.log(count / examples)
+            for feature in features:
+                score += math.log((counts.get(feature, 0) + 1) / denominator)
+            scores[intent] = score
+
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        probability = 1.0 / sum(math.exp(score - top) for score in scores.values())
+        return best, probability
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({
+                'class_counts': self.class_counts,
+                'feature_counts': self.feature_counts,
+                'totals': self.totals
+            }, file, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> 'NaiveBayesIntentModel':
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        model = cls()
+        model.class_counts = data['class_counts']
+        model.feature_counts = data['feature_counts']
+        model.totals = data['totals']
+        model.vocabulary = {feature for counts in model.feature_counts.values() for feature in counts}
+        return model
+
+
+class IntentRouter:
+    """
+    Быстрый путь перед AIBrain.process_message
+    Правила скомпилированы один раз; если правила молчат, спрашиваем модель
+    (если она обучена). Ответ только при одном уверенном намерении
+    """
+
+    def __init__(self, model: Optional[NaiveBayesIntentModel] = None, threshold: float = MODEL_THRESHOLD):
+        self.rules = {intent: [re.compile(pattern) for pattern in patterns] for intent, patterns in INTENT_RULES.items()}
+        self.handoff = [re.compile(pattern) for pattern in HANDOFF_RULES]
+        self.model = model
+        self.threshold = threshold
+
+        self._messages = 0
+        self._hits: Dict[str, int] = {}
+        self._declined = 0
+        self._lock = threading.Lock()
+
+    def classify(self, text: str) -> Optional[IntentMatch]:
+        """Уверенное простое намерение или None (тогда отвечает ИИ)"""
+        normalized = normalize(text)
+        if not normalized or len(normalized.split()) > MAX_WORDS:
+            return None
+        if any(pattern.search(normalized) for pattern in self.handoff):
+            return None
+
+        matched = {intent for intent, patterns in self.rules.items()
+                   if any(pattern.search(normalized) for pattern in patterns)}
+        if len(matched) == 1:
+            return IntentMatch(matched.pop(), 1.0, 'rules')
+        if matched:
+            return None  # несколько вопросов сразу
+
+        if self.model is not None:
+            intent, probability = self.model.predict(normalized)
+            if intent != 'other' and intent in self.rules and probability >= self.threshold:
+                return IntentMatch(intent, probability, 'model')
+        return None
+
+    def record(self, match: Optional[IntentMatch], answered: bool, seconds: float = 0.0):
+        """Учет сообщения: ответ быстрым путем, отказ шаблона (нет данных) или ИИ"""
+        with self._lock:
+            self._messages += 1
+            if answered:
+                self._hits[match.intent] = self._hits.get(match.intent, 0) + 1
+            elif match is not None:
+                self._declined += 1
+        if answered:
+            get_metrics().record('fast_path', seconds)
+
+    def stats(self) -> Dict:
+        """Доля сообщений без Gemini и оценка сэкономленного времени (по медианам fast_path и llm_turn)"""
+        with self._lock:
+            messages, hits, declined = self._messages, dict(self._hits), self._declined
+        answered = sum(hits.values())
+
+        metrics = get_metrics()
+        llm = metrics.percentile('llm_turn', 0.5)
+        fast = metrics.percentile('fast_path', 0.5) or 0.0
+        return {
+            'messages': messages,
+            'fast_path': answered,
+            'declined': declined,
+            'hit_rate': answered / messages if messages else 0.0,
+            'by_intent': hits,
+            'saved_seconds': answered * (llm - fast) if llm is not None else None
+        }
+
+    def reset(self):
+        with self._lock:
+            self._messages = 0
+            self._hits.clear()
+            self._declined = 0
+
+
+_router: Optional[IntentRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_intent_router() -> IntentRouter:
+    """Общий классификатор процесса (модель из intent_model.json, если файл есть)"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            path = os.environ.get('INTENT_MODEL', DEFAULT_MODEL_PATH)
+            model = None
+            if os.path.exists(path):
+                model = NaiveBayesIntentModel.load(path)
+                logger.info(f"🧭 Модель намерений загружена из {path}")
+            _router = IntentRouter(model)
+        return _router
+
+
+def _read_examples(path: str) -> List[Tuple[str, str]]:
+    with open(path, encoding='utf-8') as file:
+        rows = [json.loads(line) for line in file if line.strip()]
+    return [(row['text'], row['intent']) for row in rows]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Модель намерений для быстрого пути")
+    parser.add_argument('command', choices=['train', 'eval'])
+    parser.add_argument('examples', help="JSONL: {\"text\": ..., \"intent\": ...}")
+    parser.add_argument('--out', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH)
+    args = parser.parse_args(argv)
+
+    examples = _read_examples(args.examples)
+    if args.command == 'train':
+        NaiveBayesIntentModel().train(examples).save(args.out)
+        print(f"🧭 Модель обучена на {len(examples)} фразах: {args.out}")
+        return
+
+    model = NaiveBayesIntentModel.load(args.model) if os.path.exists(args.model) else None
+    router = IntentRouter(model)
+    correct = fast = wrong = 0
+    for text, intent in examples:
+        match = router.classify(text)
+        predicted = match.intent if match else 'other'
+        correct += predicted == intent
+        fast += match is not None
+        wrong += match is not None and predicted != intent
+    print(f"🧭 Точность: {correct / len(examples):.1%}, быстрым путем: {fast / len(examples):.1%}, "
+          f"ошибочно быстрым путем: {wrong}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Ключевые фразы эвристик
+Все словари эвристик (защита от инъекций, уверенность ответа ИИ, просьба
+позвать человека, предпочтения по столику, простые ответы simple_bot)
+собраны в один словарь категорий; на ресторан и язык он компилируется
+один раз - по выражению на категорию.
+
+Фраза ищется как подстрока (как раньше `phrase in text.lower()`), ё = е.
+Свои словари ресторана - JSON в KEYWORD_LEXICONS (или keyword_lexicons.json):
+
+    {"ru": {"complex_request": ["выпускной"]}, "restaurants": {"2": {"ru": {"human_request": ["оператор"]}}}}
+
+Фразы добавляются к стандартным категориям
+"""
+import json
+import os
+import re
+import threading
+import logging
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEXICONS_PATH = 'keyword_lexicons.json'
+DEFAULT_LANGUAGE = 'ru'
+
+# Язык -> категория -> фразы (порядок категорий важен для first())
+LEXICONS: Dict[str, Dict[str, List[str]]] = {
+    'ru': {
+        # Защита от Prompt Injection (AIBrain.sanitize_input)
+        'injection': [
+            'ignore', 'forget', 'delete', 'system', 'admin', 'root',
+            'drop table', 'truncate', 'bypass', 'override', 'disable'
+        ],
+        # Уверенность ответа ИИ (AITools.analyze_response_confidence)
+        'uncertainty': [
+            'возможно', 'наверное', 'кажется', 'не уверен', 'может быть',
+            'вероятно', 'думаю', 'предполагаю', 'не знаю точно'
+        ],
+        'data_missing': [
+            'не найден', 'нет информации', 'не могу найти',
+            'недоступно', 'отсутствует', 'не указано'
+        ],
+        'complex_request': [
+            'банкет', 'корпоратив', 'свадьба', 'день рождения',
+            'особое меню', 'аллергия', 'диета', 'жалоба', 'проблема'
+        ],
+        # Нужен человек (AITools.should_request_human_help)
+        'human_request': [
+            'хочу говорить с человеком', 'соедините с менеджером',
+            'позовите администратора', 'живой сотрудник',
+            'не хочу с ботом', 'вы робот?'
+        ],
+        'confusion': ['не понял', 'повторите', 'что?', 'как?'],
+        # Расположение столика (AITools.get_table_by_preference)
+        'location:window': ['окн', 'вид'],
+        'location:stage': ['сцен', 'музык'],
+        'location:quiet': ['тих', 'спокой'],
+        'location:vip': ['vip', 'вип'],
+        'location:bar': ['бар'],
+        'location:terrace': ['террас'],
+        'location:banquet': ['банкет', 'больш'],
+        # Ответы simple_bot без ИИ
+        'faq:menu': ['меню'],
+        'faq:hours': ['время', 'работа'],
+        'faq:address': ['адрес']
+    }
+}
+
+
+def _fold(text: str) -> str:
+    return text.lower().replace('ё', 'е')
+
+
+class KeywordMatcher:
+    """
+    Словарь категорий: на категорию - одно скомпилированное выражение из
+    альтернатив ее фраз (длинные раньше коротких)
+    """
+
+    def __init__(self, lexicon: Dict[str, Iterable[str]]):
+        self.categories: Tuple[str, ...] = tuple(lexicon)
+        self._phrases: Dict[str, Tuple[str, ...]] = {}
+        self._patterns: Dict[str, 're.Pattern'] = {}
+        for category, phrases in lexicon.items():
+            folded = tuple(sorted({_fold(phrase) for phrase in phrases if phrase}, key=len, reverse=True))
+            if folded:
+                self._phrases[category] = folded
+                self._patterns[category] = re.compile('|'.join(map(re.escape, folded)))
+
+    def scan(self, text: str) -> Dict[str, FrozenSet[str]]:
+        """Категория -> найденные фразы (в порядке категорий словаря)"""
+        if not text:
+            return {}
+        folded = _fold(text)
+        return {category: frozenset(phrase for phrase in self._phrases[category] if phrase in folded)
+                for category, pattern in self._patterns.items() if pattern.search(folded)}
+
+    def phrases(self, text: str, category: str) -> FrozenSet[str]:
+        """Фразы одной категории в тексте"""
+        if not self.has(text, category):
+            return frozenset()
+        folded = _fold(text)
+        return frozenset(phrase for phrase in self._phrases[category] if phrase in folded)
+
+    def has(self, text: str, category: str) -> bool:
+        pattern = self._patterns.get(category)
+        return bool(text) and pattern is not None and pattern.search(_fold(text)) is not None
+
+    def count(self, text: str, category: str) -> int:
+        """Сколько разных фраз категории в тексте"""
+        folded = _fold(text)
+        return sum(1 for phrase in self._phrases.get(category, ()) if phrase in folded)
+
+    def first(self, text: str, prefix: str) -> Optional[str]:
+        """Первая по порядку словаря категория с этим префиксом (без префикса), например 'location:'"""
+        folded = _fold(text)
+        for category, pattern in self._patterns.items():
+            if category.startswith(prefix) and pattern.search(folded):
+                return category[len(prefix):]
+        return None
+
+
+def _load_custom(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ Не удалось загрузить словари ключевых фраз {path}: {e}")
+        return {}
+
+
+def build_lexicon(restaurant_id: int = 1, language: str = DEFAULT_LANGUAGE,
+                  custom: Optional[Dict] = None) -> Dict[str, List[str]]:
+    """Стандартный словарь языка + общие и ресторанные дополнения"""
+    lexicon = {category: list(phrases) for category, phrases in LEXICONS.get(language, LEXICONS[DEFAULT_LANGUAGE]).items()}
+    custom = custom or {}
+    for extra in (custom.get(language, {}), custom.get('restaurants', {}).get(str(restaurant_id), {}).get(language, {})):
+        for category, phrases in extra.items():
+            lexicon.setdefault(category, []).extend(phrases)
+    return lexicon
+
+
+_matchers: Dict[Tuple[int, str], KeywordMatcher] = {}
+_custom: Optional[Dict] = None
+_matchers_lock = threading.Lock()
+
+
+def get_keyword_matcher(restaurant_id: int = 1, language: str = DEFAULT_LANGUAGE) -> KeywordMatcher:
+    """Общий скомпилированный словарь ресторана и языка (строится один раз на процесс)"""
+    global _custom
+    key = (restaurant_id, language)
+    with _matchers_lock:
+        matcher = _matchers.get(key)
+        if matcher is None:
+            if _custom is None:
+                _custom = _load_custom(os.environ.get('KEYWORD_LEXICONS', DEFAULT_LEXICONS_PATH))
+            matcher = KeywordMatcher(build_lexicon(restaurant_id, language, _custom))
+            _matchers[key] = matcher
+        return matcher
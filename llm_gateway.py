@@ -0,0 +1,319 @@
+"""
+Шлюз запросов к модели
+Все generate_content идут через один шлюз процесса:
+- не больше max_concurrency запросов одновременно (свой пул потоков) и
+  не больше per_user_concurrency от одного пользователя
+- общий и пользовательский token bucket (запросов в секунду с запасом burst)
+- дедлайн на весь вызов, включая ожидание в очереди и повторы
+- повтор временных ошибок (429, 5xx, таймауты) с экспоненциальной паузой и джиттером
+- circuit breaker: после серии временных ошибок запросы не отправляются
+  reset_timeout секунд, затем пропускается один пробный
+Ожидание в очереди и время самого запроса пишутся в метрики llm_queue и llm_service
+"""
+import asyncio
+import random
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+from metrics import get_counters, get_metrics
+
+logger = logging.getLogger(__name__)
+
+LLM_CONCURRENCY = 8
+PER_USER_CONCURRENCY = 2
+GLOBAL_RATE = 20.0  # запросов в секунду
+GLOBAL_BURST = 40
+USER_RATE = 1.0
+USER_BURST = 6  # один шаг цикла function calling - один запрос
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.5  # секунд
+BREAKER_THRESHOLD = 5
+BREAKER_RESET = 30.0  # секунд
+
+# Временные ошибки провайдера (google.api_core.exceptions и сетевые), по имени класса
+TRANSIENT_ERRORS = {
+    'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable', 'InternalServerError',
+    'DeadlineExceeded', 'GatewayTimeout', 'BadGateway', 'Aborted', 'RetryError'
+}
+
+
+class LLMUnavailable(Exception):
+    """Запрос к модели не выполнен: ответить нужно без нее"""
+
+
+class CircuitOpenError(LLMUnavailable):
+    """Модель недоступна (circuit breaker разомкнут)"""
+
+
+class RateLimitedError(LLMUnavailable):
+    """Лимит запросов не освободился до дедлайна"""
+
+
+class StreamInterrupted(Exception):
+    """Поток ответа оборвался после первых фрагментов - повтор продублировал бы текст"""
+
+
+def is_transient(error: BaseException) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше burst в запасе"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Забрать токен; вернуть, сколько секунд подождать до его появления"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self):
+        self.tokens = min(self.burst, self.tokens + 1)
+
+
+class CircuitBreaker:
+    """closed -> (threshold временных ошибок подряд) -> open -> (reset_timeout) -> half_open"""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, reset_timeout: float = BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._trial = False
+            if self.state == 'half_open' and not self._trial:
+                self._trial = True  # один пробный запрос
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            if self.state != 'closed':
+                logger.info("✅ Модель снова отвечает, circuit breaker замкнут")
+            self.state = 'closed'
+            self.failures = 0
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.threshold:
+                if self.state != 'open':
+                    logger.warning(f"🔌 Circuit breaker разомкнут на {self.reset_timeout:.0f} с после {self.failures} ошибок")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Пробный запрос не дошел до модели (например, отменен) - разрешить следующий"""
+        with self._lock:
+            self._trial = False
+
+
+class LLMGateway:
+    """Ограничения, повторы и circuit breaker для запросов к модели"""
+
+    def __init__(self, max_concurrency: int = LLM_CONCURRENCY, per_user_concurrency: int = PER_USER_CONCURRENCY,
+                 global_rate: float = GLOBAL_RATE, global_burst: int = GLOBAL_BURST,
+                 user_rate: float = USER_RATE, user_burst: int = USER_BURST,
+                 max_retries: int = MAX_RETRIES, backoff_base: float = BACKOFF_BASE,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.max_concurrency = max_concurrency
+        self.per_user_concurrency = per_user_concurrency
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.breaker = breaker or CircuitBreaker()
+
+        # Свой пул: зависшие запросы к модели не занимают пул asyncio.to_thread
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='llm')
+        self._global_bucket = TokenBucket(global_rate, global_burst)
+        self._user_buckets: Dict[Hashable, TokenBucket] = {}
+        self._user_slots: Dict[Hashable, asyncio.Semaphore] = {}
+        self._user_refs: Dict[Hashable, int] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop = None
+        self._in_flight = 0
+
+    def _semaphores(self):
+        # Семафоры привязаны к циклу событий, создаем их в том, где нас вызвали
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._user_slots = {}
+            self._user_refs = {}
+        return self._slots
+
+    def _hold_user_slot(self, user_id: Hashable) -> asyncio.Semaphore:
+        """Семафор пользователя живет, пока у него есть запросы в очереди или в работе"""
+        slot = self._user_slots.get(user_id)
+        if slot is None:
+            slot = asyncio.Semaphore(self.per_user_concurrency)
+            self._user_slots[user_id] = slot
+        self._user_refs[user_id] = self._user_refs.get(user_id, 0) + 1
+        return slot
+
+    def _drop_user_slot(self, user_id: Hashable):
+        refs = self._user_refs.get(user_id, 0) - 1
+        if refs <= 0:
+            self._user_refs.pop(user_id, None)
+            self._user_slots.pop(user_id, None)
+        else:
+            self._user_refs[user_id] = refs
+
+    def _user_bucket(self, user_id: Hashable) -> TokenBucket:
+        bucket = self._user_buckets.get(user_id)
+        if bucket is None:
+            if len(self._user_buckets) > 10000:
+                now = time.monotonic()
+                for idle in [key for key, value in self._user_buckets.items()
+                             if now - value.updated > value.burst / value.rate]:
+                    del self._user_buckets[idle]
+            bucket = TokenBucket(self.user_rate, self.user_burst)
+            self._user_buckets[user_id] = bucket
+        return bucket
+
+    async def _take_tokens(self, user_id: Optional[Hashable], deadline: float):
+        buckets = [self._global_bucket]
+        if user_id is not None:
+            buckets.append(self._user_bucket(user_id))
+        wait = max(bucket.reserve() for bucket in buckets)
+        if wait > 0:
+            if time.monotonic() + wait > deadline:
+                for bucket in buckets:
+                    bucket.refund()
+                get_counters().add('llm_rate_limited', 1)
+                raise RateLimitedError(f"лимит запросов освободится через {wait:.1f} с")
+            await asyncio.sleep(wait)
+
+    async def call(self, func: Callable, *args, user_id: Optional[Hashable] = None,
+                   timeout: float = 30.0, **kwargs) -> Any:
+        """
+        func(*args, **kwargs) в пуле шлюза с лимитами и повторами
+        Дедлайн (timeout) - на весь вызов; по его истечении asyncio.TimeoutError
+        """
+        deadline = time.monotonic() + timeout
+        slots = self._semaphores()
+        user_slot = self._hold_user_slot(user_id) if user_id is not None else None
+        try:
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    return await self._attempt(func, args, kwargs, user_id, user_slot, slots, deadline)
+                except Exception as e:
+                    if not is_transient(e):
+                        raise
+                    delay = random.uniform(0, self.backoff_base * 2 ** (attempt - 1))
+                    if attempt > self.max_retries or time.monotonic() + delay >= deadline:
+                        raise
+                    get_counters().add('llm_retries', 1)
+                    logger.warning(f"🔁 Временная ошибка модели ({type(e).__name__}), повтор {attempt} через {delay:.2f} с")
+                    await asyncio.sleep(delay)
+        finally:
+            if user_id is not None:
+                self._drop_user_slot(user_id)
+
+    async def _attempt(self, func: Callable, args, kwargs, user_id: Optional[Hashable],
+                       user_slot: Optional[asyncio.Semaphore], slots: asyncio.Semaphore, deadline: float) -> Any:
+        """Одна попытка: breaker, лимиты, очередь, запрос"""
+        if not self.breaker.allow():
+            get_counters().add('llm_breaker_rejected', 1)
+            raise CircuitOpenError("модель временно недоступна")
+
+        metrics = get_metrics()
+        queued = time.perf_counter()
+        acquired = []
+        try:
+            await self._take_tokens(user_id, deadline)
+            for slot in (user_slot, slots):
+                if slot is not None:
+                    await asyncio.wait_for(slot.acquire(), max(0.0, deadline - time.monotonic()))
+                    acquired.append(slot)
+        except BaseException:
+            for slot in acquired:
+                slot.release()
+            self.breaker.release_trial()
+            raise
+        metrics.record('llm_queue', time.perf_counter() - queued)
+
+        started = time.perf_counter()
+        self._in_flight += 1
+
+        def finished(_=None):
+            # Места освобождаются, когда поток действительно закончил (а не по таймауту ожидания)
+            self._in_flight -= 1
+            metrics.record('llm_service', time.perf_counter() - started)
+            for slot in acquired:
+                slot.release()
+
+        future = asyncio.get_running_loop().run_in_executor(self._executor, lambda: func(*args, **kwargs))
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), max(0.0, deadline - time.monotonic()))
+        except Exception as e:
+            if future.done():
+                finished()
+            else:
+                future.add_done_callback(finished)
+                future.add_done_callback(lambda task: task.cancelled() or task.exception())
+            if is_transient(e):
+                self.breaker.failure()
+            else:
+                self.breaker.release_trial()
+            raise
+        except BaseException:
+            # Отмена вызывающего: поток дорабатывает и сам освободит места
+            future.add_done_callback(finished)
+            self.breaker.release_trial()
+            raise
+        finished()
+        self.breaker.success()
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        summary = get_metrics().summary()
+        counters = get_counters().summary()
+        return {
+            'in_flight': self._in_flight,
+            'breaker': self.breaker.state,
+            'queue': summary.get('llm_queue'),
+            'service': summary.get('llm_service'),
+            'retries': counters.get('llm_retries', {}).get('total', 0),
+            'rate_limited': counters.get('llm_rate_limited', {}).get('total', 0),
+            'breaker_rejected': counters.get('llm_breaker_rejected', {}).get('total', 0)
+        }
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """Общий шлюз процесса (лимиты провайдера общие на ключ)"""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
@@ -0,0 +1,189 @@
+import atexit
+import os
+import queue
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Sequence
+from db_pool import db_connection
+
+logger = logging.getLogger(__name__)
+
+# Таблицы, в которые пишет журнал (имена колонок приходят только из кода)
+LOG_TABLES = {'conversations', 'ai_decisions_log', 'conversation_issues', 'conversation_memory', 'voice_file_ids'}
+
+# Таблицы состояния: строка по первичному ключу заменяется (порядок записи сохраняется)
+UPSERT_TABLES = {'conversation_memory', 'voice_file_ids'}
+
+
+def utc_timestamp() -> str:
+    """Время записи в формате CURRENT_TIMESTAMP (UTC), с микросекундами для порядка"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+class LogWriter:
+    """
+    Отложенная пакетная запись логов (write-behind)
+    write() кладет строку в ограниченную очередь и сразу возвращается,
+    фоновый поток пишет накопленное одной транзакцией на batch_size строк
+    или раз в flush_interval секунд. При переполнении строки отбрасываются
+    и считаются в dropped
+    """
+
+    def __init__(self, db_path: str = 'restaurant.db', max_queue: int = 10000,
+                 batch_size: int = 200, flush_interval: float = 0.2):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, table: str, columns: Sequence[str], values: Sequence) -> bool:
+        """Поставить строку в очередь записи (не блокирует)"""
+        if table not in LOG_TABLES:
+            raise ValueError(f"Неизвестная таблица журнала: {table}")
+        if self._closed:
+            self.dropped += 1
+            return False
+        try:
+            self._queue.put_nowait((table, tuple(columns), tuple(values)))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"⚠️ Очередь логов переполнена, отброшено строк: {self.dropped}")
+            return False
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Дождаться записи всего, что уже в очереди"""
+        if not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """Дописать очередь и остановить поток (вызывается и при выходе из процесса)"""
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'queue_depth': self.queue_depth,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'batches': self.batches
+        }
+
+    # ========== ФОНОВЫЙ ПОТОК ==========
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            rows, waiters = [], []
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                elif item is None:
+                    stop = True
+                    break
+                else:
+                    rows.append(item)
+                    if len(rows) >= self.batch_size:
+                        break
+                # Маркер flush - пишем сразу, не дожидаясь таймера
+                if waiters:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            self._write_batch(rows)
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _write_batch(self, rows):
+        if not rows:
+            return
+        grouped: Dict[tuple, list] = {}
+        for table, columns, values in rows:
+            grouped.setdefault((table, columns), []).append(values)
+        try:
+            with db_connection(self.db_path) as conn:
+                for (table, columns), values in grouped.items():
+                    conn.executemany(self._insert_sql(table, columns), values)
+            self.written += len(rows)
+            self.batches += 1
+        except Exception as e:
+            logger.error(f"❌ Ошибка пакетной записи логов ({len(rows)} строк): {e}")
+            self._write_one_by_one(rows)
+
+    def _write_one_by_one(self, rows):
+        """Запасной путь: одна битая строка не должна терять весь пакет"""
+        for table, columns, values in rows:
+            try:
+                with db_connection(self.db_path) as conn:
+                    conn.execute(self._insert_sql(table, columns), values)
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"❌ Строка лога в {table} не записана: {e}")
+
+    @staticmethod
+    def _insert_sql(table: str, columns: tuple) -> str:
+        placeholders = ', '.join('?' for _ in columns)
+        verb = "INSERT OR REPLACE" if table in UPSERT_TABLES else "INSERT"
+        return f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+_writers: Dict[str, LogWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_log_writer(db_path: str = 'restaurant.db') -> LogWriter:
+    """Общий писатель логов для файла базы (один на процесс)"""
+    key = os.path.abspath(db_path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = LogWriter(db_path)
+            _writers[key] = writer
+        return writer
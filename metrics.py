@@ -0,0 +1,147 @@
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyStats:
+    """Последние замеры по имени этапа (скользящее окно) и перцентили по ним"""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = deque(maxlen=self.window)
+                self._samples[name] = samples
+            samples.append(seconds)
+            self._counts[name] = self._counts.get(name, 0) + 1
+
+    def percentile(self, name: str, fraction: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """{этап: {count, p50, p95, p99, max}} в миллисекундах"""
+        with self._lock:
+            snapshot = {name: (sorted(samples), self._counts[name]) for name, samples in self._samples.items()}
+        result = {}
+        for name, (samples, count) in snapshot.items():
+            if not samples:
+                continue
+            pick = lambda fraction: samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+            result[name] = {
+                'count': count,
+                'p50': pick(0.5),
+                'p95': pick(0.95),
+                'p99': pick(0.99),
+                'max': samples[-1] * 1000
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+
+class Trace:
+    """Этапы обработки одного сообщения: [(этап, секунды)]"""
+
+    def __init__(self, stats: Optional[LatencyStats] = None):
+        self.stats = stats
+        self.steps: List[Tuple[str, float]] = []
+        self.tokens: Dict[str, int] = {}
+        self.started = time.perf_counter()
+
+    def add(self, name: str, seconds: float):
+        self.steps.append((name, seconds))
+        if self.stats is not None:
+            self.stats.record(name, seconds)
+
+    @contextmanager
+    def step(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def count(self, name: str, value: int):
+        """Накопить счетчик этапа (токены и т.п.)"""
+        self.tokens[name] = self.tokens.get(name, 0) + value
+        _counters.add(name, value)
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def format(self) -> str:
+        parts = [f"{name} {seconds * 1000:.0f}мс" for name, seconds in self.steps]
+        line = f"{' | '.join(parts)} = {self.total * 1000:.0f}мс"
+        if self.tokens:
+            line += " (" + ', '.join(f"{name}={value}" for name, value in self.tokens.items()) + ")"
+        return line
+
+
+class Counters:
+    """Суммы и средние счетчиков (например, токенов на запрос к модели)"""
+
+    def __init__(self):
+        self._totals: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, value: float):
+        with self._lock:
+            self._totals[name] = self._totals.get(name, 0) + value
+            self._counts[name] = self._counts.get(name, 0) + 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """{счетчик: {count, total, avg}}"""
+        with self._lock:
+            return {
+                name: {'count': self._counts[name], 'total': total, 'avg': total / self._counts[name]}
+                for name, total in self._totals.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+            self._counts.clear()
+
+
+_stats = LatencyStats()
+_counters = Counters()
+
+
+def get_metrics() -> LatencyStats:
+    """Общие замеры процесса"""
+    return _stats
+
+
+def get_counters() -> Counters:
+    """Общие счетчики процесса"""
+    return _counters
+
+
+@contextmanager
+def timed(name: str):
+    """Замер блока в общие метрики"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stats.record(name, time.perf_counter() - started)
@@ -0,0 +1,423 @@
+import os
+import threading
+import logging
+from typing import Callable, List, Tuple
+from db_pool import db_connection
+from occupancy import SEATING_RULES, LARGE_PARTY_MINUTES
+
+logger = logging.getLogger(__name__)
+
+# ========== МИГРАЦИИ ==========
+# Каждая миграция идемпотентна: ее можно безопасно применить к базе,
+# созданной старыми скриптами (reset_database.py, add_*.py)
+
+
+def _column_names(cursor, table: str) -> List[str]:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def _add_column(cursor, table: str, column: str, definition: str):
+    """ALTER TABLE ADD COLUMN только если колонки еще нет"""
+    if column not in _column_names(cursor, table):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _initial_schema(cursor):
+    """Базовая схема: все таблицы, которые использует проект"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS restaurants (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            phone TEXT,
+            address TEXT,
+            working_hours TEXT,
+            greeting_message TEXT DEFAULT 'Здравствуйте! Вас приветствует наш ресторан.',
+            ai_personality TEXT DEFAULT 'Ты дружелюбный помощник ресторана.',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bot_settings (
+            id INTEGER PRIMARY KEY,
+            restaurant_id INTEGER,
+            greeting_message TEXT,
+            ai_personality TEXT,
+            FOREIGN KEY (restaurant_id) REFERENCES restaurants (id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tables (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            restaurant_id INTEGER,
+            table_number TEXT NOT NULL,
+            seats_count INTEGER NOT NULL,
+            location_type TEXT,
+            description TEXT,
+            status TEXT DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (restaurant_id) REFERENCES restaurants (id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS menu_items (
+            id INTEGER PRIMARY KEY,
+            restaurant_id INTEGER,
+            category TEXT,
+            name TEXT,
+            description TEXT,
+            price REAL,
+            FOREIGN KEY (restaurant_id) REFERENCES restaurants (id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            restaurant_id INTEGER,
+            table_id INTEGER,
+            customer_name TEXT NOT NULL,
+            customer_phone TEXT NOT NULL,
+            booking_date DATE NOT NULL,
+            booking_time TIME NOT NULL,
+            guests_count INTEGER NOT NULL,
+            status TEXT DEFAULT 'новое',
+            special_requests TEXT,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (restaurant_id) REFERENCES restaurants (id),
+            FOREIGN KEY (table_id) REFERENCES tables (id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            user_name TEXT,
+            message_text TEXT NOT NULL,
+            bot_response TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ai_decisions_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            user_message TEXT,
+            ai_response TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_issues (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            user_text TEXT,
+            ai_response TEXT,
+            confidence_score REAL,
+            issue_type TEXT,
+            reasons TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            resolved BOOLEAN DEFAULT FALSE
+        )
+    """)
+
+
+def _missing_columns(cursor):
+    """Колонки, которые старые скрипты создавали не везде"""
+    _add_column(cursor, 'restaurants', 'greeting_message', "TEXT DEFAULT 'Здравствуйте! Вас приветствует наш ресторан.'")
+    _add_column(cursor, 'restaurants', 'ai_personality', "TEXT DEFAULT 'Ты дружелюбный помощник ресторана.'")
+    _add_column(cursor, 'bookings', 'table_id', "INTEGER")
+    _add_column(cursor, 'bookings', 'special_requests', "TEXT")
+    _add_column(cursor, 'bookings', 'notes', "TEXT")
+
+    cursor.execute("UPDATE menu_items SET restaurant_id = 1 WHERE restaurant_id IS NULL")
+
+
+def _query_indexes(cursor):
+    """Индексы под реальные запросы ai_brain.py, ai_tools.py, occupancy.py и web_interface.py"""
+    indexes = [
+        # Загрузка дня в движок занятости: WHERE booking_date = ? AND status != ... AND table_id IS NOT NULL
+        # (покрывающий: id берется из rowid)
+        "CREATE INDEX IF NOT EXISTS idx_bookings_date_table ON bookings (booking_date, table_id, booking_time, guests_count, status)",
+        # Бронирования клиента: WHERE customer_phone = ? ORDER BY booking_date DESC, booking_time DESC LIMIT 10
+        "CREATE INDEX IF NOT EXISTS idx_bookings_phone ON bookings (customer_phone, booking_date, booking_time)",
+        # Админка /bookings: WHERE restaurant_id = ? ORDER BY booking_date DESC, booking_time DESC
+        "CREATE INDEX IF NOT EXISTS idx_bookings_restaurant_date ON bookings (restaurant_id, booking_date, booking_time)",
+        # Дашборд: WHERE restaurant_id = ? ORDER BY created_at DESC LIMIT 5
+        "CREATE INDEX IF NOT EXISTS idx_bookings_restaurant_created ON bookings (restaurant_id, created_at)",
+        # Удаление столика: WHERE table_id = ? AND status NOT IN (...)
+        "CREATE INDEX IF NOT EXISTS idx_bookings_table_status ON bookings (table_id, status)",
+        # История диалога: WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?
+        "CREATE INDEX IF NOT EXISTS idx_conversations_user_time ON conversations (user_id, timestamp)",
+        # Меню: WHERE restaurant_id = ? [AND category = ?] ORDER BY category, name
+        "CREATE INDEX IF NOT EXISTS idx_menu_restaurant_category ON menu_items (restaurant_id, category, name)",
+        # Редактирование блюда: WHERE name = ?
+        "CREATE INDEX IF NOT EXISTS idx_menu_name ON menu_items (name)",
+        # Поиск столиков: WHERE restaurant_id = ? AND status = 'active' AND seats_count >= ?
+        "CREATE INDEX IF NOT EXISTS idx_tables_restaurant_status ON tables (restaurant_id, status, seats_count)"
+    ]
+    for sql in indexes:
+        cursor.execute(sql)
+
+
+# Начало бронирования в минутах от полуночи (время хранится как 'HH:MM')
+_START_MINUTES = "(CAST(substr({t}.booking_time, 1, 2) AS INTEGER) * 60 + CAST(substr({t}.booking_time, 4, 2) AS INTEGER))"
+# Длительность посадки для старых строк без duration_minutes
+DEFAULT_DURATION_MINUTES = 120
+
+
+def _overlap_guard(cursor):
+    """
+    Исключение пересечений на уровне базы: триггеры отклоняют вставку или перенос
+    бронирования, если столик уже занят в пересекающийся интервал
+    """
+    _add_column(cursor, 'bookings', 'duration_minutes', "INTEGER")
+
+    # Существующим бронированиям - длительность по размеру компании (до создания триггеров)
+    cases = ' '.join(f"WHEN guests_count <= {max_guests} THEN {minutes}" for max_guests, minutes in SEATING_RULES)
+    cursor.execute(f"""
+        UPDATE bookings SET duration_minutes = CASE {cases} ELSE {LARGE_PARTY_MINUTES} END
+        WHERE duration_minutes IS NULL
+    """)
+
+    # Индекс занятости становится покрывающим и для duration_minutes
+    cursor.execute("DROP INDEX IF EXISTS idx_bookings_date_table")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bookings_date_table
+        ON bookings (booking_date, table_id, booking_time, guests_count, duration_minutes, status)
+    """)
+
+    new_start = _START_MINUTES.format(t='NEW')
+    old_start = _START_MINUTES.format(t='b')
+    overlap = f"""
+        SELECT RAISE(ABORT, 'table_slot_conflict')
+        WHERE EXISTS (
+            SELECT 1 FROM bookings b
+            WHERE b.booking_date = NEW.booking_date
+            AND b.table_id = NEW.table_id
+            AND b.status != 'отменено'
+            AND b.id IS NOT NEW.id
+            AND {old_start} < {new_start} + COALESCE(NEW.duration_minutes, {DEFAULT_DURATION_MINUTES})
+            AND {old_start} + COALESCE(b.duration_minutes, {DEFAULT_DURATION_MINUTES}) > {new_start}
+        );
+    """
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS bookings_no_overlap_insert
+        BEFORE INSERT ON bookings
+        WHEN NEW.table_id IS NOT NULL AND NEW.status != 'отменено'
+        BEGIN
+            {overlap}
+        END
+    """)
+
+    # Смена статуса (в т.ч. из админки) не проверяется - только перенос
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS bookings_no_overlap_update
+        BEFORE UPDATE OF booking_date, booking_time, table_id, duration_minutes ON bookings
+        WHEN NEW.table_id IS NOT NULL AND NEW.status != 'отменено'
+        BEGIN
+            {overlap}
+        END
+    """)
+
+
+def _data_versions(cursor):
+    """
+    Версия статических данных ресторана (профиль, настройки бота, меню)
+    Триггеры увеличивают версию при любой записи - из админки, скриптов
+    или другого процесса, по ней кэш понимает, что данные устарели
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            restaurant_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    bump = """
+        INSERT INTO data_versions (restaurant_id, version) VALUES ({rid}, 1)
+        ON CONFLICT (restaurant_id) DO UPDATE SET version = version + 1;
+    """
+    sources = [
+        ('restaurants', 'id'),
+        ('bot_settings', 'restaurant_id'),
+        ('menu_items', 'restaurant_id')
+    ]
+    for table, column in sources:
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    {bump.format(rid=f'{row}.{column}')}
+                END
+            """)
+        # Перенос блюда в другой ресторан меняет оба
+        if column == 'restaurant_id':
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_version_update_old
+                AFTER UPDATE OF {column} ON {table}
+                WHEN OLD.{column} IS NOT NEW.{column}
+                BEGIN
+                    {bump.format(rid=f'OLD.{column}')}
+                END
+            """)
+
+
+def _log_time_indexes(cursor):
+    """Индексы по времени для логов: архивация выбирает и удаляет строки старше даты"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversations_time ON conversations (timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ai_decisions_time ON ai_decisions_log (timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_issues_time ON conversation_issues (timestamp)")
+
+
+def _tenant_partitioning(cursor):
+    """
+    Несколько ресторанов в одной базе: логи получают restaurant_id,
+    индексы горячих запросов начинаются с restaurant_id
+    """
+    for table in ('conversations', 'ai_decisions_log', 'conversation_issues'):
+        _add_column(cursor, table, 'restaurant_id', "INTEGER NOT NULL DEFAULT 1")
+
+    # Старые бронирования без ресторана - по ресторану столика
+    cursor.execute("""
+        UPDATE bookings SET restaurant_id = (SELECT t.restaurant_id FROM tables t WHERE t.id = bookings.table_id)
+        WHERE restaurant_id IS NULL AND table_id IS NOT NULL
+    """)
+
+    replaced = {
+        'idx_conversations_user_time':
+            "CREATE INDEX IF NOT EXISTS idx_conversations_restaurant_user_time ON conversations (restaurant_id, user_id, timestamp)",
+        'idx_menu_name':
+            "CREATE INDEX IF NOT EXISTS idx_menu_restaurant_name ON menu_items (restaurant_id, name)",
+        'idx_bookings_phone':
+            "CREATE INDEX IF NOT EXISTS idx_bookings_restaurant_phone ON bookings (restaurant_id, customer_phone, booking_date, booking_time)"
+    }
+    for old_index, sql in replaced.items():
+        cursor.execute(f"DROP INDEX IF EXISTS {old_index}")
+        cursor.execute(sql)
+
+    # Занятость столиков загружается по (ресторан, дата)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bookings_restaurant_day
+        ON bookings (restaurant_id, booking_date, table_id, booking_time, guests_count, duration_minutes, status)
+    """)
+    # Проверка номера столика в админке
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tables_restaurant_number ON tables (restaurant_id, table_number)")
+
+
+def _conversation_memory(cursor):
+    """Память диалога: сводка старых реплик и закрепленные данные брони (одна строка на клиента)"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_memory (
+            restaurant_id INTEGER NOT NULL DEFAULT 1,
+            user_id INTEGER NOT NULL,
+            summary TEXT NOT NULL DEFAULT '',
+            slots TEXT NOT NULL DEFAULT '{}',
+            turns INTEGER NOT NULL DEFAULT 0,
+            folded INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (restaurant_id, user_id)
+        )
+    """)
+
+
+def _voice_file_ids(cursor):
+    """file_id отправленных голосовых ответов: повторная отправка без загрузки аудио"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS voice_file_ids (
+            bot_id INTEGER NOT NULL,
+            audio_hash TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            size INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (bot_id, audio_hash)
+        )
+    """)
+
+
+# (версия, описание, функция)
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, 'Базовая схема', _initial_schema),
+    (2, 'Недостающие колонки старых баз', _missing_columns),
+    (3, 'Индексы под запросы бота и админки', _query_indexes),
+    (4, 'Защита от пересекающихся бронирований', _overlap_guard),
+    (5, 'Версии данных ресторана для кэша', _data_versions),
+    (6, 'Индексы по времени для архивации логов', _log_time_indexes),
+    (7, 'Разделение данных по ресторанам', _tenant_partitioning),
+    (8, 'Память диалога: сводка и данные брони', _conversation_memory),
+    (9, 'file_id голосовых ответов Telegram', _voice_file_ids)
+]
+
+
+# ========== ЗАПУСК ==========
+
+def current_version(conn) -> int:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate(db_path: str = 'restaurant.db', target_version: int = None) -> int:
+    """
+    Применить все недостающие миграции (до target_version включительно)
+    Каждая миграция - отдельная транзакция BEGIN IMMEDIATE, поэтому
+    несколько процессов (бот и админка) могут стартовать одновременно
+    """
+    target = target_version if target_version is not None else MIGRATIONS[-1][0]
+
+    with db_connection(db_path) as conn:
+        version = current_version(conn)
+        conn.commit()
+
+        for number, description, apply in MIGRATIONS:
+            if number <= version or number > target:
+                continue
+
+            conn.execute("BEGIN IMMEDIATE")
+            # Другой процесс мог применить миграцию, пока мы ждали блокировку
+            if current_version(conn) >= number:
+                conn.rollback()
+                continue
+
+            apply(conn.cursor())
+            conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)", (number, description))
+            conn.commit()
+            version = number
+            logger.info(f"🗄️ Миграция {number} применена: {description}")
+
+        return current_version(conn)
+
+
+_migrated = set()
+_migrated_lock = threading.Lock()
+
+
+def ensure_schema(db_path: str = 'restaurant.db'):
+    """Миграции один раз на процесс для файла базы"""
+    key = os.path.abspath(db_path)
+    with _migrated_lock:
+        if key in _migrated:
+            return
+        migrate(db_path)
+        _migrated.add(key)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    version = migrate()
+    print(f"✅ Схема базы данных обновлена до версии {version}")
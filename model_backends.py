@@ -0,0 +1,314 @@
+"""
+Бэкенды модели для AIBrain
+GeminiBackend - настоящий Gemini (google.generativeai)
+ScriptedBackend - детерминированная замена без сети для нагрузочных тестов и
+бенчмарков: по сообщению клиента выбирает function_call и текст ответа по
+сценарию, задержки берутся из заданного распределения (seed воспроизводит прогон)
+
+Модель бэкенда повторяет то, что AIBrain использует от Gemini:
+generate_content(contents, stream=False, **kwargs) -> ответ с
+candidates[0].content.parts (text / function_call), text и usage_metadata
+"""
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MODEL_NAME = 'gemini-1.5-flash'
+# Кэш контекста требует версию модели с номером
+CACHE_MODEL_NAME = 'models/gemini-1.5-flash-001'
+
+
+class GeminiBackend:
+    """Gemini через google.generativeai"""
+
+    name = 'gemini'
+
+    def __init__(self, api_key: str, model_name: str = MODEL_NAME, cache_model_name: str = CACHE_MODEL_NAME):
+        import google.generativeai as genai
+
+        self.genai = genai
+        self.model_name = model_name
+        self.cache_model_name = cache_model_name
+        genai.configure(api_key=api_key)
+
+    def create_tools(self, declarations: List[Dict]):
+        from google.generativeai.types import FunctionDeclaration, Tool
+
+        return [Tool(function_declarations=[FunctionDeclaration(**declaration) for declaration in declarations])]
+
+    def create_model(self, tools, system_instruction: str = None):
+        if system_instruction is None:
+            return self.genai.GenerativeModel(self.model_name, tools=tools)
+        return self.genai.GenerativeModel(self.model_name, tools=tools, system_instruction=system_instruction)
+
+    def create_cached_model(self, tools, system_instruction: str, display_name: str, ttl_minutes: int):
+        """(модель поверх кэша контекста, кэш); исключение, если кэш недоступен"""
+        from google.generativeai import caching
+
+        cached_content = caching.CachedContent.create(
+            model=self.cache_model_name,
+            display_name=display_name,
+            system_instruction=system_instruction,
+            tools=tools,
+            ttl=timedelta(minutes=ttl_minutes)
+        )
+        return self.genai.GenerativeModel.from_cached_content(cached_content=cached_content), cached_content
+
+    def delete_cached(self, cached_content):
+        cached_content.delete()
+
+    def function_response(self, name: str, response: Dict):
+        return self.genai.protos.Part(function_response=self.genai.protos.FunctionResponse(name=name, response=response))
+
+
+# ========== ДЕТЕРМИНИРОВАННАЯ ЗАМЕНА ==========
+
+class Latency:
+    """Логнормальная задержка: медиана и разброс (sigma=0 - всегда медиана)"""
+
+    def __init__(self, median: float = 0.6, sigma: float = 0.35, floor: float = 0.0):
+        self.median = median
+        self.sigma = sigma
+        self.floor = floor
+
+    def sample(self, rng: random.Random) -> float:
+        if self.median <= 0:
+            return 0.0
+        return max(self.floor, self.median * rng.lognormvariate(0.0, self.sigma))
+
+
+class ScriptedReply:
+    """Шаг сценария: вызовы функций [(имя, аргументы)] или текст"""
+
+    __slots__ = ('calls', 'text')
+
+    def __init__(self, text: str = '', calls: Optional[List[Tuple[str, Dict]]] = None):
+        self.text = text
+        self.calls = calls or []
+
+
+def _part(text: str = '', function_call=None):
+    return SimpleNamespace(text=text, function_call=function_call)
+
+
+class ScriptedResponse:
+    """Ответ в форме GenerateContentResponse (для stream=True - итерируется по фрагментам)"""
+
+    def __init__(self, parts: List, usage, chunks: Optional[List[str]] = None,
+                 chunk_delay: Callable[[], float] = None):
+        self.parts = parts
+        self.usage_metadata = usage
+        self._chunks = chunks
+        self._chunk_delay = chunk_delay
+
+    @property
+    def candidates(self):
+        return [SimpleNamespace(content=SimpleNamespace(role='model', parts=self.parts))]
+
+    @property
+    def text(self) -> str:
+        texts = [part.text for part in self.parts if part.text]
+        if not texts:
+            raise ValueError("ответ без текста (только function_call)")
+        return ''.join(texts)
+
+    def __iter__(self):
+        if self._chunks is None:
+            yield self
+            return
+        for chunk in self._chunks:
+            time.sleep(self._chunk_delay())
+            yield ScriptedResponse([_part(chunk)], None)
+
+
+class ScriptedModel:
+    """Модель сценария: без сети, безопасна для вызова из нескольких потоков"""
+
+    def __init__(self, backend: 'ScriptedBackend', system_instruction: str = None, cached: bool = False):
+        self.backend = backend
+        self.system_instruction = system_instruction or ''
+        self.cached = cached
+
+    def generate_content(self, contents, stream: bool = False, tool_config: Dict = None, **kwargs):
+        backend = self.backend
+        user_text = _user_message(contents)
+        step = sum(1 for content in contents[1:] if _role(content) == 'user')
+        results = _function_results(contents[-1]) if step else []
+
+        reply = backend.script(user_text, step, results)
+        if tool_config and tool_config.get('function_calling_config', {}).get('mode') == 'NONE' and reply.calls:
+            reply = ScriptedReply(backend.fallback_text)
+
+        time.sleep(backend.sample(backend.latency))
+
+        prompt_chars = len(self.system_instruction) + sum(len(str(content)) for content in contents)
+        cached_chars = len(self.system_instruction) if self.cached else 0
+        usage = SimpleNamespace(
+            prompt_token_count=prompt_chars // 4,
+            cached_content_token_count=cached_chars // 4,
+            candidates_token_count=max(1, len(reply.text) // 4) if reply.text else 8 * len(reply.calls)
+        )
+
+        if reply.calls:
+            parts = [_part(function_call=SimpleNamespace(name=name, args=args)) for name, args in reply.calls]
+            return ScriptedResponse(parts, usage, [] if stream else None)
+
+        parts = [_part(reply.text)]
+        if not stream:
+            # Без потока ответ приходит целиком: время генерации всех фрагментов сразу
+            time.sleep(sum(backend.sample(backend.chunk_latency) for _ in _chunks(reply.text)))
+            return ScriptedResponse(parts, usage)
+        return ScriptedResponse(parts, usage, _chunks(reply.text), lambda: backend.sample(backend.chunk_latency))
+
+
+class ScriptedBackend:
+    """
+    Детерминированная замена Gemini
+    script(user_text, step, results) -> ScriptedReply: step - номер запроса в цикле
+    function calling (0 - первый), results - ответы функций прошлого шага
+    """
+
+    name = 'scripted'
+
+    def __init__(self, script: Callable[[str, int, List[Dict]], ScriptedReply] = None,
+                 latency: Latency = None, chunk_latency: Latency = None, seed: int = 0):
+        self.script = script or restaurant_script
+        self.latency = latency or Latency(0.6, 0.35)
+        self.chunk_latency = chunk_latency or Latency(0.04, 0.2)
+        self.fallback_text = "Уточните, пожалуйста, что именно вас интересует?"
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self, latency: Latency) -> float:
+        with self._lock:
+            return latency.sample(self._rng)
+
+    def create_tools(self, declarations: List[Dict]):
+        return declarations
+
+    def create_model(self, tools, system_instruction: str = None):
+        return ScriptedModel(self, system_instruction)
+
+    def create_cached_model(self, tools, system_instruction: str, display_name: str, ttl_minutes: int):
+        return ScriptedModel(self, system_instruction, cached=True), None
+
+    def delete_cached(self, cached_content):
+        pass
+
+    def function_response(self, name: str, response: Dict):
+        return SimpleNamespace(function_response=SimpleNamespace(name=name, response=response))
+
+
+def _role(content) -> Optional[str]:
+    return content.get('role') if isinstance(content, dict) else getattr(content, 'role', None)
+
+
+def _user_message(contents) -> str:
+    first = contents[0]
+    text = first['parts'][0] if isinstance(first, dict) else str(first)
+    match = re.search(r'НОВОЕ СООБЩЕНИЕ КЛИЕНТА:\s*(.*)', text)
+    return match.group(1).strip() if match else text.strip()
+
+
+def _function_results(content) -> List[Dict]:
+    parts = content['parts'] if isinstance(content, dict) else getattr(content, 'parts', [])
+    results = []
+    for part in parts:
+        response = getattr(part, 'function_response', None)
+        if response is not None:
+            results.append({'name': response.name, 'response': dict(response.response)})
+    return results
+
+
+def _chunks(text: str, size: int = 24) -> List[str]:
+    """Фрагменты потока примерно по size символов, по границам слов"""
+    chunks, current = [], ''
+    for word in text.split(' '):
+        current = f"{current} {word}" if current else word
+        if len(current) >= size:
+            chunks.append(current + ' ')
+            current = ''
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# ========== СЦЕНАРИЙ РЕСТОРАНА ==========
+
+_TIME = re.compile(r'\b(\d{1,2})[:.](\d{2})\b')
+_GUESTS = re.compile(r'\bна (\d+)(?![\d:.])|\b(двоих|троих|четверых|пятерых|шестерых)\b')
+_PHONE = re.compile(r'\+?\d[\d\s\-()]{8,}\d')
+_NAME = re.compile(r'на имя (\w+)')
+_WORD_GUESTS = {'двоих': 2, 'троих': 3, 'четверых': 4, 'пятерых': 5, 'шестерых': 6}
+
+
+def _booking_args(text: str) -> Optional[Dict[str, Any]]:
+    lowered = text.lower()
+    time_match = _TIME.search(lowered)
+    if not time_match:
+        return None
+    date = datetime.now() + timedelta(days=1 if 'завтра' in lowered else 0)
+    guests = 2
+    guests_match = _GUESTS.search(lowered)
+    if guests_match:
+        guests = int(guests_match.group(1)) if guests_match.group(1) else _WORD_GUESTS[guests_match.group(2)]
+    return {
+        'date': date.strftime('%Y-%m-%d'),
+        'time': f"{int(time_match.group(1)):02d}:{time_match.group(2)}",
+        'guests': guests
+    }
+
+
+def restaurant_script(user_text: str, step: int, results: List[Dict]) -> ScriptedReply:
+    """Типичный диалог ресторана: поиск и бронь столика, брони по телефону, меню, информация"""
+    lowered = user_text.lower()
+    booking = _booking_args(user_text)
+    phone = _PHONE.search(user_text)
+    name = _NAME.search(user_text)
+
+    if step == 0:
+        if booking and re.search(r'стол|брон', lowered):
+            return ScriptedReply(calls=[('search_tables', booking)])
+        if phone and re.search(r'брон', lowered):
+            return ScriptedReply(calls=[('find_bookings', {'phone': re.sub(r'[\s\-()]', '', phone.group())})])
+        if re.search(r'меню|блюд|горяч|десерт|напит|салат', lowered):
+            return ScriptedReply(calls=[('get_menu', {})])
+        if re.search(r'адрес|час|работ|телефон|парковк', lowered):
+            return ScriptedReply(calls=[('get_restaurant_info', {})])
+        return ScriptedReply("Подскажите, пожалуйста, на какую дату и время и на сколько гостей нужен столик? "
+                             "Я проверю свободные места.")
+
+    result = results[0]['response'] if results else {}
+    tool = results[0]['name'] if results else ''
+
+    if tool == 'search_tables':
+        tables = result.get('tables') or []
+        if not tables:
+            return ScriptedReply(f"К сожалению, на {booking['time']} свободных столиков нет. "
+                                 f"Могу предложить другое время - например, на час позже?")
+        if name and phone:
+            return ScriptedReply(calls=[('create_booking', dict(
+                booking, name=name.group(1), phone=re.sub(r'[\s\-()]', '', phone.group()), table_id=tables[0]['id']
+            ))])
+        return ScriptedReply(f"Есть свободные столики: нашел {len(tables)} вариантов на {booking['time']}. "
+                             f"Лучший - столик №{tables[0]['number']}. На какое имя и телефон оформить бронь?")
+    if tool == 'create_booking':
+        if result.get('success'):
+            return ScriptedReply(f"Готово! Бронь №{result.get('booking_id')} оформлена на {booking['date']} в "
+                                 f"{booking['time']}, гостей: {booking['guests']}. Ждем вас!")
+        return ScriptedReply("Не получилось оформить бронь: этот столик только что заняли. Подобрать другой?")
+    if tool == 'find_bookings':
+        count = result.get('count', 0)
+        return ScriptedReply(f"Нашел бронирований по вашему номеру: {count}. Что-нибудь изменить?" if count
+                             else "По этому номеру бронирований нет. Хотите забронировать столик?")
+    if tool == 'get_menu':
+        dishes = ', '.join(item['name'] for item in (result.get('menu') or [])[:4])
+        return ScriptedReply(f"В нашем меню: {dishes}. Рекомендую попробовать что-нибудь из горячего!")
+    if tool == 'get_restaurant_info':
+        return ScriptedReply(f"Мы работаем {result.get('hours')}, адрес: {result.get('address')}. "
+                             f"Телефон: {result.get('phone')}. Будем рады вас видеть!")
+    return ScriptedReply("Чем еще могу помочь?")
@@ -0,0 +1,246 @@
+import bisect
+import os
+import threading
+import time as time_module
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+from db_pool import db_connection
+
+logger = logging.getLogger(__name__)
+
+# Сколько минут гости занимают столик в зависимости от размера компании:
+# (максимум гостей, минут). Для компаний больше последнего порога - LARGE_PARTY_MINUTES
+SEATING_RULES = [
+    (2, 90),
+    (4, 120),
+    (8, 150)
+]
+LARGE_PARTY_MINUTES = 180
+
+
+def parse_time(value: str) -> int:
+    """'19:30' или '19:30:00' -> минуты от начала дня"""
+    parts = str(value).strip().split(':')
+    if len(parts) < 2:
+        raise ValueError(f"Неверный формат времени: {value}")
+    hours, minutes = int(parts[0]), int(parts[1])
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"Неверное время: {value}")
+    return hours * 60 + minutes
+
+
+def format_time(minutes: int) -> str:
+    """Минуты от начала дня -> 'HH:MM'"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def seating_duration(guests: int, rules: List[Tuple[int, int]] = None, large_party: int = LARGE_PARTY_MINUTES) -> int:
+    """Длительность посадки в минутах для компании из guests человек"""
+    for max_guests, minutes in (rules or SEATING_RULES):
+        if guests <= max_guests:
+            return minutes
+    return large_party
+
+
+class _TableSlots:
+    """Отсортированные интервалы одного столика на один день"""
+
+    __slots__ = ('starts', 'intervals', 'max_ends')
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.intervals: List[Tuple[int, int, int]] = []  # (start, end, booking_id)
+        self.max_ends: List[int] = []                   # максимальный end среди интервалов [0..i]
+
+    def add(self, start: int, end: int, booking_id: int):
+        index = bisect.bisect_right(self.starts, start)
+        self.starts.insert(index, start)
+        self.intervals.insert(index, (start, end, booking_id))
+        self._rebuild_max_ends(index)
+
+    def remove(self, booking_id: int) -> bool:
+        for index, interval in enumerate(self.intervals):
+            if interval[2] == booking_id:
+                del self.starts[index]
+                del self.intervals[index]
+                del self.max_ends[index]
+                self._rebuild_max_ends(index)
+                return True
+        return False
+
+    def _rebuild_max_ends(self, index: int):
+        del self.max_ends[index:]
+        current = self.max_ends[-1] if self.max_ends else -1
+        for start, end, _ in self.intervals[index:]:
+            current = max(current, end)
+            self.max_ends.append(current)
+
+    def is_free(self, start: int, end: int) -> bool:
+        """Нет ли пересечения с [start, end)"""
+        # Интервалы, начинающиеся до end, - кандидаты на пересечение
+        index = bisect.bisect_left(self.starts, end)
+        return index == 0 or self.max_ends[index - 1] <= start
+
+
+class _DayIndex:
+    __slots__ = ('tables', 'built_at')
+
+    def __init__(self):
+        self.tables: Dict[int, _TableSlots] = {}
+        self.built_at = time_module.monotonic()
+
+
+class TableOccupancy:
+    """
+    Движок занятости столиков
+    Каждое бронирование - интервал [время, время + длительность посадки).
+    Индекс по (ресторан, дата) строится лениво одним запросом и дальше
+    обновляется при создании, отмене и изменении бронирований
+    """
+
+    def __init__(self, db_path: str = 'restaurant.db', seating_rules: List[Tuple[int, int]] = None,
+                 table_durations: Optional[Dict[int, int]] = None, max_age: float = 30.0):
+        self.db_path = db_path
+        self.seating_rules = seating_rules or SEATING_RULES
+        self.table_durations = table_durations or {}  # столик -> фиксированная длительность
+        self.max_age = max_age                        # пересборка дня, чтобы увидеть изменения из других процессов
+
+        self._days: Dict[Tuple[int, str], _DayIndex] = {}          # (ресторан, дата) -> индекс
+        self._bookings: Dict[int, Tuple[int, str, int, int, int]] = {}  # booking_id -> (ресторан, дата, столик, начало, гости)
+        self._lock = threading.RLock()
+
+    def duration_for(self, guests: int, table_id: int = None) -> int:
+        if table_id in self.table_durations:
+            return self.table_durations[table_id]
+        return seating_duration(guests or 1, self.seating_rules)
+
+    # ========== ИНДЕКС ==========
+
+    def _load_day(self, restaurant_id: int, date: str) -> _DayIndex:
+        with db_connection(self.db_path) as conn:
+            rows = conn.execute("""
+                SELECT id, table_id, booking_time, guests_count, duration_minutes
+                FROM bookings
+                WHERE restaurant_id = ?
+                AND booking_date = ?
+                AND status != 'отменено'
+                AND table_id IS NOT NULL
+            """, (restaurant_id, date)).fetchall()
+
+        day = _DayIndex()
+        for booking_id, table_id, booking_time, guests, duration in rows:
+            try:
+                start = parse_time(booking_time)
+            except ValueError:
+                logger.warning(f"⚠️ Пропускаю бронирование #{booking_id} с временем '{booking_time}'")
+                continue
+            end = start + (duration or self.duration_for(guests, table_id))
+            day.tables.setdefault(table_id, _TableSlots()).add(start, end, booking_id)
+            self._bookings[booking_id] = (restaurant_id, date, table_id, start, guests)
+        return day
+
+    def _day(self, restaurant_id: int, date: str) -> _DayIndex:
+        key = (restaurant_id, date)
+        day = self._days.get(key)
+        if day is None or time_module.monotonic() - day.built_at > self.max_age:
+            day = self._load_day(restaurant_id, date)
+            self._days[key] = day
+        return day
+
+    def invalidate(self, date: str = None, restaurant_id: int = None):
+        """Сбросить индекс дня (или всех дней) ресторана (или всех ресторанов)"""
+        with self._lock:
+            if date is None and restaurant_id is None:
+                self._days.clear()
+                self._bookings.clear()
+                return
+            for key in list(self._days):
+                if (date is None or key[1] == date) and (restaurant_id is None or key[0] == restaurant_id):
+                    del self._days[key]
+
+    # ========== ЗАПРОСЫ ==========
+
+    def is_free(self, table_id: int, date: str, time: str, guests: int = 2, duration: int = None,
+                restaurant_id: int = 1) -> bool:
+        """Свободен ли столик на интервал [time, time + duration)"""
+        start = parse_time(time)
+        end = start + (duration or self.duration_for(guests, table_id))
+        with self._lock:
+            slots = self._day(restaurant_id, date).tables.get(table_id)
+            return slots is None or slots.is_free(start, end)
+
+    def free_tables(self, date: str, time: str, guests: int, table_ids: Iterable[int], duration: int = None,
+                    restaurant_id: int = 1) -> List[int]:
+        """Какие из table_ids (столики ресторана) свободны на время посадки компании"""
+        start = parse_time(time)
+        with self._lock:
+            day = self._day(restaurant_id, date)
+            free = []
+            for table_id in table_ids:
+                slots = day.tables.get(table_id)
+                end = start + (duration or self.duration_for(guests, table_id))
+                if slots is None or slots.is_free(start, end):
+                    free.append(table_id)
+            return free
+
+    # ========== ИНКРЕМЕНТАЛЬНЫЕ ОБНОВЛЕНИЯ ==========
+
+    def add_booking(self, booking_id: int, table_id: int, date: str, time: str, guests: int, duration: int = None,
+                    restaurant_id: int = 1):
+        """Новое бронирование (вызывать после коммита)"""
+        if table_id is None:
+            return
+        start = parse_time(time)
+        end = start + (duration or self.duration_for(guests, table_id))
+        with self._lock:
+            day = self._days.get((restaurant_id, date))
+            if day is None:
+                return  # день еще не загружен - подтянется из базы при первом запросе
+            day.tables.setdefault(table_id, _TableSlots()).add(start, end, booking_id)
+            self._bookings[booking_id] = (restaurant_id, date, table_id, start, guests)
+
+    def remove_booking(self, booking_id: int):
+        """Бронирование отменено"""
+        with self._lock:
+            known = self._bookings.pop(booking_id, None)
+            if known is None:
+                return
+            restaurant_id, date, table_id, _, _ = known
+            day = self._days.get((restaurant_id, date))
+            if day and table_id in day.tables:
+                day.tables[table_id].remove(booking_id)
+
+    def move_booking(self, booking_id: int, date: str = None, time: str = None, guests: int = None, table_id: int = None):
+        """Бронирование изменено (дата, время, гости или столик)"""
+        with self._lock:
+            known = self._bookings.get(booking_id)
+            if known is None:
+                # Старое положение неизвестно - просто перечитаем новый день
+                if date:
+                    self.invalidate(date)
+                return
+            restaurant_id, old_date, old_table, old_start, old_guests = known
+            self.remove_booking(booking_id)
+            self.add_booking(
+                booking_id,
+                table_id if table_id is not None else old_table,
+                date or old_date,
+                time or format_time(old_start),
+                guests or old_guests,
+                restaurant_id=restaurant_id
+            )
+
+
+_engines: Dict[str, TableOccupancy] = {}
+_engines_lock = threading.Lock()
+
+
+def get_occupancy(db_path: str = 'restaurant.db') -> TableOccupancy:
+    """Общий движок занятости для файла базы (один на процесс)"""
+    key = os.path.abspath(db_path)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = TableOccupancy(db_path)
+            _engines[key] = engine
+        return engine
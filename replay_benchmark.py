@@ -0,0 +1,179 @@
+"""
+Прогон диалогов через AIBrain.process_message без сети
+Диалоги - записанные (таблица conversations или JSONL) или синтетические;
+модель - детерминированная замена Gemini (model_backends.ScriptedBackend) с
+заданным распределением задержек. Диалоги идут параллельно (--concurrency),
+реплики внутри диалога - по очереди, как у живого клиента. Печатает
+пропускную способность и p50/p95/p99 по этапам (llm#N, tool:*, очередь шлюза...)
+
+    python replay_benchmark.py --synthetic 200 --concurrency 50
+    python replay_benchmark.py --from-db restaurant.db --concurrency 20 --stream
+    python replay_benchmark.py --conversations dialogs.jsonl --latency 1.2 --sigma 0.5
+
+Формат JSONL: {"user_id": 1, "messages": ["Здравствуйте", "Хочу столик на завтра на 19:00"]}
+База ресторана всегда временная (демо-ресторан и столики), исходная не меняется
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from typing import Dict, List, Tuple
+from ai_brain import AIBrain
+from database import RestaurantDatabase
+from db_pool import db_connection
+from intent_router import get_intent_router
+from llm_gateway import LLMGateway
+from metrics import get_counters, get_metrics
+from model_backends import GeminiBackend, Latency, ScriptedBackend
+
+SYNTHETIC_TURNS = [
+    ["Здравствуйте", "Хочу столик на завтра на 19:00 на двоих",
+     "Забронируйте на имя Анна, телефон +994501112233, на завтра на 19:00 на двоих"],
+    ["Какие у вас часы работы?", "А что есть из горячего?", "Хочу столик на завтра на 20:30 на 4"],
+    ["Покажите мои брони, телефон +994501112233", "Спасибо"],
+    ["Есть ли у вас парковка?", "Нужен стол на завтра на 18:00 на троих"],
+    ["Что посоветуете из меню?", "Спасибо, до свидания"],
+]
+
+
+def synthetic_conversations(count: int, seed: int) -> List[Tuple[int, List[str]]]:
+    rng = random.Random(seed)
+    return [(100000 + i, list(rng.choice(SYNTHETIC_TURNS))) for i in range(count)]
+
+
+def conversations_from_db(db_path: str, restaurant_id: int, limit: int) -> List[Tuple[int, List[str]]]:
+    """Реплики клиентов из таблицы conversations (база открывается только на чтение)"""
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("""
+            SELECT user_id, message_text FROM conversations
+            WHERE restaurant_id = ? AND message_text IS NOT NULL AND message_text NOT LIKE '/%'
+            ORDER BY user_id, timestamp, id
+        """, (restaurant_id,)).fetchall()
+    finally:
+        conn.close()
+    dialogs: Dict[int, List[str]] = {}
+    for user_id, text in rows:
+        dialogs.setdefault(user_id, []).append(text)
+    return list(dialogs.items())[:limit]
+
+
+def conversations_from_file(path: str) -> List[Tuple[int, List[str]]]:
+    with open(path, encoding='utf-8') as file:
+        rows = [json.loads(line) for line in file if line.strip()]
+    return [(row['user_id'], row['messages']) for row in rows]
+
+
+def prepare_database(db_path: str, tables: int = 20):
+    """Демо-ресторан и столики для поиска и броней"""
+    RestaurantDatabase(db_path)
+    rng = random.Random(0)
+    with db_connection(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO tables (restaurant_id, table_number, seats_count, location_type) VALUES (1, ?, ?, ?)",
+            [(str(number), rng.choice([2, 4, 6]), rng.choice(['window', 'center', 'vip'])) for number in range(1, tables + 1)]
+        )
+
+
+async def replay(brain: AIBrain, dialogs: List[Tuple[int, List[str]]], concurrency: int, stream: bool) -> int:
+    semaphore = asyncio.Semaphore(concurrency)
+    metrics = get_metrics()
+
+    async def on_text(piece: str):
+        pass
+
+    async def run_dialog(user_id: int, messages: List[str]) -> int:
+        async with semaphore:
+            for text in messages:
+                started = time.perf_counter()
+                history = await brain.get_conversation_history_async(user_id)
+                metrics.record('history', time.perf_counter() - started)
+
+                answer = await brain.process_message(user_id, text, history, on_text if stream else None)
+                brain.save_conversation(user_id, "Replay", text, answer)
+                metrics.record('turn', time.perf_counter() - started)
+            return len(messages)
+
+    return sum(await asyncio.gather(*(run_dialog(user_id, messages) for user_id, messages in dialogs)))
+
+
+def print_report(turns: int, elapsed: float):
+    print(f"\n📈 Реплик: {turns} за {elapsed:.2f} с - {turns / elapsed:.1f} реплик/с")
+    print(f"{'этап':<28} {'count':>7} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'max, мс':>9}")
+    summary = get_metrics().summary()
+    order = lambda name: (name != 'turn', name)
+    for name in sorted(summary, key=order):
+        row = summary[name]
+        print(f"{name:<28} {row['count']:>7} {row['p50']:>9.1f} {row['p95']:>9.1f} {row['p99']:>9.1f} {row['max']:>9.1f}")
+
+    counters = get_counters().summary()
+    if counters:
+        print("🔢 " + ', '.join(f"{name}={value['total']:.0f}" for name, value in sorted(counters.items())))
+    intents = get_intent_router().stats()
+    print(f"⚡ Быстрым путем: {intents['fast_path']}/{intents['messages']} ({intents['hit_rate']:.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Прогон диалогов через AIBrain без сети")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--synthetic', type=int, default=100, help="число синтетических диалогов")
+    source.add_argument('--from-db', help="реплики клиентов из conversations этой базы")
+    source.add_argument('--conversations', help="диалоги из JSONL")
+    parser.add_argument('--restaurant-id', type=int, default=1)
+    parser.add_argument('--limit', type=int, default=1000, help="максимум диалогов из базы")
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.6, help="медиана задержки запроса к модели, с")
+    parser.add_argument('--sigma', type=float, default=0.35, help="разброс (логнормальный)")
+    parser.add_argument('--chunk-latency', type=float, default=0.04, help="задержка фрагмента потока, с")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stream', action='store_true', help="потоковый режим (stream=True)")
+    parser.add_argument('--llm-concurrency', type=int, default=8, help="лимит одновременных запросов шлюза")
+    parser.add_argument('--no-fast-path', action='store_true')
+    parser.add_argument('--no-response-cache', action='store_true')
+    parser.add_argument('--no-direct-booking', action='store_true')
+    parser.add_argument('--gemini', action='store_true', help="настоящий Gemini (нужен GEMINI_API_KEY)")
+    args = parser.parse_args()
+
+    if args.from_db:
+        dialogs = conversations_from_db(args.from_db, args.restaurant_id, args.limit)
+    elif args.conversations:
+        dialogs = conversations_from_file(args.conversations)
+    else:
+        dialogs = synthetic_conversations(args.synthetic, args.seed)
+
+    if args.gemini:
+        backend = GeminiBackend(os.environ['GEMINI_API_KEY'])
+    else:
+        backend = ScriptedBackend(latency=Latency(args.latency, args.sigma),
+                                  chunk_latency=Latency(args.chunk_latency, 0.2), seed=args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'replay.db')
+        prepare_database(db_path)
+        brain = AIBrain('replay', db_path, backend=backend,
+                        use_fast_path=not args.no_fast_path, use_response_cache=not args.no_response_cache,
+                        use_direct_booking=not args.no_direct_booking)
+        # Свой шлюз без пользовательских лимитов: бенчмарк меряет задержку, а не отказы
+        brain.gateway = LLMGateway(max_concurrency=args.llm_concurrency, global_rate=1e6, global_burst=10 ** 6,
+                                   user_rate=1e6, user_burst=10 ** 6)
+
+        get_metrics().reset()
+        get_counters().reset()
+        get_intent_router().reset()
+        print(f"🎬 Диалогов: {len(dialogs)}, параллельно: {args.concurrency}, модель: {backend.name}"
+              f"{', поток' if args.stream else ''}")
+
+        started = time.perf_counter()
+        turns = asyncio.run(replay(brain, dialogs, args.concurrency, args.stream))
+        elapsed = time.perf_counter() - started
+        brain.log_writer.flush()
+
+    print_report(turns, elapsed)
+
+
+if __name__ == "__main__":
+    main()
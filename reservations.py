@@ -0,0 +1,108 @@
+import sqlite3
+import logging
+from typing import Dict, List
+from db_pool import db_connection, db_transaction
+from occupancy import get_occupancy, parse_time, format_time
+from migrations import DEFAULT_DURATION_MINUTES
+
+logger = logging.getLogger(__name__)
+
+# Проверка пересечения внутри транзакции (та же логика, что в триггерах миграции 4)
+OVERLAP_QUERY = f"""
+    SELECT id, booking_time FROM bookings
+    WHERE booking_date = ?
+    AND table_id = ?
+    AND status != 'отменено'
+    AND (CAST(substr(booking_time, 1, 2) AS INTEGER) * 60 + CAST(substr(booking_time, 4, 2) AS INTEGER)) < ?
+    AND (CAST(substr(booking_time, 1, 2) AS INTEGER) * 60 + CAST(substr(booking_time, 4, 2) AS INTEGER))
+        + COALESCE(duration_minutes, {DEFAULT_DURATION_MINUTES}) > ?
+    LIMIT 1
+"""
+
+
+def _alternatives(db_path: str, date: str, time: str, guests: int, restaurant_id: int, limit: int = 3) -> List[Dict]:
+    """Свободные столики на то же время - чтобы ИИ сразу мог предложить замену"""
+    occupancy = get_occupancy(db_path)
+    occupancy.invalidate(date, restaurant_id)
+
+    with db_connection(db_path) as conn:
+        tables = conn.execute("""
+            SELECT id, table_number, seats_count, location_type, description
+            FROM tables
+            WHERE restaurant_id = ? AND status = 'active' AND seats_count >= ?
+            ORDER BY seats_count
+        """, (restaurant_id, guests)).fetchall()
+
+    free_ids = set(occupancy.free_tables(date, time, guests, [table[0] for table in tables], restaurant_id=restaurant_id))
+    return [
+        {'id': table_id, 'number': number, 'seats': seats, 'location': location, 'description': description}
+        for table_id, number, seats, location, description in tables
+        if table_id in free_ids
+    ][:limit]
+
+
+def _conflict(db_path: str, table_id: int, date: str, time: str, guests: int, restaurant_id: int) -> Dict:
+    logger.info(f"⛔ Конфликт бронирования: столик #{table_id} занят {date} {time}")
+    return {
+        "success": False,
+        "conflict": True,
+        "error": "Столик уже занят на это время",
+        "table_id": table_id,
+        "alternatives": _alternatives(db_path, date, time, guests, restaurant_id)
+    }
+
+
+def reserve_table(db_path: str, table_id: int, name: str, phone: str, date: str, time: str,
+                  guests: int, requests: str = "", restaurant_id: int = 1) -> Dict:
+    """
+    Атомарное бронирование столика
+    Проверка пересечения и вставка идут в одной транзакции BEGIN IMMEDIATE,
+    триггеры базы дополнительно отклоняют пересечения от любых других писателей.
+    При конфликте возвращает conflict=True и свободные альтернативы
+    """
+    occupancy = get_occupancy(db_path)
+    time = format_time(parse_time(time))
+    table_id = int(table_id)
+    guests = int(guests)
+    duration = occupancy.duration_for(guests, table_id)
+    start = parse_time(time)
+
+    try:
+        with db_transaction(db_path) as conn:
+            table_info = conn.execute("""
+                SELECT table_number, location_type, description
+                FROM tables WHERE id = ? AND restaurant_id = ?
+            """, (table_id, restaurant_id)).fetchone()
+
+            if not table_info:
+                return {"success": False, "error": f"Столик #{table_id} не найден"}
+
+            if conn.execute(OVERLAP_QUERY, (date, table_id, start + duration, start)).fetchone():
+                conflict = True
+            else:
+                conflict = False
+                cursor = conn.execute("""
+                    INSERT INTO bookings
+                    (restaurant_id, table_id, customer_name, customer_phone, booking_date, booking_time,
+                     guests_count, duration_minutes, status, special_requests)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (restaurant_id, table_id, name, phone, date, time, guests, duration, 'новое', requests))
+                booking_id = cursor.lastrowid
+
+    except sqlite3.IntegrityError as e:
+        if 'table_slot_conflict' not in str(e):
+            raise
+        conflict = True
+
+    if conflict:
+        return _conflict(db_path, table_id, date, time, guests, restaurant_id)
+
+    occupancy.add_booking(booking_id, table_id, date, time, guests, duration, restaurant_id=restaurant_id)
+
+    return {
+        "success": True,
+        "booking_id": booking_id,
+        "table_number": table_info[0],
+        "table_location": table_info[1],
+        "table_description": table_info[2]
+    }
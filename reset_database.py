@@ -1,5 +1,6 @@
 import sqlite3
 import os
+from migrations import migrate
 
 def reset_database():
     """Полная пересборка базы данных"""
@@ -9,89 +10,17 @@ def reset_database():
         os.remove('restaurant.db')
         print("🗑️ Старая база данных удалена")
     
-    # Создаем новую базу
-    conn = sqlite3.connect('restaurant.db')
-    cursor = conn.cursor()
+    # Файлы WAL-журнала от старой базы
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists('restaurant.db' + suffix):
+            os.remove('restaurant.db' + suffix)
     
-    # Создаем все таблицы заново
-    tables = [
-        # Рестораны
-        """
-        CREATE TABLE restaurants (
-            id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL,
-            phone TEXT,
-            address TEXT,
-            working_hours TEXT,
-            greeting_message TEXT DEFAULT 'Здравствуйте! Вас приветствует наш ресторан.',
-            ai_personality TEXT DEFAULT 'Ты дружелюбный помощник ресторана.',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """,
-        
-        # Столики
-        """
-        CREATE TABLE tables (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            restaurant_id INTEGER,
-            table_number TEXT NOT NULL,
-            seats_count INTEGER NOT NULL,
-            location_type TEXT,
-            description TEXT,
-            status TEXT DEFAULT 'active',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (restaurant_id) REFERENCES restaurants (id)
-        )
-        """,
-        
-        # Меню
-        """
-        CREATE TABLE menu_items (
-            id INTEGER PRIMARY KEY,
-            restaurant_id INTEGER,
-            category TEXT,
-            name TEXT,
-            description TEXT,
-            price REAL,
-            FOREIGN KEY (restaurant_id) REFERENCES restaurants (id)
-        )
-        """,
-        
-        # Бронирования
-        """
-        CREATE TABLE bookings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            restaurant_id INTEGER,
-            table_id INTEGER,
-            customer_name TEXT NOT NULL,
-            customer_phone TEXT NOT NULL,
-            booking_date DATE NOT NULL,
-            booking_time TIME NOT NULL,
-            guests_count INTEGER NOT NULL,
-            status TEXT DEFAULT 'новое',
-            special_requests TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (restaurant_id) REFERENCES restaurants (id),
-            FOREIGN KEY (table_id) REFERENCES tables (id)
-        )
-        """,
-        
-        # Диалоги
-        """
-        CREATE TABLE conversations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            user_name TEXT,
-            message_text TEXT NOT NULL,
-            bot_response TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """
-    ]
+    # Создаем новую базу по миграциям
+    version = migrate('restaurant.db')
+    print(f"🗄️ Схема создана (версия {version})")
     
-    # Создаем таблицы
-    for table_sql in tables:
-        cursor.execute(table_sql)
+    conn = sqlite3.connect('restaurant.db')
+    cursor = conn.cursor()
     
     # Добавляем демо-ресторан
     cursor.execute("""
@@ -0,0 +1,178 @@
+import os
+import re
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional, Tuple
+from intent_router import HANDOFF_RULES, INTENT_RULES, normalize
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_THRESHOLD = 0.8
+
+# Функции, после которых ответ зависит только от данных ресторана
+CACHEABLE_TOOLS = {'get_menu', 'get_restaurant_info'}
+# Вопросы о ресторане (шаблоны intent_router); "Да", "А у окна?" - продолжение диалога, не вопрос
+FAQ_INTENTS = ('hours', 'address', 'contacts', 'menu')
+
+STOP_WORDS = {
+    'а', 'и', 'в', 'во', 'на', 'с', 'со', 'у', 'к', 'по', 'о', 'об', 'из', 'за', 'для', 'до', 'от',
+    'ли', 'же', 'бы', 'не', 'ну', 'вот', 'это', 'то', 'как', 'что', 'какой', 'какая', 'какие', 'какое',
+    'вы', 'вас', 'ваш', 'ваше', 'ваши', 'ваша', 'нас', 'мы', 'есть', 'можно', 'подскажите', 'скажите',
+    'пожалуйста', 'здравствуйте', 'привет', 'спасибо', 'тут', 'еще'
+}
+
+# Окончания для грубого стемминга (длинные раньше коротких)
+_ENDINGS = sorted([
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ой', 'ей', 'ий', 'ый', 'ая', 'яя',
+    'ое', 'ее', 'ые', 'ие', 'ов', 'ев', 'ах', 'ях', 'ам', 'ям', 'ом', 'ем', 'ую', 'юю', 'ть', 'те',
+    'ет', 'ит', 'ют', 'ят', 'ут', 'ат', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь'
+], key=len, reverse=True)
+
+# Ответ зависит от пользователя или диалога: личное, даты и числа, отсылки к прошлым репликам
+_PERSONAL = re.compile(
+    r'\b(я|мне|меня|мой|моя|мое|мои|мою|моей|мы|нам|нас)\b|\d|'
+    r'\b(сегодня|завтра|послезавтра|сейчас|вечером|утром)\b|'
+    r'\b(он|она|оно|они|его|ее|их|него|нее|ним|ней|них|нем|этот|эта|этого|тот|там|такой|такие)\b'
+)
+_HANDOFF = [re.compile(pattern) for pattern in HANDOFF_RULES]
+_FAQ = [re.compile(pattern) for intent in FAQ_INTENTS for pattern in INTENT_RULES[intent]]
+
+
+def stem(word: str) -> str:
+    if len(word) <= 4:
+        return word
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def canonical(text: str) -> str:
+    """Нормализованный вопрос: основы значимых слов в исходном порядке"""
+    return ' '.join(stem(word) for word in normalize(text).split() if word not in STOP_WORDS)
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def is_cacheable_question(text: str) -> bool:
+    """
+    Вопрос о ресторане (меню, часы, адрес, контакты), не о пользователе и не
+    о брони (и без отсылок к диалогу)
+    """
+    normalized = normalize(text)
+    if not normalized or len(normalized.split()) > 15:
+        return False
+    if any(pattern.search(normalized) for pattern in _HANDOFF):
+        return False
+    if not any(pattern.search(normalized) for pattern in _FAQ):
+        return False
+    return not _PERSONAL.search(normalized)
+
+
+class ResponseCache:
+    """
+    Кэш ответов ИИ на типовые вопросы о ресторане
+    Ключ - ресторан, версия его данных (data_versions) и нормализованный текст;
+    похожие формулировки находятся по сходству триграмм. Правка меню или
+    профиля меняет версию, и старые ответы больше не находятся
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600.0, threshold: float = SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+
+        # (restaurant_id, version, canonical) -> (ответ, триграммы, истекает)
+        self._entries: 'OrderedDict[Tuple[int, int, str], Tuple[str, FrozenSet[str], float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def get(self, restaurant_id: int, version: int, text: str) -> Optional[str]:
+        key_text = canonical(text)
+        if not key_text:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            key = (restaurant_id, version, key_text)
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            # Та же мысль другими словами
+            grams = trigrams(key_text)
+            best_key, best_score = None, self.threshold
+            for other_key, (answer, other_grams, expires) in self._entries.items():
+                if other_key[0] != restaurant_id or other_key[1] != version or expires <= now:
+                    continue
+                score = len(grams & other_grams) / len(grams | other_grams)
+                if score >= best_score:
+                    best_key, best_score = other_key, score
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+                self.similar_hits += 1
+                return self._entries[best_key][0]
+
+            self.misses += 1
+            return None
+
+    def put(self, restaurant_id: int, version: int, text: str, answer: str):
+        key_text = canonical(text)
+        if not key_text:
+            return
+        with self._lock:
+            key = (restaurant_id, version, key_text)
+            self._entries[key] = (answer, trigrams(key_text), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [key for key, entry in self._entries.items() if entry[2] <= now]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, restaurant_id: int = None):
+        with self._lock:
+            if restaurant_id is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == restaurant_id]:
+                    del self._entries[key]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.similar_hits + self.misses
+        return {
+            'entries': size,
+            'hits': self.hits,
+            'similar_hits': self.similar_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.similar_hits) / lookups if lookups else 0.0
+        }
+
+
+_caches: Dict[str, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(db_path: str = 'restaurant.db') -> ResponseCache:
+    """Общий кэш ответов для файла базы (один на процесс)"""
+    key = os.path.abspath(db_path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = ResponseCache()
+            _caches[key] = cache
+        return cache
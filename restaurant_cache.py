@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, Hashable, Tuple
+from db_pool import db_connection
+
+logger = logging.getLogger(__name__)
+
+
+class RestaurantCache:
+    """
+    Кэш статических данных ресторана (профиль, настройки бота, меню)
+    Значения хранятся вместе с версией данных ресторана из таблицы data_versions.
+    Версии перечитываются не чаще раза в check_interval секунд одним запросом,
+    поэтому на горячем пути бота запросов к базе нет, а правки из админки
+    видны не позже чем через check_interval
+    """
+
+    def __init__(self, db_path: str = 'restaurant.db', check_interval: float = 1.0):
+        self.db_path = db_path
+        self.check_interval = check_interval
+
+        self._versions: Dict[int, int] = {}
+        self._checked_at = 0.0
+        self._entries: Dict[Tuple[int, Hashable], Tuple[int, Any]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _refresh_versions(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with db_connection(self.db_path) as conn:
+            rows = conn.execute("SELECT restaurant_id, version FROM data_versions").fetchall()
+        self._versions = dict(rows)
+        self._checked_at = now
+
+    def version(self, restaurant_id: int) -> int:
+        """Текущая версия данных ресторана"""
+        with self._lock:
+            self._refresh_versions()
+            return self._versions.get(restaurant_id, 0)
+
+    def get(self, restaurant_id: int, key: Hashable, loader: Callable) -> Any:
+        """
+        Значение из кэша или loader(conn), если версия данных изменилась
+        loader выполняет запросы и возвращает неизменяемые строки (кортежи / списки кортежей)
+        """
+        version = self.version(restaurant_id)
+        entry = self._entries.get((restaurant_id, key))
+        if entry and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        with db_connection(self.db_path) as conn:
+            value = loader(conn)
+        self._entries[(restaurant_id, key)] = (version, value)
+        return value
+
+    def invalidate(self, restaurant_id: int = None):
+        """Сбросить кэш (например, сразу после записи в том же процессе)"""
+        with self._lock:
+            if restaurant_id is None:
+                self._entries.clear()
+            else:
+                for entry_key in [k for k in self._entries if k[0] == restaurant_id]:
+                    del self._entries[entry_key]
+            self._checked_at = 0.0
+
+
+_caches: Dict[str, RestaurantCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(db_path: str = 'restaurant.db') -> RestaurantCache:
+    """Общий кэш для файла базы (один на процесс)"""
+    key = os.path.abspath(db_path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = RestaurantCache(db_path)
+            _caches[key] = cache
+        return cache
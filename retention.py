@@ -0,0 +1,191 @@
+"""
+Хранение логов: архивация старых строк и сжатие базы
+Строки conversations, ai_decisions_log и conversation_issues старше
+RETENTION_DAYS переносятся в сжатые файлы archive/<таблица>/<ГГГГ-ММ>.jsonl.gz
+и удаляются из restaurant.db, затем освобожденные страницы возвращаются
+системе через incremental vacuum
+
+    python retention.py --days 90
+    python retention.py --query conversations --user 123456 --since 2025-01-01
+"""
+import argparse
+import gzip
+import json
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from db_pool import db_connection, db_transaction
+from migrations import ensure_schema
+
+logger = logging.getLogger(__name__)
+
+RETENTION_DAYS = 90
+ARCHIVE_DIR = 'archive'
+
+# Таблица -> колонка времени
+ARCHIVED_TABLES = {
+    'conversations': 'timestamp',
+    'ai_decisions_log': 'timestamp',
+    'conversation_issues': 'timestamp'
+}
+
+
+def _archive_path(archive_dir: str, table: str, month: str) -> str:
+    return os.path.join(archive_dir, table, f"{month}.jsonl.gz")
+
+
+def _append_archive(path: str, rows: List[Dict]):
+    """Дописать строки в архив месяца (каждый вызов - отдельный gzip-член файла)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+            for row in rows:
+                archive.write((json.dumps(row, ensure_ascii=False) + '\n').encode('utf-8'))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def archive_table(db_path: str, table: str, cutoff: str, archive_dir: str = ARCHIVE_DIR,
+                  batch_size: int = 5000) -> int:
+    """
+    Перенести строки старше cutoff в архив
+    Сначала запись в файл (с fsync), потом удаление из базы: при сбое между
+    ними строка окажется в архиве дважды, query_archive убирает дубли по id
+    """
+    time_column = ARCHIVED_TABLES[table]
+    total = 0
+
+    while True:
+        with db_connection(db_path) as conn:
+            cursor = conn.execute(f"""
+                SELECT * FROM {table}
+                WHERE {time_column} < ?
+                ORDER BY {time_column}, id
+                LIMIT ?
+            """, (cutoff, batch_size))
+            columns = [description[0] for description in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        if not rows:
+            break
+
+        by_month: Dict[str, List[Dict]] = {}
+        for row in rows:
+            by_month.setdefault(str(row[time_column])[:7], []).append(row)
+        for month, month_rows in by_month.items():
+            _append_archive(_archive_path(archive_dir, table, month), month_rows)
+
+        with db_transaction(db_path) as conn:
+            conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(row['id'],) for row in rows])
+
+        total += len(rows)
+        if len(rows) < batch_size:
+            break
+
+    if total:
+        logger.info(f"📦 {table}: в архив перенесено {total} строк")
+    return total
+
+
+def query_archive(table: str, since: str = None, until: str = None, user_id: int = None,
+                  archive_dir: str = ARCHIVE_DIR) -> List[Dict]:
+    """
+    Строки из архива за период [since, until) (даты 'YYYY-MM-DD' или полные метки времени)
+    Читаются только файлы нужных месяцев
+    """
+    time_column = ARCHIVED_TABLES[table]
+    table_dir = os.path.join(archive_dir, table)
+    if not os.path.isdir(table_dir):
+        return []
+
+    months = sorted(name[:7] for name in os.listdir(table_dir) if name.endswith('.jsonl.gz'))
+    if since:
+        months = [month for month in months if month >= since[:7]]
+    if until:
+        months = [month for month in months if month <= until[:7]]
+
+    rows: Dict[int, Dict] = {}
+    for month in months:
+        with gzip.open(_archive_path(archive_dir, table, month), 'rt', encoding='utf-8') as archive:
+            for line in archive:
+                row = json.loads(line)
+                timestamp = str(row.get(time_column) or '')
+                if since and timestamp < since:
+                    continue
+                if until and timestamp >= until:
+                    continue
+                if user_id is not None and row.get('user_id') != user_id:
+                    continue
+                rows[row['id']] = row
+
+    return sorted(rows.values(), key=lambda row: (str(row.get(time_column)), row['id']))
+
+
+# ========== СЖАТИЕ БАЗЫ ==========
+
+def enable_incremental_vacuum(db_path: str) -> bool:
+    """
+    Включить auto_vacuum = INCREMENTAL
+    Для существующей базы режим вступает в силу только после полного VACUUM,
+    поэтому он выполняется один раз (и требует монопольного доступа на время работы)
+    """
+    with db_connection(db_path) as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    logger.info("🧹 Включен incremental vacuum (выполнен полный VACUUM)")
+    return True
+
+
+def incremental_vacuum(db_path: str, pages: int = 0) -> int:
+    """Вернуть системе свободные страницы (pages=0 - все), возвращает число освобожденных"""
+    with db_connection(db_path) as conn:
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return before - after
+
+
+def run_retention(db_path: str = 'restaurant.db', days: int = RETENTION_DAYS,
+                  archive_dir: str = ARCHIVE_DIR, vacuum_pages: int = 0) -> Dict[str, int]:
+    """Архивация всех логов старше days дней и сжатие базы"""
+    ensure_schema(db_path)
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+    stats = {table: archive_table(db_path, table, cutoff, archive_dir) for table in ARCHIVED_TABLES}
+
+    enable_incremental_vacuum(db_path)
+    stats['freed_pages'] = incremental_vacuum(db_path, vacuum_pages)
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Архивация старых логов и сжатие базы")
+    parser.add_argument('--db', default='restaurant.db')
+    parser.add_argument('--days', type=int, default=RETENTION_DAYS, help="сколько дней логов хранить в базе")
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    parser.add_argument('--query', choices=sorted(ARCHIVED_TABLES), help="показать строки из архива")
+    parser.add_argument('--user', type=int)
+    parser.add_argument('--since')
+    parser.add_argument('--until')
+    args = parser.parse_args(argv)
+
+    if args.query:
+        rows = query_archive(args.query, args.since, args.until, args.user, args.archive_dir)
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+        print(f"📦 Найдено в архиве: {len(rows)}")
+        return
+
+    stats = run_retention(args.db, args.days, args.archive_dir)
+    for table in ARCHIVED_TABLES:
+        print(f"📦 {table}: в архив {stats[table]}")
+    print(f"🧹 Освобождено страниц: {stats['freed_pages']}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,189 @@
+import os
+import sys
+import threading
+import time
+import logging
+from collections import OrderedDict, deque
+from typing import Dict, List, Tuple
+from db_pool import db_connection
+from log_writer import get_log_writer, utc_timestamp
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_COLUMNS = ('restaurant_id', 'user_id', 'user_name', 'message_text', 'bot_response', 'timestamp')
+
+
+class _Session:
+    __slots__ = ('turns', 'loaded', 'last_seen', 'size', 'lock')
+
+    def __init__(self, max_turns: int):
+        self.turns: deque = deque(maxlen=max_turns)  # (сообщение клиента, ответ бота)
+        self.loaded = False
+        self.last_seen = time.monotonic()
+        self.size = 0
+        self.lock = threading.Lock()
+
+
+def _turn_size(turn: Tuple[str, str]) -> int:
+    return sum(sys.getsizeof(part) for part in turn)
+
+
+class SessionStore:
+    """
+    Последние реплики активных пользователей в памяти
+    На каждого пользователя ресторана - кольцевой буфер из max_turns реплик.
+    При промахе буфер заполняется из таблицы conversations одним запросом,
+    новые реплики пишутся сразу и в буфер, и в очередь записи в базу.
+    Сессии без активности дольше ttl секунд и самые старые сессии сверх
+    max_sessions / max_bytes вытесняются
+    """
+
+    def __init__(self, db_path: str = 'restaurant.db', max_turns: int = 10, ttl: float = 1800.0,
+                 max_sessions: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+
+        self.log_writer = get_log_writer(db_path)
+
+        self._sessions: 'OrderedDict[Tuple[int, int], _Session]' = OrderedDict()  # (ресторан, пользователь), от давно активных к недавним
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ========== ВНУТРЕННЕЕ ==========
+
+    def _session(self, key: Tuple[int, int]) -> _Session:
+        """Сессия пользователя (создается пустой и незагруженной) + вытеснение устаревших"""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = _Session(self.max_turns)
+                self._sessions[key] = session
+            else:
+                self._sessions.move_to_end(key)
+            session.last_seen = now
+            self._evict(now)
+            return session
+
+    def _evict(self, now: float):
+        """Вытесняем с начала очереди: сессии по TTL, затем сверх лимитов (под self._lock)"""
+        while self._sessions:
+            key, oldest = next(iter(self._sessions.items()))
+            expired = now - oldest.last_seen > self.ttl
+            over_limit = len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes
+            if not (expired or over_limit) or len(self._sessions) == 1:
+                break
+            del self._sessions[key]
+            self._bytes -= oldest.size
+            self.evictions += 1
+
+    def _hydrate(self, key: Tuple[int, int], session: _Session):
+        """Заполнить буфер из базы (под session.lock)"""
+        # Реплики еще в очереди фоновой записи должны попасть в выборку
+        self.log_writer.flush()
+        with db_connection(self.db_path) as conn:
+            rows = conn.execute("""
+                SELECT message_text, bot_response FROM conversations
+                WHERE restaurant_id = ? AND user_id = ?
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            """, (*key, self.max_turns)).fetchall()
+
+        session.turns.clear()
+        session.turns.extend(reversed(rows))
+        self._resize(session)
+        session.loaded = True
+
+    def _resize(self, session: _Session):
+        size = sum(_turn_size(turn) for turn in session.turns)
+        with self._lock:
+            self._bytes += size - session.size
+            session.size = size
+
+    # ========== API ==========
+
+    def history(self, user_id: int, limit: int = None, restaurant_id: int = 1) -> List[Tuple[str, str]]:
+        """Последние limit реплик пользователя, от старых к новым"""
+        key = (restaurant_id, user_id)
+        session = self._session(key)
+        with session.lock:
+            if session.loaded:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self._hydrate(key, session)
+            turns = list(session.turns)
+        return turns[-limit:] if limit else turns
+
+    def peek(self, user_id: int, limit: int = None, restaurant_id: int = 1):
+        """Реплики из памяти без обращения к базе (None, если сессия не загружена)"""
+        with self._lock:
+            session = self._sessions.get((restaurant_id, user_id))
+        if session is None or not session.loaded:
+            return None
+        with session.lock:
+            session.last_seen = time.monotonic()
+            self.hits += 1
+            turns = list(session.turns)
+        return turns[-limit:] if limit else turns
+
+    def record(self, user_id: int, user_name: str, message_text: str, bot_response: str, restaurant_id: int = 1):
+        """Новая реплика: в буфер (если сессия загружена) и в очередь записи в conversations"""
+        session = self._session((restaurant_id, user_id))
+        with session.lock:
+            # Запись в очередь под блокировкой сессии, чтобы параллельная загрузка
+            # не прочитала эту реплику из базы второй раз
+            self.log_writer.write(
+                'conversations', CONVERSATION_COLUMNS,
+                (restaurant_id, user_id, user_name, message_text, bot_response, utc_timestamp())
+            )
+            if session.loaded:
+                turn = (message_text, bot_response)
+                evicted = session.turns[0] if len(session.turns) == session.turns.maxlen else None
+                session.turns.append(turn)
+                delta = _turn_size(turn) - (_turn_size(evicted) if evicted else 0)
+                with self._lock:
+                    session.size += delta
+                    self._bytes += delta
+
+    def forget(self, user_id: int = None, restaurant_id: int = 1):
+        """Сбросить сессию пользователя (или все), например после удаления истории"""
+        with self._lock:
+            if user_id is None:
+                self._sessions.clear()
+                self._bytes = 0
+            else:
+                session = self._sessions.pop((restaurant_id, user_id), None)
+                if session:
+                    self._bytes -= session.size
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'sessions': len(self._sessions),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+_stores: Dict[str, SessionStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_session_store(db_path: str = 'restaurant.db') -> SessionStore:
+    """Общее хранилище сессий для файла базы (одно на процесс)"""
+    key = os.path.abspath(db_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = SessionStore(db_path)
+            _stores[key] = store
+        return store
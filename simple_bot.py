@@ -4,23 +4,34 @@ import tempfile
 import os
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, MessageHandler, filters, ContextTypes, CommandHandler, CallbackQueryHandler
-import speech_recognition as sr
-from pydub import AudioSegment
 from gtts import gTTS
 import google.generativeai as genai
 from database import RestaurantDatabase
+from async_db import AsyncProxy
+from tenants import get_router
+from llm_gateway import get_llm_gateway
+from keyword_matcher import get_keyword_matcher
+from audio_decode import decode_to_pcm_async
+from stt_engines import get_speech_recognizer
+from tts_cache import get_tts_cache
+from voice_file_ids import get_voice_file_ids
 
 # Настройка логирования
 logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class RestaurantBotWithDatabase:
-    def __init__(self, telegram_token, gemini_key):
+    def __init__(self, telegram_token, gemini_key, tenant=None):
         self.telegram_token = telegram_token
         self.gemini_key = gemini_key
         
+        # Ресторан этого бота
+        self.tenant = tenant or get_router().for_bot(telegram_token)
+        
         # Подключаем базу данных
-        self.db = RestaurantDatabase()
+        self.db = RestaurantDatabase(self.tenant.db_path)
+        # Запросы из обработчиков идут через потоки БД, не блокируя event loop
+        self.adb = AsyncProxy(self.db)
         print("💾 База данных подключена к боту")
         
         # Настройка Gemini
@@ -33,14 +44,16 @@ class RestaurantBotWithDatabase:
             print("⚠️ Gemini AI не подключен (работаю в простом режиме)")
         
         # Настройка распознавания речи
-        self.recognizer = sr.Recognizer()
+        self.stt = get_speech_recognizer()
+        self.tts_cache = get_tts_cache()
+        self.voice_ids = get_voice_file_ids(self.tenant.db_path)
         
         print("✅ Бот с базой данных готов!")
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Главное меню - ТЕПЕРЬ ЧИТАЕТ ИЗ БАЗЫ"""
         # Получаем данные ресторана из базы
-        restaurant_data = self.db.get_restaurant_data()
+        restaurant_data = await self.adb.get_restaurant_data(self.tenant.restaurant_id)
         
         if not restaurant_data:
             await update.message.reply_text("❌ Ресторан не найден в базе данных")
@@ -94,7 +107,7 @@ class RestaurantBotWithDatabase:
     
     async def start_demo_call(self, query):
         """Демо-звонок - приветствие ИЗ БАЗЫ"""
-        restaurant_data = self.db.get_restaurant_data()
+        restaurant_data = await self.adb.get_restaurant_data(self.tenant.restaurant_id)
         greeting_message = restaurant_data[4]  # greeting_message
         
         await query.edit_message_text(f"""
@@ -111,11 +124,11 @@ class RestaurantBotWithDatabase:
         # Отправляем голосовое приветствие
         greeting_audio = await self.text_to_speech(greeting_message)
         if greeting_audio:
-            await query.message.reply_voice(voice=greeting_audio)
+            await self.voice_ids.send(query.message, greeting_audio)
     
     async def show_menu_from_db(self, query):
         """Показать меню ИЗ БАЗЫ ДАННЫХ"""
-        menu_items = self.db.get_menu_items()
+        menu_items = await self.adb.get_menu_items(self.tenant.restaurant_id)
         
         if not menu_items:
             await query.edit_message_text("📋 Меню пока не добавлено в базу")
@@ -140,7 +153,7 @@ class RestaurantBotWithDatabase:
     
     async def show_restaurant_info(self, query):
         """Показать информацию о ресторане из базы"""
-        restaurant_data = self.db.get_restaurant_data()
+        restaurant_data = await self.adb.get_restaurant_data(self.tenant.restaurant_id)
         name, phone, address, working_hours, greeting_message, ai_personality = restaurant_data
         
         info_text = f"""
@@ -167,7 +180,7 @@ class RestaurantBotWithDatabase:
     async def show_main_menu(self, query):
         """Показать главное меню"""
         # Получаем данные ресторана из базы
-        restaurant_data = self.db.get_restaurant_data()
+        restaurant_data = await self.adb.get_restaurant_data(self.tenant.restaurant_id)
         
         if not restaurant_data:
             await query.edit_message_text("❌ Ресторан не найден в базе данных")
@@ -228,7 +241,7 @@ class RestaurantBotWithDatabase:
             # Озвучиваем ответ
             response_audio = await self.text_to_speech(bot_response)
             if response_audio:
-                await update.message.reply_voice(voice=response_audio)
+                await self.voice_ids.send(update.message, response_audio)
             
         except Exception as e:
             print(f"❌ Ошибка: {e}")
@@ -248,7 +261,7 @@ class RestaurantBotWithDatabase:
             # Можете также озвучить ответ
             response_audio = await self.text_to_speech(bot_response)
             if response_audio:
-                await update.message.reply_voice(voice=response_audio)
+                await self.voice_ids.send(update.message, response_audio)
             
         except Exception as e:
             print(f"❌ Ошибка: {e}")
@@ -257,8 +270,8 @@ class RestaurantBotWithDatabase:
     async def generate_response_from_database(self, customer_text):
         """Генерация ответа ИСПОЛЬЗУЯ ДАННЫЕ ИЗ БАЗЫ"""
         # Получаем данные ресторана из базы
-        restaurant_data = self.db.get_restaurant_data()
-        menu_items = self.db.get_menu_items()
+        restaurant_data = await self.adb.get_restaurant_data(self.tenant.restaurant_id)
+        menu_items = await self.adb.get_menu_items(self.tenant.restaurant_id)
         
         # Распаковываем данные
         name, phone, address, working_hours, greeting_message, ai_personality = restaurant_data
@@ -290,17 +303,18 @@ class RestaurantBotWithDatabase:
             """
             
             try:
-                response = await asyncio.to_thread(self.model.generate_content, prompt)
+                response = await get_llm_gateway().call(self.model.generate_content, prompt, timeout=20.0)
                 return response.text.strip()
             except Exception as e:
                 print(f"❌ Ошибка Gemini: {e}")
         
         # Простой ответ если ИИ недоступен
-        if "меню" in customer_text.lower():
+        topics = get_keyword_matcher(self.tenant.restaurant_id).scan(customer_text)
+        if 'faq:menu' in topics:
             return f"У нас есть: {menu_items[0][1]} за {menu_items[0][3]}₽, {menu_items[1][1]} за {menu_items[1][3]}₽ и другие блюда."
-        elif "время" in customer_text.lower() or "работа" in customer_text.lower():
+        elif 'faq:hours' in topics:
             return f"Мы работаем {working_hours}."
-        elif "адрес" in customer_text.lower():
+        elif 'faq:address' in topics:
             return f"Наш адрес: {address}."
         else:
             return f"Понял! Помогу забронировать столик в ресторане {name}. Уточните количество гостей и время."
@@ -309,52 +323,57 @@ class RestaurantBotWithDatabase:
     async def speech_to_text(self, audio_data):
         """Распознавание речи"""
         try:
-            with tempfile.NamedTemporaryFile(suffix='.ogg', delete=False) as temp_file:
-                temp_file.write(audio_data)
-                temp_file_path = temp_file.name
-            
-            audio = AudioSegment.from_ogg(temp_file_path)
-            wav_path = temp_file_path.replace('.ogg', '.wav')
-            audio.export(wav_path, format="wav")
-            
-            with sr.AudioFile(wav_path) as source:
-                audio_data = self.recognizer.record(source)
-            
-            try:
-                text = self.recognizer.recognize_google(audio_data, language='ru-RU')
-            except sr.UnknownValueError:
-                text = None
-            
-            os.unlink(temp_file_path)
-            os.unlink(wav_path)
-            return text
+            # OGG/Opus -> PCM 16 кГц моно в памяти (ffmpeg через pipe, без временных файлов)
+            pcm = await decode_to_pcm_async(audio_data)
+            return await self.stt.transcribe(pcm)
             
         except Exception as e:
             print(f"❌ Ошибка распознавания: {e}")
             return None
     
     async def text_to_speech(self, text):
-        """Синтез речи"""
+        """Синтез речи (повторяющиеся ответы - из кэша)"""
+        try:
+            return await self.tts_cache.get_or_synthesize(text, self._synthesize_async)
+        except Exception as e:
+            print(f"❌ Ошибка синтеза: {e}")
+            return None
+    
+    async def _synthesize_async(self, text):
+        return await asyncio.to_thread(self._synthesize, text)
+    
+    @staticmethod
+    def _synthesize(text):
+        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
+            temp_file_path = temp_file.name
+        
         try:
-            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
-                temp_file_path = temp_file.name
-            
             tts = gTTS(text=text, lang='ru', slow=False)
             tts.save(temp_file_path)
             
             with open(temp_file_path, 'rb') as audio_file:
-                audio_data = audio_file.read()
-            
+                return audio_file.read()
+        finally:
             os.unlink(temp_file_path)
-            return audio_data
-            
-        except Exception as e:
-            print(f"❌ Ошибка синтеза: {e}")
-            return None
+    
+    async def on_startup(self, application):
+        """Прогрев кэша речи в фоне"""
+        self._warm_task = asyncio.create_task(self.warm_speech())
+    
+    async def warm_speech(self):
+        """Заранее озвучить приветствие и, в простом режиме, ответы без ИИ (меню, часы работы, адрес)"""
+        restaurant_data = await self.adb.get_restaurant_data(self.tenant.restaurant_id)
+        if not restaurant_data:
+            return
+        phrases = [restaurant_data[4]]  # greeting_message
+        if not self.model:
+            for question in ('меню', 'время работы', 'адрес', ''):
+                phrases.append(await self.generate_response_from_database(question))
+        await self.tts_cache.warm(phrases, self._synthesize_async)
     
     def run(self):
         """Запуск бота"""
-        application = Application.builder().token(self.telegram_token).build()
+        application = Application.builder().token(self.telegram_token).post_init(self.on_startup).build()
         
         application.add_handler(CommandHandler("start", self.start_command))
         application.add_handler(CallbackQueryHandler(self.button_callback))
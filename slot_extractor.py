@@ -0,0 +1,255 @@
+"""
+Данные брони из реплик клиента без ИИ
+Шаблоны скомпилированы один раз при импорте; каждое сообщение разбирается
+один раз (AIBrain.process_message), найденное копится в памяти диалога
+клиента (conversation_memory). Когда собраны все REQUIRED_SLOTS и клиент
+просит бронь, она создается сразу, без запроса к модели
+"""
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+REQUIRED_SLOTS = ('name', 'phone', 'date', 'time', 'guests')
+INTENT_SLOT = 'intent'  # клиент уже просил бронь в этом диалоге
+MAX_GUESTS = 20
+
+MONTHS = {
+    # Основы - регулярные выражения: "ма" без окончания съел бы "малыша", "машины"
+    'январ': 1, 'феврал': 2, 'март': 3, 'апрел': 4, 'ма[йяе](?![а-я])': 5, 'июн': 6,
+    'июл': 7, 'август': 8, 'сентябр': 9, 'октябр': 10, 'ноябр': 11, 'декабр': 12
+}
+WEEKDAYS = {
+    'понедельник': 0, 'вторник': 1, 'сред': 2, 'четверг': 3, 'пятниц': 4, 'суббот': 5, 'воскресень': 6
+}
+# Собирательные числительные - число гостей и без слова "человек"
+GUEST_COLLECTIVE = {
+    'двоих': 2, 'двое': 2, 'троих': 3, 'трое': 3, 'четверых': 4, 'четверо': 4, 'пятерых': 5, 'пятеро': 5,
+    'шестерых': 6, 'шестеро': 6, 'семерых': 7, 'семеро': 7, 'восьмерых': 8, 'восьмеро': 8,
+    'вдвоем': 2, 'втроем': 3, 'вчетвером': 4, 'впятером': 5
+}
+# Количественные - только рядом со словом "человек", "гостя", "персоны"
+GUEST_CARDINAL = {
+    'одного': 1, 'один': 1, 'два': 2, 'две': 2, 'двух': 2, 'три': 3, 'трех': 3, 'четыре': 4, 'четырех': 4,
+    'пять': 5, 'пяти': 5, 'шесть': 6, 'шести': 6, 'семь': 7, 'семи': 7, 'восемь': 8, 'восьми': 8,
+    'девять': 9, 'десять': 10, 'десяти': 10
+}
+LOCATIONS = {'окн': 'window', 'vip': 'vip', 'вип': 'vip', 'террас': 'terrace', 'бар': 'bar', 'центр': 'center'}
+
+# Слова после "я"/"это", которые не имя
+_NOT_NAMES = {
+    'оформить', 'записать', 'бронь', 'хочу', 'хотел', 'хотела', 'буду', 'бы', 'не', 'вам', 'уже', 'тоже', 'здесь', 'там', 'опять', 'снова',
+    'забронировать', 'забронировал', 'забронировала', 'звоню', 'пишу', 'спрашиваю', 'думаю', 'понял', 'поняла'
+}
+
+_PHONE = re.compile(r'(?<![\d:.])\+?\d[\d\s\-()]{8,}\d')
+_NAME = re.compile(r'(?:меня зовут|на имя|имя\s*[:\-])\s*([а-яёa-z]{2,21})\b', re.IGNORECASE)
+_NAME_INTRO = re.compile(r'(?:^|[.,!]\s*)(?:я|это|Я|Это)\s+([А-ЯЁ][а-яё]{1,20})\b')
+_TIME = re.compile(r'\b([01]?\d|2[0-3]):([0-5]\d)\b|\b(?:в|к)\s+([01]?\d|2[0-3])\.([0-5]\d)\b(?!\.\d)')
+# "в 7 часов", "в 7 вечера", "в 7 часов вечера" - часть суток и после слова "часов"
+_TIME_HOUR = re.compile(
+    r'\b(?:в|к|на)\s+([1-9]|1\d|2[0-3])\s*'
+    r'(?:час(?:а|ов)?(?:\s+(утра|дня|вечера|ночи))?|(утра|дня|вечера|ночи))\b'
+)
+_ISO_DATE = re.compile(r'\b(20\d{2})-(\d{2})-(\d{2})\b')
+_DAY_MONTH = re.compile(r'\b(\d{1,2})\.(\d{1,2})(?:\.(\d{2}|\d{4}))?\b(?![:.]?\d)')
+_DAY_MONTH_WORD = re.compile(r'\b(\d{1,2})(?:-?го)?\s+(' + '|'.join(MONTHS) + r')[а-я]*\b')
+_WEEKDAY = re.compile(r'\b(?:в|во|на|эт[уо]т?|следующ[а-я]+)?\s*(' + '|'.join(WEEKDAYS) + r')[а-я]*\b')
+_RELATIVE_DAY = re.compile(r'\b(послезавтра|завтра|сегодня)\b')
+# "на 15 минут", "на 2 недели", "на 500 рублей" - не число гостей
+_NOT_GUESTS = r'(?!\s*(?:[:.]\d|мин|час|сек|дн|день|недел|месяц|год|лет|руб|ман|евро|доллар|процент|%))'
+_GUESTS = re.compile(
+    r'\b(?:на|нас|будет|будем|компания из)\s+(\d{1,2})' + _NOT_GUESTS + r'\b'
+    r'|\b(\d{1,2})\s*(?:человек|чел\b|персон|гост)'
+)
+_GUESTS_COLLECTIVE = re.compile(r'\b(' + '|'.join(GUEST_COLLECTIVE) + r')\b')
+_GUESTS_CARDINAL = re.compile(r'\b(' + '|'.join(GUEST_CARDINAL) + r')\s+(?:человек|персон|гост)')
+_LOCATION = re.compile(r'(' + '|'.join(LOCATIONS) + r')', re.IGNORECASE)
+
+# Намерение забронировать в текущей реплике (а не посмотреть или отменить бронь)
+_BOOK = re.compile(r'забронир|брониру|резерв|запиш|столик|\bстол\b|подтвержда|оформ|давайте|^да\b|^ок\b')
+# Просьба создать бронь сейчас: глагол или согласие ("столик" - еще не просьба)
+_BOOK_NOW = re.compile(r'забронир|брониру|резервир|запиш|подтвержда|оформ|давайте|^да\b|^ок\b')
+# Вопрос ("А есть свободный столик на 21:00", "Сколько стоит...") - не просьба о брони
+_QUESTION = re.compile(r'\?|^(?:а\s+)?(?:есть|сколько|свобод|какой|какая|какие|когда|где)\b|\bли\b')
+_NOT_BOOK = re.compile(r'отмен|перенес|перенест|покаж|посмотр|провер|мои брон|мою брон|не надо|не нужно')
+
+
+def _next_date(today: datetime, month: int, day: int) -> str:
+    year = today.year if (month, day) >= (today.month, today.day) else today.year + 1
+    return f"{year}-{month:02d}-{day:02d}"
+
+
+class SlotExtractor:
+    """Имя, телефон, дата, время, число гостей и место из одного сообщения"""
+
+    def __init__(self, max_guests: int = MAX_GUESTS):
+        self.max_guests = max_guests
+
+    def extract(self, text: str, today: datetime = None) -> Dict[str, object]:
+        """Найденные в сообщении данные брони (даты - абсолютные, YYYY-MM-DD)"""
+        today = today or datetime.now()
+        slots: Dict[str, object] = {}
+
+        # Дата 2025-11-01 похожа на телефон - ищем телефон без нее (позиции не сдвигаются)
+        phone = _PHONE.search(_ISO_DATE.sub(lambda match: ' ' * len(match.group()), text))
+        if phone:
+            slots['phone'] = re.sub(r'[\s\-()]', '', phone.group())
+            # Цифры телефона не должны попасть в дату, время и число гостей
+            text = text[:phone.start()] + ' ' + text[phone.end():]
+
+        name = self._name(text)
+        if name:
+            slots['name'] = name
+
+        lowered = text.lower().replace('ё', 'е')
+
+        time_value, lowered = self._time(lowered)
+        if time_value:
+            slots['time'] = time_value
+
+        date_value, lowered = self._date(lowered, today)
+        if date_value:
+            slots['date'] = date_value
+
+        guests = self._guests(lowered)
+        if guests:
+            slots['guests'] = guests
+
+        location = _LOCATION.search(lowered)
+        if location:
+            slots['location'] = LOCATIONS[location.group(1).lower()]
+
+        # Намерение запоминается в диалоге: данные брони могут прийти следующими репликами
+        if wants_booking(text):
+            slots[INTENT_SLOT] = True
+
+        return slots
+
+    @staticmethod
+    def _name(text: str):
+        match = _NAME.search(text) or _NAME_INTRO.search(text)
+        if not match:
+            return None
+        name = match.group(1)
+        if name.lower() in _NOT_NAMES:
+            return None
+        return name.capitalize()
+
+    @staticmethod
+    def _time(lowered: str):
+        match = _TIME.search(lowered)
+        if match:
+            hour, minute = (match.group(1), match.group(2)) if match.group(1) else (match.group(3), match.group(4))
+            value = f"{int(hour):02d}:{minute}"
+            return value, lowered[:match.start()] + ' ' + lowered[match.end():]
+        match = _TIME_HOUR.search(lowered)
+        if match:
+            hour = int(match.group(1))
+            part = match.group(2) or match.group(3)
+            if part in ('дня', 'вечера') and hour < 12:
+                hour += 12  # "в 7 вечера", "в 3 часа дня"
+            elif part == 'ночи' and hour == 12:
+                hour = 0
+            return f"{hour:02d}:00", lowered[:match.start()] + ' ' + lowered[match.end():]
+        return None, lowered
+
+    @staticmethod
+    def _date(lowered: str, today: datetime):
+        match = _RELATIVE_DAY.search(lowered)
+        if match:
+            shift = {'сегодня': 0, 'завтра': 1, 'послезавтра': 2}[match.group(1)]
+            return (today + timedelta(days=shift)).strftime('%Y-%m-%d'), lowered
+
+        match = _ISO_DATE.search(lowered)
+        if match:
+            return match.group(0), lowered.replace(match.group(0), ' ')
+
+        match = _DAY_MONTH_WORD.search(lowered)
+        if match:
+            day = int(match.group(1))
+            month = next(number for stem, number in MONTHS.items() if re.match(stem, match.group(2)))
+            if 1 <= day <= 31:
+                return _next_date(today, month, day), lowered[:match.start()] + ' ' + lowered[match.end():]
+
+        match = _DAY_MONTH.search(lowered)
+        if match:
+            day, month = int(match.group(1)), int(match.group(2))
+            if 1 <= day <= 31 and 1 <= month <= 12:
+                return _next_date(today, month, day), lowered[:match.start()] + ' ' + lowered[match.end():]
+
+        match = _WEEKDAY.search(lowered)
+        if match:
+            weekday = next(number for stem, number in WEEKDAYS.items() if match.group(1).startswith(stem))
+            shift = (weekday - today.weekday()) % 7 or 7
+            if 'следующ' in match.group(0):
+                shift += 7 if shift < 7 else 0
+            return (today + timedelta(days=shift)).strftime('%Y-%m-%d'), lowered
+        return None, lowered
+
+    def _guests(self, lowered: str):
+        match = _GUESTS.search(lowered)
+        if match:
+            guests = int(match.group(1) or match.group(2))
+            if 1 <= guests <= self.max_guests:
+                return guests
+        match = _GUESTS_COLLECTIVE.search(lowered)
+        if match:
+            return GUEST_COLLECTIVE[match.group(1)]
+        match = _GUESTS_CARDINAL.search(lowered)
+        if match:
+            return GUEST_CARDINAL[match.group(1)]
+        return None
+
+
+def missing_slots(slots: Dict[str, object]) -> List[str]:
+    return [slot for slot in REQUIRED_SLOTS if slot not in slots]
+
+
+def wants_booking(text: str) -> bool:
+    """Реплика просит создать бронь (а не показать, перенести или отменить)"""
+    lowered = text.lower().strip().replace('ё', 'е')
+    return bool(_BOOK.search(lowered)) and not _NOT_BOOK.search(lowered)
+
+
+def is_past(slots: Dict[str, object], now: datetime = None) -> bool:
+    """Дата брони (и время, если названо) уже прошли"""
+    if 'date' not in slots:
+        return False
+    now = now or datetime.now()
+    # YYYY-MM-DD HH:MM сравниваются как строки; без времени день прошел целиком
+    return f"{slots['date']} {slots.get('time', '23:59')}" < now.strftime('%Y-%m-%d %H:%M')
+
+
+def drop_past_dates(slots: Dict[str, object], now: datetime = None) -> Dict[str, object]:
+    """Без даты и времени, если дата раньше сегодняшней (слоты из старого диалога)"""
+    now = now or datetime.now()
+    if str(slots.get('date', '9')) >= now.strftime('%Y-%m-%d'):
+        return slots
+    return {key: value for key, value in slots.items() if key not in ('date', 'time')}
+
+
+def should_book(text: str, before: Dict[str, object], found: Dict[str, object]) -> bool:
+    """
+    Бронировать без ИИ: собраны все данные, реплика - не вопрос, и клиент
+    либо просит бронь в этой реплике ("забронируйте", "оформите", "да"),
+    либо уже просил ее раньше и этой репликой дополнил недостающее.
+    Собранные данные без просьбы ("сколько стоит ужин на двоих?", "Столик
+    на 19:00 свободен?") - не бронь
+    """
+    slots = {**before, **found}
+    if missing_slots(slots) or is_past(slots):
+        return False
+    lowered = text.lower().strip().replace('ё', 'е')
+    if _NOT_BOOK.search(lowered) or _QUESTION.search(lowered):
+        return False
+    if _BOOK_NOW.search(lowered):
+        return True
+    completes = bool(missing_slots(before)) and any(slot in found for slot in REQUIRED_SLOTS)
+    return completes and bool(before.get(INTENT_SLOT))
+
+
+_extractor = SlotExtractor()
+
+
+def extract_slots(text: str, today: datetime = None) -> Dict[str, object]:
+    return _extractor.extract(text, today)
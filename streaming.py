@@ -0,0 +1,137 @@
+import asyncio
+import re
+import time
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Конец предложения: знак препинания (с кавычкой/скобкой) и пробел, либо перевод строки
+SENTENCE_END = re.compile(r'(?<=[.!?…])["»)]*\s+|\n+')
+
+# Интервал правок сообщения: Telegram ограничивает частоту edit_message_text
+EDIT_INTERVAL = 1.0  # секунд
+
+
+class SentenceSplitter:
+    """
+    Нарезка потокового текста на предложения
+    Короткие куски ("Да.", "Т.е.") приклеиваются к следующему предложению,
+    чтобы не озвучивать их отдельно
+    """
+
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self._buffer = ''
+
+    def feed(self, text: str) -> List[str]:
+        """Добавить фрагмент, вернуть законченные предложения"""
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self._buffer):
+            sentence = self._buffer[start:match.end()].strip()
+            if len(sentence) >= self.min_chars:
+                sentences.append(sentence)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """Остаток текста после конца потока"""
+        rest, self._buffer = self._buffer.strip(), ''
+        return rest or None
+
+
+class ProgressiveReply:
+    """
+    Ответ в Telegram, который дописывается по мере генерации
+    Первый фрагмент отправляется новым сообщением, дальше сообщение
+    редактируется не чаще EDIT_INTERVAL
+    """
+
+    def __init__(self, message, interval: float = EDIT_INTERVAL):
+        self.message = message  # входящее сообщение пользователя (reply_text)
+        self.interval = interval
+        self.sent = None
+        self._shown = ''
+        self._text = ''
+        self._last_edit = 0.0
+
+    async def append(self, piece: str):
+        self._text += piece
+        if self.sent is None:
+            await self._show(self._text)
+        elif time.monotonic() - self._last_edit >= self.interval:
+            await self._show(self._text.rstrip() + ' …')
+
+    async def finish(self, text: str):
+        """Итоговый текст (из AI Brain - может отличаться от потока, например сообщение об ошибке)"""
+        await self._show(text)
+
+    async def _show(self, text: str):
+        if not text.strip() or text == self._shown:
+            return
+        try:
+            if self.sent is None:
+                self.sent = await self.message.reply_text(text)
+            else:
+                await self.sent.edit_text(text)
+            self._shown = text
+        except Exception as e:
+            # Например, лимит частоты правок - следующая правка покажет весь текст
+            logger.warning(f"⚠️ Не удалось обновить сообщение: {e}")
+        self._last_edit = time.monotonic()
+
+
+class SpeechPipeline:
+    """
+    Озвучка ответа по предложениям
+    Первое предложение синтезируется и отправляется сразу, пока модель
+    генерирует остальное; остальные предложения озвучиваются одним
+    сообщением после конца потока
+    """
+
+    def __init__(self, synthesize: Callable[[str], Awaitable[Optional[bytes]]],
+                 send: Callable[[bytes], Awaitable[None]]):
+        self.synthesize = synthesize
+        self.send = send
+        self.first_audio_at: Optional[float] = None
+        self._first: Optional[asyncio.Task] = None
+        self._rest: List[str] = []
+
+    def add(self, sentence: str):
+        if self._first is None:
+            self._first = asyncio.ensure_future(self._speak(sentence))
+        else:
+            self._rest.append(sentence)
+
+    def discard(self):
+        """
+        Поток оказался не итоговым ответом (прерван, ответ - сообщение об
+        ошибке): неотправленное не озвучивается, следующее add - снова первое
+        """
+        if self._first is not None and not self._first.done():
+            self._first.cancel()
+        self._first = None
+        self._rest = []
+
+    async def finish(self):
+        """Дождаться первого предложения и озвучить остаток (порядок сообщений сохраняется)"""
+        if self._first is not None:
+            await self._first
+        if self._rest:
+            await self._speak(' '.join(self._rest))
+            self._rest = []
+
+    async def _speak(self, text: str):
+        audio = await self.synthesize(text)
+        if not audio:
+            return
+        try:
+            await self.send(audio)
+        except Exception as e:
+            logger.error(f"❌ Не удалось отправить голосовой ответ: {e}")
+            return
+        if self.first_audio_at is None:
+            self.first_audio_at = time.perf_counter()
@@ -0,0 +1,210 @@
+"""
+Движки распознавания речи
+Все движки принимают PCM s16le моно (audio_decode) и возвращают текст или None
+VoskEngine - локальное распознавание на CPU (vosk, модели vosk-model-small-ru):
+  пул процессов, модель загружается один раз в каждом процессе при старте пула
+GoogleEngine - recognize_google из speech_recognition (сеть, квота)
+SpeechRecognizer - основной движок и запасной: если основной упал или
+  ничего не распознал, сообщение уходит в запасной
+
+Настройка окружением (get_speech_recognizer):
+    STT_ENGINE=vosk|google   (по умолчанию vosk, если есть модель VOSK_MODEL)
+    VOSK_MODEL=models/vosk-model-small-ru-0.22
+    STT_WORKERS=2            (процессов пула, по умолчанию половина ядер)
+    STT_FALLBACK=google|none (по умолчанию google)
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+from audio_decode import SAMPLE_RATE, SAMPLE_WIDTH, pcm_duration
+from metrics import get_counters, get_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VOSK_MODEL = 'models/vosk-model-small-ru-0.22'
+LANGUAGE = 'ru-RU'
+CHUNK_BYTES = SAMPLE_RATE * SAMPLE_WIDTH // 2  # полсекунды на AcceptWaveform
+
+# ========== ПРОЦЕСС ПУЛА VOSK ==========
+
+_worker_model = None
+_worker_rate = SAMPLE_RATE
+
+
+def _init_worker(model_path: str, sample_rate: int):
+    """Загрузка модели один раз на процесс"""
+    global _worker_model, _worker_rate
+    from vosk import Model, SetLogLevel
+
+    SetLogLevel(-1)
+    _worker_model = Model(model_path)
+    _worker_rate = sample_rate
+
+
+def _ping(delay: float) -> int:
+    # Держит процесс занятым, чтобы прогрев запустил все процессы пула
+    time.sleep(delay)
+    return os.getpid()
+
+
+def _recognize_in_worker(pcm: bytes) -> str:
+    from vosk import KaldiRecognizer
+
+    recognizer = KaldiRecognizer(_worker_model, _worker_rate)
+    view = memoryview(pcm)
+    for start in range(0, len(view), CHUNK_BYTES):
+        recognizer.AcceptWaveform(bytes(view[start:start + CHUNK_BYTES]))
+    return json.loads(recognizer.FinalResult()).get('text', '')
+
+
+# ========== ДВИЖКИ ==========
+
+class VoskEngine:
+    """Vosk в пуле процессов: распознавание не держит GIL бота и идет параллельно по ядрам"""
+
+    name = 'vosk'
+
+    def __init__(self, model_path: str = DEFAULT_VOSK_MODEL, workers: int = None, sample_rate: int = SAMPLE_RATE):
+        if not os.path.isdir(model_path):
+            raise FileNotFoundError(f"Модель Vosk не найдена: {model_path}")
+        self.model_path = model_path
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self.sample_rate = sample_rate
+        # spawn: у бота есть потоки (пул БД, шлюз модели), fork их не копирует корректно
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=_init_worker, initargs=(model_path, sample_rate))
+
+    def warm(self, timeout: float = 120.0):
+        """Запустить все процессы и загрузить модели заранее (первое сообщение не ждет загрузки)"""
+        started = time.perf_counter()
+        futures = [self._pool.submit(_ping, 0.2) for _ in range(self.workers)]
+        pids = {future.result(timeout) for future in futures}
+        logger.info(f"🎙️ Vosk: {len(pids)} процессов с моделью {self.model_path} за {time.perf_counter() - started:.1f} с")
+
+    async def transcribe(self, pcm: bytes) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(self._pool, _recognize_in_worker, pcm)
+        return text or None
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class GoogleEngine:
+    """recognize_google: сетевой запрос в потоке"""
+
+    name = 'google'
+
+    def __init__(self, language: str = LANGUAGE, sample_rate: int = SAMPLE_RATE):
+        import speech_recognition as sr
+
+        self.sr = sr
+        self.language = language
+        self.sample_rate = sample_rate
+        self.recognizer = sr.Recognizer()
+
+    def warm(self, timeout: float = 0.0):
+        pass
+
+    def _recognize(self, pcm: bytes) -> Optional[str]:
+        audio = self.sr.AudioData(pcm, self.sample_rate, SAMPLE_WIDTH)
+        try:
+            return self.recognizer.recognize_google(audio, language=self.language)
+        except self.sr.UnknownValueError:
+            return None
+
+    async def transcribe(self, pcm: bytes) -> Optional[str]:
+        return await asyncio.to_thread(self._recognize, pcm)
+
+    def close(self):
+        pass
+
+
+class SpeechRecognizer:
+    """Основной движок и запасные по порядку; замеры stt:<движок> и счетчик stt_fallbacks"""
+
+    def __init__(self, engines: List):
+        if not engines:
+            raise ValueError("Нужен хотя бы один движок распознавания")
+        self.engines = engines
+
+    @property
+    def name(self) -> str:
+        return '+'.join(engine.name for engine in self.engines)
+
+    def warm(self):
+        for engine in self.engines:
+            engine.warm()
+
+    async def transcribe(self, pcm: bytes) -> Optional[str]:
+        audio_seconds = pcm_duration(pcm)
+        for index, engine in enumerate(self.engines):
+            if index:
+                get_counters().add('stt_fallbacks', 1)
+            started = time.perf_counter()
+            try:
+                text = await engine.transcribe(pcm)
+            except Exception as e:
+                logger.error(f"❌ Ошибка распознавания ({engine.name}): {e}")
+                continue
+            seconds = time.perf_counter() - started
+            get_metrics().record(f'stt:{engine.name}', seconds)
+            if text:
+                logger.info(f"🎙️ Распознано ({engine.name}) за {seconds:.2f} с, "
+                            f"RTF {seconds / audio_seconds if audio_seconds else 0:.2f}")
+                return text
+            logger.warning(f"⚠️ Движок {engine.name} ничего не распознал")
+        return None
+
+    def close(self):
+        for engine in self.engines:
+            engine.close()
+
+
+def _create_engine(name: str):
+    if name == 'vosk':
+        workers = os.environ.get('STT_WORKERS')
+        return VoskEngine(os.environ.get('VOSK_MODEL', DEFAULT_VOSK_MODEL), int(workers) if workers else None)
+    if name == 'google':
+        return GoogleEngine()
+    raise ValueError(f"Неизвестный движок распознавания: {name}")
+
+
+_recognizer: Optional[SpeechRecognizer] = None
+_recognizer_lock = threading.Lock()
+
+
+def get_speech_recognizer() -> SpeechRecognizer:
+    """Общий распознаватель процесса (пул Vosk - один на процесс, прогревается при создании)"""
+    global _recognizer
+    with _recognizer_lock:
+        if _recognizer is None:
+            model_path = os.environ.get('VOSK_MODEL', DEFAULT_VOSK_MODEL)
+            primary = os.environ.get('STT_ENGINE') or ('vosk' if os.path.isdir(model_path) else 'google')
+            fallback = os.environ.get('STT_FALLBACK', 'google')
+
+            engines = []
+            for name in dict.fromkeys([primary] + ([fallback] if fallback != 'none' else [])):
+                engine = None
+                try:
+                    engine = _create_engine(name)
+                    engine.warm()
+                except Exception as e:
+                    # Пул без модели (BrokenProcessPool) не должен остаться основным движком
+                    logger.error(f"❌ Движок распознавания {name} недоступен: {e!r}")
+                    if engine is not None:
+                        engine.close()
+                    continue
+                engines.append(engine)
+
+            # Без рабочих движков - ValueError, следующий вызов попробует снова
+            recognizer = SpeechRecognizer(engines)
+            logger.info(f"🎙️ Распознавание речи: {recognizer.name}")
+            _recognizer = recognizer
+        return _recognizer
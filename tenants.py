@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from db_pool import db_connection, get_manager
+from migrations import ensure_schema
+
+logger = logging.getLogger(__name__)
+
+# shared   - одна база, данные разделены по restaurant_id
+# per_file - отдельный файл базы на каждый ресторан (tenants/restaurant_<id>.db)
+TENANT_MODES = ('shared', 'per_file')
+
+DEFAULT_CONFIG_PATH = 'tenants.json'
+
+
+class TenantContext:
+    """Ресторан, с которым работает бот или страница админки: его id и файл базы"""
+
+    __slots__ = ('restaurant_id', 'db_path')
+
+    def __init__(self, restaurant_id: int, db_path: str):
+        self.restaurant_id = restaurant_id
+        self.db_path = db_path
+
+    def __repr__(self):
+        return f"TenantContext(restaurant_id={self.restaurant_id}, db_path='{self.db_path}')"
+
+
+class TenantRouter:
+    """
+    Маршрутизация ресторанов
+    Токен бота -> ресторан -> TenantContext. В обоих режимах запросы одинаковые
+    (с restaurant_id), режим определяет только файл базы
+    """
+
+    def __init__(self, mode: str = 'shared', db_path: str = 'restaurant.db', tenants_dir: str = 'tenants',
+                 default_restaurant_id: int = 1, max_open_tenants: int = 128):
+        if mode not in TENANT_MODES:
+            raise ValueError(f"Неизвестный режим ресторанов: {mode}")
+        self.mode = mode
+        self.db_path = db_path
+        self.tenants_dir = tenants_dir
+        self.default_restaurant_id = default_restaurant_id
+        self.max_open_tenants = max_open_tenants  # per_file: у остальных файлов закрываем свободные соединения
+
+        self._bots: Dict[str, int] = {}
+        self._contexts: Dict[int, TenantContext] = {}
+        self._recent: 'OrderedDict[int, None]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, path: str = DEFAULT_CONFIG_PATH) -> 'TenantRouter':
+        """
+        Настройки из JSON:
+        {"mode": "shared", "db_path": "restaurant.db", "tenants_dir": "tenants",
+         "default_restaurant_id": 1, "bots": {"<telegram token>": 2}}
+        """
+        with open(path, encoding='utf-8') as file:
+            config = json.load(file)
+        router = cls(
+            config.get('mode', 'shared'),
+            config.get('db_path', 'restaurant.db'),
+            config.get('tenants_dir', 'tenants'),
+            config.get('default_restaurant_id', 1),
+            config.get('max_open_tenants', 128)
+        )
+        for bot_token, restaurant_id in config.get('bots', {}).items():
+            router.register_bot(bot_token, restaurant_id)
+        return router
+
+    def db_path_for(self, restaurant_id: int) -> str:
+        if self.mode == 'shared':
+            return self.db_path
+        return os.path.join(self.tenants_dir, f"restaurant_{restaurant_id}.db")
+
+    def get(self, restaurant_id: int) -> TenantContext:
+        """Контекст ресторана (схема базы проверяется один раз)"""
+        restaurant_id = int(restaurant_id)
+        context = self._contexts.get(restaurant_id)
+        if context is not None:
+            if self.mode == 'per_file':
+                self._touch(restaurant_id)
+            return context
+        with self._lock:
+            context = self._contexts.get(restaurant_id)
+            if context is None:
+                db_path = self.db_path_for(restaurant_id)
+                if self.mode == 'per_file':
+                    os.makedirs(self.tenants_dir, exist_ok=True)
+                ensure_schema(db_path)
+                context = TenantContext(restaurant_id, db_path)
+                self._contexts[restaurant_id] = context
+        if self.mode == 'per_file':
+            self._touch(restaurant_id)
+        return context
+
+    def _touch(self, restaurant_id: int):
+        """Давно не используемые файлы не держат открытые соединения (лимит дескрипторов)"""
+        closing = []
+        with self._lock:
+            self._recent[restaurant_id] = None
+            self._recent.move_to_end(restaurant_id)
+            while len(self._recent) > self.max_open_tenants:
+                idle_id, _ = self._recent.popitem(last=False)
+                closing.append(self._contexts[idle_id].db_path)
+        for db_path in closing:
+            get_manager(db_path).close_all()
+
+    def register_bot(self, bot_token: str, restaurant_id: int):
+        """Привязать токен Telegram-бота к ресторану"""
+        self._bots[bot_token] = int(restaurant_id)
+
+    def for_bot(self, bot_token: str) -> TenantContext:
+        """Ресторан бота (неизвестный токен - ресторан по умолчанию)"""
+        return self.get(self._bots.get(bot_token, self.default_restaurant_id))
+
+    def provision(self, restaurant_id: int, name: str, phone: str = '', address: str = '',
+                  working_hours: str = '') -> TenantContext:
+        """Создать ресторан, если его еще нет"""
+        context = self.get(restaurant_id)
+        with db_connection(context.db_path) as conn:
+            conn.execute("""
+                INSERT OR IGNORE INTO restaurants (id, name, phone, address, working_hours)
+                VALUES (?, ?, ?, ?, ?)
+            """, (context.restaurant_id, name, phone, address, working_hours))
+        return context
+
+    def exists(self, restaurant_id: int) -> bool:
+        """
+        Ресторан зарегистрирован: по умолчанию, привязан к боту, уже открыт
+        или есть в таблице restaurants своей базы. Файл базы не создается
+        """
+        restaurant_id = int(restaurant_id)
+        if restaurant_id == self.default_restaurant_id or restaurant_id in self._contexts \
+                or restaurant_id in self._bots.values():
+            return True
+        db_path = self.db_path_for(restaurant_id)
+        if not os.path.exists(db_path):
+            return False
+        with db_connection(db_path) as conn:
+            row = conn.execute("SELECT 1 FROM restaurants WHERE id = ?", (restaurant_id,)).fetchone()
+        return row is not None
+
+    def restaurant_ids(self) -> List[int]:
+        """Рестораны, к которым уже обращались, и рестораны ботов"""
+        return sorted(set(self._contexts) | set(self._bots.values()))
+
+
+_router: Optional[TenantRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> TenantRouter:
+    """
+    Общий маршрутизатор процесса
+    Берется из tenants.json (или файла из TENANTS_CONFIG), иначе - одна база restaurant.db
+    """
+    global _router
+    with _router_lock:
+        if _router is None:
+            path = os.environ.get('TENANTS_CONFIG', DEFAULT_CONFIG_PATH)
+            if os.path.exists(path):
+                _router = TenantRouter.from_config(path)
+                logger.info(f"🏢 Рестораны из {path}: режим {_router.mode}")
+            else:
+                _router = TenantRouter()
+        return _router
+
+
+def set_router(router: TenantRouter):
+    """Подменить маршрутизатор процесса (скрипты, бенчмарки)"""
+    global _router
+    with _router_lock:
+        _router = router
@@ -0,0 +1,107 @@
+"""
+Тест задержки event loop при параллельной работе с базой
+Пока один поток держит блокировку записи, 50 "пользователей" бронируют
+и читают меню. Синхронные вызовы останавливают весь loop на время ожидания,
+вызовы через async_db - нет
+
+    python test_event_loop_lag.py
+"""
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from async_db import AsyncProxy, run_db
+from database import RestaurantDatabase
+from db_pool import db_transaction
+from reservations import reserve_table
+
+USERS = 50
+LOCK_HOLD = 0.2      # сколько секунд "медленный писатель" держит блокировку
+TICK = 0.005
+
+
+def hold_write_lock(db_path: str, stop: threading.Event):
+    """Другой писатель (например, админка), который подолгу держит транзакцию"""
+    while not stop.is_set():
+        with db_transaction(db_path) as conn:
+            conn.execute("UPDATE restaurants SET name = name WHERE id = 1")
+            time.sleep(LOCK_HOLD)
+        time.sleep(0.01)
+
+
+async def measure_lag(stop: asyncio.Event, samples: list):
+    """Насколько позже запланированного просыпается корутина"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        samples.append(time.perf_counter() - started - TICK)
+
+
+async def user_session(db, db_path: str, user_no: int, use_executor: bool):
+    rng = random.Random(user_no)
+    args = (db_path, rng.randint(1, 4), f"Гость {user_no}", "+70000000000",
+            '2025-12-31', f"{rng.randint(12, 22)}:00", 2)
+    if use_executor:
+        await AsyncProxy(db).get_menu_items()
+        await run_db(reserve_table, *args)
+    else:
+        db.get_menu_items()
+        reserve_table(*args)
+
+
+async def run_scenario(db_path: str, use_executor: bool) -> list:
+    db = RestaurantDatabase(db_path)
+    db.cache.invalidate()
+
+    stop_writer = threading.Event()
+    writer = threading.Thread(target=hold_write_lock, args=(db_path, stop_writer))
+    writer.start()
+
+    samples = []
+    stop_ticker = asyncio.Event()
+    ticker = asyncio.create_task(measure_lag(stop_ticker, samples))
+    await asyncio.sleep(0.05)
+
+    await asyncio.gather(*(user_session(db, db_path, i, use_executor) for i in range(USERS)))
+
+    stop_ticker.set()
+    await ticker
+    stop_writer.set()
+    writer.join()
+    return samples
+
+
+def report(title: str, samples: list):
+    samples = sorted(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1] if len(samples) > 1 else samples[0]
+    print(f"{title}: тиков {len(samples)}, медиана {statistics.median(samples) * 1000:.1f} мс, "
+          f"p99 {p99 * 1000:.1f} мс, максимум {samples[-1] * 1000:.1f} мс")
+    return samples[-1]
+
+
+def main():
+    print("🧪 ТЕСТ ЗАДЕРЖКИ EVENT LOOP:")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'lag.db')
+        RestaurantDatabase(db_path)  # схема и демо-данные
+
+        blocking = asyncio.run(run_scenario(db_path, use_executor=False))
+        non_blocking = asyncio.run(run_scenario(db_path, use_executor=True))
+
+        worst_blocking = report("❌ Синхронные вызовы", blocking)
+        worst_non_blocking = report("✅ Через async_db", non_blocking)
+
+        if worst_non_blocking < LOCK_HOLD / 2 <= worst_blocking:
+            print("✅ Event loop не блокируется ожиданием SQLite")
+        else:
+            print("❌ Event loop блокируется")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,99 @@
+"""
+Тест изоляции кэша ответов
+Клиент А называет имя и телефон, затем спрашивает о часах работы; клиент Б
+с другой историей задает тот же вопрос и получает ответ из кэша. Модель
+нарочно повторяет данные клиента, если видит их в контексте, - в ответе
+для Б (и в закэшированном ответе А) их быть не должно. Ответ на "Да,
+давайте" - продолжение диалога: он строится по истории и не кэшируется
+
+    python test_response_cache.py
+"""
+import asyncio
+import os
+import tempfile
+from ai_brain import AIBrain
+from database import RestaurantDatabase
+from model_backends import Latency, ScriptedBackend, ScriptedModel, ScriptedReply
+
+QUESTION = "Какие у вас часы работы?"
+OFFER = "Бот: Свободен столик у окна на 19:00. Бронируем?"
+
+
+class LeakyModel(ScriptedModel):
+    """Запоминает контекст запроса, чтобы сценарий мог "проболтаться" о данных клиента"""
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        first = contents[0]
+        self.backend.context = first['parts'][0] if isinstance(first, dict) else str(first)
+        return super().generate_content(contents, stream=stream, **kwargs)
+
+
+class LeakyBackend(ScriptedBackend):
+
+    def __init__(self):
+        super().__init__(self.reply, latency=Latency(0.0), chunk_latency=Latency(0.0))
+        self.context = ''
+
+    def create_model(self, tools, system_instruction: str = None):
+        return LeakyModel(self, system_instruction)
+
+    def create_cached_model(self, tools, system_instruction: str, display_name: str, ttl_minutes: int):
+        return LeakyModel(self, system_instruction, cached=True), None
+
+    def reply(self, user_text: str, step: int, results):
+        if 'часы' not in user_text.lower():
+            return ScriptedReply("Приятно познакомиться!")
+        if step == 0:
+            return ScriptedReply(calls=[('get_restaurant_info', {})])
+        answer = "Мы работаем с 10:00 до 23:00."
+        for secret in ('Анна', '89161234567', 'дочери'):
+            if secret in self.context:
+                answer += f" {secret}"
+        return ScriptedReply(answer)
+
+
+async def run(brain: AIBrain):
+    intro = "Меня зовут Анна, мой телефон 89161234567"
+    await brain.process_message(1, intro, [])
+    answer_a = await brain.process_message(1, QUESTION, [f"Клиент: {intro}", "Бот: Приятно познакомиться!"])
+    answer_b = await brain.process_message(2, QUESTION, ["Клиент: У дочери день рождения", "Бот: Поздравляем!"])
+    await brain.process_message(3, "Да, давайте", ["Клиент: Нужен столик на вечер", OFFER])
+    return answer_a, answer_b, brain.backend.context
+
+
+def main():
+    print("🧪 ТЕСТ ИЗОЛЯЦИИ КЭША ОТВЕТОВ:")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'cache.db')
+        RestaurantDatabase(db_path)
+        brain = AIBrain('offline', db_path, backend=LeakyBackend(), use_fast_path=False, use_direct_booking=False)
+        answer_a, answer_b, follow_up_context = asyncio.run(run(brain))
+        stats = brain.response_cache.stats()
+        hits = stats['hits'] + stats['similar_hits']
+
+    print(f"Клиент А: {answer_a}")
+    print(f"Клиент Б: {answer_b}")
+
+    failed = False
+    for answer in (answer_a, answer_b):
+        if any(secret in answer for secret in ('Анна', '89161234567', 'дочери')):
+            print(f"❌ Данные клиента в общем ответе: {answer}")
+            failed = True
+    if hits != 1 or answer_a != answer_b:
+        print(f"❌ Клиент Б не получил ответ из кэша (попаданий: {hits})")
+        failed = True
+    if OFFER not in follow_up_context:
+        print("❌ Ответ на \"Да, давайте\" построен без истории диалога")
+        failed = True
+    if stats['entries'] != 1:
+        print(f"❌ В кэше не только вопрос о часах работы (записей: {stats['entries']})")
+        failed = True
+    if failed:
+        raise SystemExit(1)
+    print("✅ Ответ из кэша не зависит от истории и данных клиента, продолжение диалога не кэшируется")
+
+
+if __name__ == "__main__":
+    main()
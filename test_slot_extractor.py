@@ -0,0 +1,56 @@
+"""
+Тест разбора данных брони и решения о прямой брони
+Время с частью суток после слова "часов", вопросы о свободных столиках
+при уже собранных данных (не бронь) и явная просьба (бронь)
+
+    python test_slot_extractor.py
+"""
+from datetime import datetime
+from slot_extractor import extract_slots, should_book
+
+TODAY = datetime(2025, 6, 10)  # вторник
+
+EXTRACT_CASES = [
+    ("В 7 часов вечера", {'time': '19:00'}),
+    ("Завтра в 2 часа дня", {'date': '2025-06-11', 'time': '14:00'}),
+    ("В 12 часов ночи", {'time': '00:00'}),
+    ("В 9 утра", {'time': '09:00'}),
+    ("Нас будет 4 взрослых и 2 малыша", {'guests': 4}),
+    ("на 15 минут опоздаем", {}),
+]
+
+# Имя, телефон, дата, время и гости уже собраны, клиент просил бронь раньше
+COLLECTED = {'name': 'Анна', 'phone': '89161234567', 'date': '2099-06-11', 'time': '19:00', 'guests': 2, 'intent': True}
+
+BOOK_CASES = [
+    ("А есть свободный столик на 21:00?", False),
+    ("Столик на 19:00 свободен?", False),
+    ("Сколько стоит столик у окна в 20:00?", False),
+    ("Сколько стоит ужин на двоих?", False),
+    ("Забронируйте, пожалуйста", True),
+    ("Да, оформите", True),
+]
+
+
+def main():
+    print("🧪 ТЕСТ РАЗБОРА ДАННЫХ БРОНИ:")
+    print("=" * 60)
+
+    failed = False
+    for text, expected in EXTRACT_CASES:
+        got = {key: value for key, value in extract_slots(text, TODAY).items() if key != 'intent'}
+        if got != expected:
+            print(f"❌ {text!r}: {got}, ожидалось {expected}")
+            failed = True
+    for text, expected in BOOK_CASES:
+        got = should_book(text, COLLECTED, extract_slots(text, TODAY))
+        if got != expected:
+            print(f"❌ {text!r}: бронь {got}, ожидалось {expected}")
+            failed = True
+    if failed:
+        raise SystemExit(1)
+    print(f"✅ Разбор {len(EXTRACT_CASES)} реплик и решение о брони для {len(BOOK_CASES)} верны")
+
+
+if __name__ == "__main__":
+    main()
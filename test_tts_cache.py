@@ -0,0 +1,66 @@
+"""
+Тест отмены синтеза в кэше речи
+Сообщение, для которого синтезируется фраза, отменяется (клиент прервал
+ответ). Второе сообщение с той же фразой ждет этот синтез - оно не должно
+зависнуть, а должно синтезировать фразу само
+
+    python test_tts_cache.py
+"""
+import asyncio
+from tts_cache import TTSCache
+
+PHRASE = "Добро пожаловать! Чем могу помочь?"
+
+
+async def run():
+    cache = TTSCache(directory=None)
+    started = asyncio.Event()
+    calls = []
+
+    async def slow_synthesize(text: str) -> bytes:
+        calls.append(text)
+        started.set()
+        await asyncio.sleep(10)
+        return b'slow'
+
+    async def fast_synthesize(text: str) -> bytes:
+        calls.append(text)
+        return b'audio'
+
+    owner = asyncio.create_task(cache.get_or_synthesize(PHRASE, slow_synthesize))
+    await started.wait()
+    waiter = asyncio.create_task(cache.get_or_synthesize(PHRASE, fast_synthesize))
+    await asyncio.sleep(0)
+    owner.cancel()
+
+    try:
+        audio = await asyncio.wait_for(waiter, 2.0)
+    except asyncio.TimeoutError:
+        audio = None
+    return owner.cancelled(), audio, len(calls), dict(cache._pending)
+
+
+def main():
+    print("🧪 ТЕСТ ОТМЕНЫ СИНТЕЗА В КЭШЕ РЕЧИ:")
+    print("=" * 60)
+
+    owner_cancelled, audio, calls, pending = asyncio.run(run())
+    print(f"Синтезов: {calls}, ответ ожидающего: {audio!r}")
+
+    failed = False
+    if not owner_cancelled:
+        print("❌ Отмененный синтез не завершился отменой")
+        failed = True
+    if audio != b'audio':
+        print("❌ Ожидающий той же фразы завис или не получил аудио")
+        failed = True
+    if pending:
+        print(f"❌ Незавершенные синтезы остались в кэше: {len(pending)}")
+        failed = True
+    if failed:
+        raise SystemExit(1)
+    print("✅ Отмена синтеза не блокирует других ожидающих фразу")
+
+
+if __name__ == "__main__":
+    main()
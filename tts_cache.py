@@ -0,0 +1,295 @@
+"""
+Кэш синтезированной речи
+Ключ - хэш нормализованного текста, голоса, языка и формата, поэтому
+одинаковые фразы (приветствие, запасные фразы AITools, меню, сообщения об
+ошибках) синтезируются один раз. Два уровня:
+- память: LRU по суммарному размеру аудио
+- диск: файлы <каталог>/<2 символа ключа>/<ключ>.<формат>, размер каталога
+  ограничен, вытесняются давно не использованные (по mtime)
+
+Одновременные запросы одной фразы ждут один синтез.
+Настройка окружением (get_tts_cache):
+    TTS_CACHE_DIR=tts_cache
+    TTS_CACHE_MEMORY_MB=32
+    TTS_CACHE_DISK_MB=512
+"""
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+from metrics import get_counters, get_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = 'tts_cache'
+DEFAULT_MEMORY_BYTES = 32 * 1024 * 1024
+DEFAULT_DISK_BYTES = 512 * 1024 * 1024
+
+DEFAULT_VOICE = 'gtts'
+DEFAULT_LANGUAGE = 'ru'
+DEFAULT_FORMAT = 'mp3'
+
+
+def normalize_text(text: str) -> str:
+    """Один вид для одинаково звучащих фраз: NFC, пробелы схлопнуты"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def tts_key(text: str, voice: str = DEFAULT_VOICE, language: str = DEFAULT_LANGUAGE,
+            audio_format: str = DEFAULT_FORMAT) -> str:
+    payload = '\x00'.join((voice, language, audio_format, normalize_text(text)))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class TTSCache:
+    """Аудио по ключу tts_key: память (LRU) и диск с ограничением размера"""
+
+    def __init__(self, directory: Optional[str] = DEFAULT_CACHE_DIR, memory_bytes: int = DEFAULT_MEMORY_BYTES,
+                 disk_bytes: int = DEFAULT_DISK_BYTES):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+
+        self._memory: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._memory_size = 0
+        # Ключ -> (путь, размер), от давно не использованных к недавним
+        self._disk: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self._pending: Dict[str, asyncio.Future] = {}
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if directory:
+            self._scan_disk()
+
+    # ========== ПАМЯТЬ ==========
+
+    def _remember(self, key: str, audio: bytes):
+        if len(audio) > self.memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_size -= len(previous)
+            self._memory[key] = audio
+            self._memory_size += len(audio)
+            while self._memory_size > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    def _from_memory(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+            return audio
+
+    # ========== ДИСК ==========
+
+    def _scan_disk(self):
+        """Индекс файлов, оставшихся от прошлых запусков"""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, name.split('.', 1)[0], path, stat.st_size))
+        for _, key, path, size in sorted(files):
+            self._disk[key] = (path, size)
+            self._disk_size += size
+        if files:
+            logger.info(f"🔊 Кэш речи на диске: {len(files)} фраз, {self._disk_size / 1024 / 1024:.1f} МБ")
+        self._trim_disk()
+
+    def _path(self, key: str, audio_format: str) -> str:
+        return os.path.join(self.directory, key[:2], f'{key}.{audio_format}')
+
+    def _from_disk(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._disk.get(key)
+        if entry is None:
+            return None
+        try:
+            with open(entry[0], 'rb') as file:
+                audio = file.read()
+            os.utime(entry[0])
+        except OSError:
+            self._forget_disk(key)
+            return None
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+        return audio
+
+    def _write_disk(self, key: str, audio: bytes, audio_format: str):
+        path = self._path(key, audio_format)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, 'wb') as file:
+                file.write(audio)
+            # Атомарная замена: другой процесс бота не прочитает недописанный файл
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ Не удалось сохранить речь в кэш: {e}")
+            return
+        with self._lock:
+            previous = self._disk.pop(key, None)
+            if previous is not None:
+                self._disk_size -= previous[1]
+            self._disk[key] = (path, len(audio))
+            self._disk_size += len(audio)
+        self._trim_disk()
+
+    def _forget_disk(self, key: str):
+        with self._lock:
+            entry = self._disk.pop(key, None)
+            if entry is not None:
+                self._disk_size -= entry[1]
+
+    def _trim_disk(self):
+        evicted = []
+        with self._lock:
+            while self._disk_size > self.disk_bytes and self._disk:
+                _, (path, size) = self._disk.popitem(last=False)
+                self._disk_size -= size
+                evicted.append(path)
+        for path in evicted:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    # ========== ДОСТУП ==========
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Аудио из памяти или с диска (блокирующее чтение файла)"""
+        audio = self._from_memory(key)
+        if audio is not None:
+            self.memory_hits += 1
+            get_counters().add('tts_memory_hits', 1)
+            return audio
+        if self.directory:
+            audio = self._from_disk(key)
+            if audio is not None:
+                self.disk_hits += 1
+                get_counters().add('tts_disk_hits', 1)
+                self._remember(key, audio)
+                return audio
+        self.misses += 1
+        get_counters().add('tts_misses', 1)
+        return None
+
+    def put(self, key: str, audio: bytes, audio_format: str = DEFAULT_FORMAT):
+        self._remember(key, audio)
+        if self.directory:
+            self._write_disk(key, audio, audio_format)
+
+    async def get_or_synthesize(self, text: str, synthesize: Callable[[str], Awaitable[Optional[bytes]]],
+                                voice: str = DEFAULT_VOICE, language: str = DEFAULT_LANGUAGE,
+                                audio_format: str = DEFAULT_FORMAT) -> Optional[bytes]:
+        """Аудио фразы из кэша, иначе synthesize(text) и сохранение"""
+        started = time.perf_counter()
+        key = tts_key(text, voice, language, audio_format)
+
+        audio = self._from_memory(key)
+        if audio is not None:
+            self.memory_hits += 1
+            get_counters().add('tts_memory_hits', 1)
+            get_metrics().record('tts_cache_hit', time.perf_counter() - started)
+            return audio
+
+        pending = self._pending.get(key)
+        while pending is not None:
+            # Эта фраза уже читается с диска или синтезируется для другого сообщения
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise  # отменили само ожидание
+            # Синтез отменен вместе с сообщением, для которого он шел, - фраза нужна этому
+            pending = self._pending.get(key)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            audio = await asyncio.to_thread(self.get, key)
+            if audio is not None:
+                get_metrics().record('tts_cache_hit', time.perf_counter() - started)
+            else:
+                audio = await synthesize(text)
+                if audio:
+                    await asyncio.to_thread(self.put, key, audio, audio_format)
+                get_metrics().record('tts_synthesis', time.perf_counter() - started)
+            future.set_result(audio)
+        except Exception as e:
+            future.set_exception(e)
+            # Ошибку получат и ожидающие; если их нет, future не должна ругаться в логе
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                # Отмена (CancelledError - не Exception): ожидающие не должны зависнуть
+                future.cancel()
+            del self._pending[key]
+        return audio
+
+    async def warm(self, phrases: Iterable[str], synthesize: Callable[[str], Awaitable[Optional[bytes]]],
+                   voice: str = DEFAULT_VOICE, language: str = DEFAULT_LANGUAGE, audio_format: str = DEFAULT_FORMAT):
+        """Синтез известных фраз заранее (уже закэшированные только поднимаются в память)"""
+        started = time.perf_counter()
+        misses = self.misses
+        phrases = list(dict.fromkeys(phrase for phrase in phrases if phrase and phrase.strip()))
+        for phrase in phrases:
+            try:
+                await self.get_or_synthesize(phrase, synthesize, voice, language, audio_format)
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось подготовить фразу {phrase[:30]!r}: {e}")
+        logger.info(f"🔊 Кэш речи прогрет: {len(phrases)} фраз, синтезировано {self.misses - misses} "
+                    f"за {time.perf_counter() - started:.1f} с")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            memory_entries, disk_entries = len(self._memory), len(self._disk)
+            memory_size, disk_size = self._memory_size, self._disk_size
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_entries': memory_entries,
+            'memory_bytes': memory_size,
+            'disk_entries': disk_entries,
+            'disk_bytes': disk_size,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+        }
+
+
+_cache: Optional[TTSCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache() -> TTSCache:
+    """Общий кэш речи процесса"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTSCache(
+                os.environ.get('TTS_CACHE_DIR', DEFAULT_CACHE_DIR),
+                int(float(os.environ.get('TTS_CACHE_MEMORY_MB', DEFAULT_MEMORY_BYTES / 1024 / 1024)) * 1024 * 1024),
+                int(float(os.environ.get('TTS_CACHE_DISK_MB', DEFAULT_DISK_BYTES / 1024 / 1024)) * 1024 * 1024)
+            )
+        return _cache
@@ -2,12 +2,19 @@ import asyncio
 import logging
 import tempfile
 import os
+import time
 from telegram import Update
 from telegram.ext import Application, MessageHandler, filters, ContextTypes, CommandHandler
-import speech_recognition as sr
-from pydub import AudioSegment
 from gtts import gTTS
 from ai_brain import AIBrain
+from tenants import get_router
+from metrics import get_metrics
+from streaming import ProgressiveReply, SentenceSplitter, SpeechPipeline
+from audio_decode import AudioDecodeError, decode_to_pcm_async
+from stt_engines import get_speech_recognizer
+from tts_cache import DEFAULT_FORMAT, get_tts_cache
+from audio_encode import AudioEncodeError, encoder_available, get_opus_encoder
+from voice_file_ids import get_voice_file_ids
 
 # Настройка логирования
 logging.basicConfig(
@@ -22,14 +29,30 @@ class SmartVoiceBot:
     ИИ полностью управляет диалогом и принимает решения
     """
     
-    def __init__(self, telegram_token: str, gemini_key: str):
+    def __init__(self, telegram_token: str, gemini_key: str, tenant=None, stream_replies: bool = True):
         self.telegram_token = telegram_token
         
+        # Потоковый ответ: текст дописывается по мере генерации, первое предложение озвучивается сразу
+        self.stream_replies = stream_replies
+        
+        # Ресторан этого бота (по токену из tenants.json, иначе ресторан по умолчанию)
+        self.tenant = tenant or get_router().for_bot(telegram_token)
+        
         # Инициализируем AI Brain - мозг системы
-        self.ai_brain = AIBrain(gemini_key)
+        self.ai_brain = AIBrain(gemini_key, self.tenant.db_path, self.tenant.restaurant_id)
+        
+        # Распознавание речи (локальный движок в пуле процессов, Google - запасной)
+        self.stt = get_speech_recognizer()
+        
+        # Синтез речи через кэш: повторяющиеся фразы не синтезируются заново
+        self.tts_cache = get_tts_cache()
+        
+        # Ответ - голосовое OGG/Opus (MP3 от gTTS перекодируется в пуле ffmpeg); без ffmpeg с libopus - MP3
+        self.encoder = get_opus_encoder() if encoder_available() else None
+        self.voice_format = self.encoder.audio_format if self.encoder else DEFAULT_FORMAT
         
-        # Распознавание речи
-        self.recognizer = sr.Recognizer()
+        # Повторные голосовые ответы - по file_id, без новой загрузки аудио
+        self.voice_ids = get_voice_file_ids(self.tenant.db_path)
         
         print("🎤 Умный голосовой бот с AI Brain готов!")
         print("🧠 ИИ управляет всем процессом диалога")
@@ -41,7 +64,7 @@ class SmartVoiceBot:
         user_name = update.effective_user.first_name
         
         # Получаем приветствие через AI Brain
-        restaurant_info = self.ai_brain._get_restaurant_info()
+        restaurant_info = await self.ai_brain.get_restaurant_info_async()
         
         if restaurant_info.get("success"):
             greeting = restaurant_info.get("greeting", "Добро пожаловать!")
@@ -123,20 +146,23 @@ class SmartVoiceBot:
         """Обработка сообщения через AI Brain"""
         try:
             # Получаем историю диалогов
-            conversation_history = self.ai_brain.get_conversation_history(user_id)
+            conversation_history = await self.ai_brain.get_conversation_history_async(user_id)
             
-            # AI Brain принимает решения и действует
-            ai_response = await self.ai_brain.process_message(user_id, user_text, conversation_history)
+            if self.stream_replies:
+                ai_response = await self.stream_ai_response(update, user_id, user_text, conversation_history)
+            else:
+                # AI Brain принимает решения и действует
+                ai_response = await self.ai_brain.process_message(user_id, user_text, conversation_history)
+                
+                # Отправляем ответ пользователю
+                await update.message.reply_text(ai_response)
+                
+                # Создаем голосовой ответ
+                voice_response = await self.text_to_speech(ai_response)
+                if voice_response:
+                    await self.voice_ids.send(update.message, voice_response)
             
-            # Отправляем ответ пользователю
-            await update.message.reply_text(ai_response)
-            
-            # Создаем голосовой ответ
-            voice_response = await self.text_to_speech(ai_response)
-            if voice_response:
-                await update.message.reply_voice(voice=voice_response)
-            
-            # Сохраняем диалог
+            # Сохраняем диалог (только постановка в очередь фоновой записи)
             self.ai_brain.save_conversation(user_id, user_name, user_text, ai_response)
             
             logger.info(f"✅ AI Brain обработал сообщение для {user_name}")
@@ -145,36 +171,67 @@ class SmartVoiceBot:
             logger.error(f"❌ Ошибка AI Brain: {e}")
             await update.message.reply_text("😔 Произошла ошибка при обработке запроса. Попробуйте еще раз.")
     
+    async def stream_ai_response(self, update: Update, user_id: int, user_text: str,
+                                 conversation_history: list) -> str:
+        """
+        Потоковый ответ AI Brain
+        Сообщение дописывается по мере генерации, законченные предложения
+        уходят в озвучку: первое синтезируется, пока модель пишет остальное
+        """
+        started = time.perf_counter()
+        reply = ProgressiveReply(update.message)
+        splitter = SentenceSplitter()
+        speech = SpeechPipeline(self.text_to_speech, lambda audio: self.voice_ids.send(update.message, audio))
+        
+        pieces = []
+        
+        async def on_text(piece: str):
+            pieces.append(piece)
+            await reply.append(piece)
+            for sentence in splitter.feed(piece):
+                speech.add(sentence)
+        
+        ai_response = await self.ai_brain.process_message(user_id, user_text, conversation_history, on_text)
+        await reply.finish(ai_response)
+        
+        if ''.join(pieces) == ai_response:
+            rest = splitter.flush()
+        else:
+            # Без потока (ответ защиты от инъекций, ошибка до первого фрагмента), поток прерван
+            # или в нем был текст шага с вызовом функции - озвученное из потока заменяется ответом целиком
+            speech.discard()
+            rest = ai_response
+        if rest:
+            speech.add(rest)
+        await speech.finish()
+        
+        if speech.first_audio_at is not None:
+            first_audio = speech.first_audio_at - started
+            get_metrics().record('first_audio', first_audio)
+            logger.info(f"🔊 Первое аудио через {first_audio * 1000:.0f}мс")
+        return ai_response
+    
     async def speech_to_text(self, audio_data):
         """Распознавание речи"""
         try:
             logger.info("🔄 Распознаю речь...")
             
-            with tempfile.NamedTemporaryFile(suffix='.ogg', delete=False) as temp_file:
-                temp_file.write(audio_data)
-                temp_file_path = temp_file.name
+            # OGG/Opus -> PCM 16 кГц моно в памяти (ffmpeg через pipe, без временных файлов)
+            started = time.perf_counter()
+            pcm = await decode_to_pcm_async(audio_data)
+            get_metrics().record('audio_decode', time.perf_counter() - started)
             
-            # Конвертируем в WAV
-            audio = AudioSegment.from_ogg(temp_file_path)
-            wav_path = temp_file_path.replace('.ogg', '.wav')
-            audio.export(wav_path, format="wav")
-            
-            # Распознаем
-            with sr.AudioFile(wav_path) as source:
-                audio_data = self.recognizer.record(source)
-            
-            try:
-                text = self.recognizer.recognize_google(audio_data, language='ru-RU')
+            # Распознаем (движок из STT_ENGINE, при неудаче - запасной)
+            text = await self.stt.transcribe(pcm)
+            if text:
                 logger.info("🇷🇺 Распознано на русском языке")
-                return text
-            except sr.UnknownValueError:
+            else:
                 logger.warning("❌ Не удалось распознать речь")
-                return None
-            finally:
-                # Очищаем временные файлы
-                os.unlink(temp_file_path)
-                os.unlink(wav_path)
+            return text
             
+        except AudioDecodeError as e:
+            logger.error(f"❌ Не удалось декодировать голосовое сообщение: {e}")
+            return None
         except Exception as e:
             logger.error(f"❌ Ошибка распознавания речи: {e}")
             return None
@@ -185,33 +242,72 @@ class SmartVoiceBot:
             logger.info("🔊 Создаю голосовой ответ...")
             
             # Очищаем текст от эмодзи для лучшего синтеза
-            clean_text = ''.join(char for char in text if ord(char) < 0x1F600 or ord(char) > 0x1F64F)
+            clean_text = self._speech_text(text)
             
-            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
-                temp_file_path = temp_file.name
+            # Синтез в отдельном потоке (повторные фразы - из кэша): пока озвучивается первое предложение,
+            # поток ответа продолжает читаться
+            try:
+                return await self.tts_cache.get_or_synthesize(clean_text, self._synthesize_async,
+                                                             audio_format=self.voice_format)
+            except AudioEncodeError as e:
+                # Лучше MP3, чем ответ без голоса (в кэше - под ключом MP3, не OGG/Opus)
+                logger.warning(f"⚠️ Не удалось перекодировать в OGG/Opus, отправляю MP3: {e}")
+                return await self.tts_cache.get_or_synthesize(clean_text, self._synthesize_mp3,
+                                                             audio_format=DEFAULT_FORMAT)
             
+        except Exception as e:
+            logger.error(f"❌ Ошибка синтеза речи: {e}")
+            return None
+    
+    @staticmethod
+    def _speech_text(text: str) -> str:
+        return ''.join(char for char in text if ord(char) < 0x1F600 or ord(char) > 0x1F64F)
+    
+    async def _synthesize_mp3(self, clean_text: str) -> bytes:
+        return await asyncio.to_thread(self._synthesize, clean_text)
+    
+    async def _synthesize_async(self, clean_text: str) -> bytes:
+        mp3 = await self._synthesize_mp3(clean_text)
+        if self.encoder is None:
+            return mp3
+        return await self.encoder.encode(mp3)
+    
+    @staticmethod
+    def _synthesize(clean_text: str) -> bytes:
+        """gTTS в MP3 (блокирующий вызов)"""
+        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
+            temp_file_path = temp_file.name
+        
+        try:
             # Создаем голос
             tts = gTTS(text=clean_text, lang='ru', slow=False)
             tts.save(temp_file_path)
             
             # Читаем файл
             with open(temp_file_path, 'rb') as audio_file:
-                audio_data = audio_file.read()
-            
+                return audio_file.read()
+        finally:
             # Очищаем временный файл
             os.unlink(temp_file_path)
-            
-            return audio_data
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка синтеза речи: {e}")
-            return None
+    
+    async def on_startup(self, application):
+        """Прогрев кэша речи в фоне: бот начинает отвечать, не дожидаясь синтеза"""
+        self._warm_task = asyncio.create_task(self.warm_speech())
+    
+    async def warm_speech(self):
+        """Заранее озвучить постоянные фразы: приветствие и запасные ответы AITools"""
+        restaurant_info = await self.ai_brain.get_restaurant_info_async()
+        phrases = [restaurant_info.get("greeting")] if restaurant_info.get("success") else []
+        for situation_phrases in self.ai_brain.ai_tools.fallback_phrases.values():
+            phrases.extend(situation_phrases)
+        await self.tts_cache.warm([self._speech_text(phrase) for phrase in phrases if phrase], self._synthesize_async,
+                                  audio_format=self.voice_format)
     
     def run(self):
         """Запуск бота"""
         print("🚀 Запускаю умный голосовой бот с AI Brain...")
         
-        application = Application.builder().token(self.telegram_token).build()
+        application = Application.builder().token(self.telegram_token).post_init(self.on_startup).build()
         
         # Обработчики
         application.add_handler(CommandHandler("start", self.start_command))
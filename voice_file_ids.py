@@ -0,0 +1,132 @@
+"""
+Повторная отправка голосовых ответов по file_id
+Telegram возвращает file_id загруженного голосового; по нему то же аудио
+отправляется снова без загрузки байтов. Ключ - бот (file_id действует
+только для бота, который загрузил файл) и SHA-256 содержимого аудио, поэтому
+измененное аудио (другой текст, голос, формат) получает новый хэш и
+загружается заново. Соответствия хранятся в voice_file_ids (запись через
+журнал) и переживают перезапуск
+"""
+import hashlib
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+from async_db import run_db
+from db_pool import db_connection
+from log_writer import get_log_writer, utc_timestamp
+from metrics import get_counters, get_metrics
+from migrations import ensure_schema
+
+logger = logging.getLogger(__name__)
+
+FILE_ID_COLUMNS = ('bot_id', 'audio_hash', 'file_id', 'size', 'updated_at')
+
+
+def audio_hash(audio: bytes) -> str:
+    return hashlib.sha256(audio).hexdigest()
+
+
+class VoiceFileIds:
+    """Хэш аудио -> file_id по ботам (в памяти, загружается из базы один раз на бота)"""
+
+    def __init__(self, db_path: str = 'restaurant.db', max_entries: int = 20000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        ensure_schema(db_path)
+        self.log_writer = get_log_writer(db_path)
+
+        self._bots: Dict[int, 'OrderedDict[str, str]'] = {}
+        self._lock = threading.Lock()
+
+    def load(self, bot_id: int):
+        """Соответствия бота из базы (блокирующий - через run_db)"""
+        if bot_id in self._bots:
+            return
+        self.log_writer.flush()
+        with db_connection(self.db_path) as conn:
+            rows = conn.execute("""
+                SELECT audio_hash, file_id FROM voice_file_ids
+                WHERE bot_id = ? ORDER BY updated_at DESC LIMIT ?
+            """, (bot_id, self.max_entries)).fetchall()
+        with self._lock:
+            if bot_id not in self._bots:
+                # От давних к недавним: вытесняются самые старые
+                self._bots[bot_id] = OrderedDict(reversed(rows))
+                logger.info(f"📎 file_id голосовых бота {bot_id}: {len(rows)}")
+
+    def get(self, bot_id: int, key: str) -> Optional[str]:
+        with self._lock:
+            file_ids = self._bots.get(bot_id)
+            file_id = file_ids.get(key) if file_ids is not None else None
+            if file_id is not None:
+                file_ids.move_to_end(key)
+            return file_id
+
+    def remember(self, bot_id: int, key: str, file_id: str, size: int = 0):
+        with self._lock:
+            file_ids = self._bots.setdefault(bot_id, OrderedDict())
+            file_ids[key] = file_id
+            file_ids.move_to_end(key)
+            while len(file_ids) > self.max_entries:
+                file_ids.popitem(last=False)
+        # Та же строка по (bot_id, audio_hash) заменяется: новый file_id вытесняет недействительный
+        self.log_writer.write('voice_file_ids', FILE_ID_COLUMNS, (bot_id, key, file_id, size, utc_timestamp()))
+
+    def forget(self, bot_id: int, key: str):
+        with self._lock:
+            file_ids = self._bots.get(bot_id)
+            if file_ids is not None:
+                file_ids.pop(key, None)
+
+    async def send(self, message, audio: bytes, **kwargs):
+        """
+        message.reply_voice: по file_id, если это аудио уже отправлялось,
+        иначе загрузка и запоминание file_id. Недействительный file_id
+        (файл удален на стороне Telegram) заменяется новой загрузкой
+        """
+        from telegram.error import BadRequest
+
+        bot_id = message.get_bot().id
+        key = audio_hash(audio)
+        if bot_id not in self._bots:
+            await run_db(self.load, bot_id)
+
+        file_id = self.get(bot_id, key)
+        if file_id is not None:
+            started = time.perf_counter()
+            try:
+                sent = await message.reply_voice(voice=file_id, **kwargs)
+                get_metrics().record('voice_send_file_id', time.perf_counter() - started)
+                get_counters().add('voice_file_id_hits', 1)
+                return sent
+            except BadRequest as e:
+                logger.warning(f"⚠️ file_id голосового недействителен, загружаю заново: {e}")
+                self.forget(bot_id, key)
+
+        started = time.perf_counter()
+        sent = await message.reply_voice(voice=audio, **kwargs)
+        get_metrics().record('voice_send_upload', time.perf_counter() - started)
+        get_counters().add('voice_upload_bytes', len(audio))
+        # MP3 без OGG/Opus Telegram может сохранить как аудиофайл, а не голосовое
+        attachment = sent and (sent.voice or sent.audio or sent.document)
+        if attachment:
+            self.remember(bot_id, key, attachment.file_id, len(audio))
+        return sent
+
+
+_stores: Dict[str, VoiceFileIds] = {}
+_stores_lock = threading.Lock()
+
+
+def get_voice_file_ids(db_path: str = 'restaurant.db') -> VoiceFileIds:
+    """Общее хранилище file_id для файла базы (одно на процесс)"""
+    key = os.path.abspath(db_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = VoiceFileIds(db_path)
+            _stores[key] = store
+        return store
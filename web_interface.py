@@ -1,51 +1,66 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, abort
 from database import RestaurantDatabase
-import sqlite3
+from db_pool import db_connection
+from tenants import get_router
 import os
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # Замените на случайную строку
 
 # Подключаем базу данных
-db = RestaurantDatabase()
+router = get_router()
+DB_PATH = router.get(router.default_restaurant_id).db_path
+db = RestaurantDatabase(DB_PATH)
+
+def current_tenant():
+    """
+    Ресторан админки: ?restaurant_id=N переключает, выбор хранится в сессии
+    Неизвестный ресторан - 404 (в режиме per_file иначе создавался бы файл базы)
+    """
+    if request.args.get('restaurant_id', '').isdigit():
+        restaurant_id = int(request.args['restaurant_id'])
+        if not router.exists(restaurant_id):
+            abort(404)
+        session['restaurant_id'] = restaurant_id
+    return router.get(session.get('restaurant_id', router.default_restaurant_id))
 
 @app.route('/')
 def dashboard():
     """Главная страница - дашборд ресторана"""
+    tenant = current_tenant()
     # Прямое подключение к базе для получения всех данных
-    conn = sqlite3.connect('restaurant.db')
-    cursor = conn.cursor()
-    
-    # Получаем данные ресторана включая новые поля
-    cursor.execute("SELECT name, phone, address, working_hours, greeting_message, ai_personality FROM restaurants WHERE id = 1")
-    restaurant_data = cursor.fetchone()
-    
-    # Получаем меню
-    cursor.execute("SELECT category, name, description, price FROM menu_items WHERE restaurant_id = 1")
-    menu_items = cursor.fetchall()
-    
-    # Получаем сводку по столикам
-    cursor.execute("""
-        SELECT location_type, COUNT(*), SUM(seats_count)
-        FROM tables 
-        WHERE restaurant_id = 1 AND status = 'active'
-        GROUP BY location_type
-    """)
-    tables_summary = cursor.fetchall()
-    
-    # Получаем последние бронирования
-    cursor.execute("""
-        SELECT b.customer_name, b.booking_date, b.booking_time, b.guests_count, 
-               b.status, t.table_number, t.location_type
-        FROM bookings b
-        LEFT JOIN tables t ON b.table_id = t.id
-        WHERE b.restaurant_id = 1 
-        ORDER BY b.created_at DESC 
-        LIMIT 5
-    """)
-    recent_bookings = cursor.fetchall()
-    
-    conn.close()
+    with db_connection(tenant.db_path) as conn:
+        cursor = conn.cursor()
+        
+        # Получаем данные ресторана включая новые поля
+        cursor.execute("SELECT name, phone, address, working_hours, greeting_message, ai_personality FROM restaurants WHERE id = ?", (tenant.restaurant_id,))
+        restaurant_data = cursor.fetchone()
+        
+        # Получаем меню
+        cursor.execute("SELECT category, name, description, price FROM menu_items WHERE restaurant_id = ?", (tenant.restaurant_id,))
+        menu_items = cursor.fetchall()
+        
+        # Получаем сводку по столикам
+        cursor.execute("""
+            SELECT location_type, COUNT(*), SUM(seats_count)
+            FROM tables 
+            WHERE restaurant_id = ? AND status = 'active'
+            GROUP BY location_type
+        """, (tenant.restaurant_id,))
+        tables_summary = cursor.fetchall()
+        
+        # Получаем последние бронирования
+        cursor.execute("""
+            SELECT b.customer_name, b.booking_date, b.booking_time, b.guests_count, 
+                   b.status, t.table_number, t.location_type
+            FROM bookings b
+            LEFT JOIN tables t ON b.table_id = t.id
+            WHERE b.restaurant_id = ? 
+            ORDER BY b.created_at DESC 
+            LIMIT 5
+        """, (tenant.restaurant_id,))
+        recent_bookings = cursor.fetchall()
+        
     
     if not restaurant_data:
         flash('Ресторан не найден в базе данных', 'error')
@@ -85,47 +100,47 @@ def dashboard():
 @app.route('/tables')
 def tables_list():
     """Список всех столиков С ПРАВИЛЬНОЙ СТАТИСТИКОЙ"""
-    conn = sqlite3.connect('restaurant.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT id, table_number, seats_count, location_type, description, status
-        FROM tables 
-        WHERE restaurant_id = 1 
-        ORDER BY CAST(table_number AS INTEGER)
-    """)
-    
-    tables = cursor.fetchall()
-    
-    # Группируем по типу расположения И считаем статистику
-    tables_by_location = {}
-    total_tables = 0
-    total_seats = 0
-    
-    for table in tables:
-        table_id, number, seats, location, description, status = table
-        
-        # Считаем статистику
-        total_tables += 1
-        total_seats += seats
-        
-        # Группируем
-        if location not in tables_by_location:
-            tables_by_location[location] = []
-        
-        tables_by_location[location].append({
-            'id': table_id,
-            'number': number,
-            'seats': seats,
-            'location': location,
-            'description': description,
-            'status': status
-        })
-    
-    # Рассчитываем среднее
-    average_seats = round(total_seats / total_tables, 1) if total_tables > 0 else 0
-    
-    conn.close()
+    tenant = current_tenant()
+    with db_connection(tenant.db_path) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT id, table_number, seats_count, location_type, description, status
+            FROM tables 
+            WHERE restaurant_id = ? 
+            ORDER BY CAST(table_number AS INTEGER)
+        """, (tenant.restaurant_id,))
+        
+        tables = cursor.fetchall()
+        
+        # Группируем по типу расположения И считаем статистику
+        tables_by_location = {}
+        total_tables = 0
+        total_seats = 0
+        
+        for table in tables:
+            table_id, number, seats, location, description, status = table
+            
+            # Считаем статистику
+            total_tables += 1
+            total_seats += seats
+            
+            # Группируем
+            if location not in tables_by_location:
+                tables_by_location[location] = []
+            
+            tables_by_location[location].append({
+                'id': table_id,
+                'number': number,
+                'seats': seats,
+                'location': location,
+                'description': description,
+                'status': status
+            })
+        
+        # Рассчитываем среднее
+        average_seats = round(total_seats / total_tables, 1) if total_tables > 0 else 0
+        
     
     # Формируем статистику
     stats = {
@@ -142,29 +157,27 @@ def tables_list():
 @app.route('/add_table', methods=['GET', 'POST'])
 def add_table():
     """Добавление нового столика"""
+    tenant = current_tenant()
     if request.method == 'POST':
         table_number = request.form['table_number']
         seats_count = int(request.form['seats_count'])
         location_type = request.form['location_type']
         description = request.form['description']
         
-        conn = sqlite3.connect('restaurant.db')
-        cursor = conn.cursor()
-        
-        # Проверяем что номер столика не занят
-        cursor.execute("SELECT COUNT(*) FROM tables WHERE table_number = ? AND restaurant_id = 1", (table_number,))
-        if cursor.fetchone()[0] > 0:
-            flash(f'Столик №{table_number} уже существует', 'error')
-            conn.close()
-            return redirect(url_for('add_table'))
-        
-        cursor.execute("""
-            INSERT INTO tables (restaurant_id, table_number, seats_count, location_type, description, status)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (1, table_number, seats_count, location_type, description, 'active'))   
-        
-        conn.commit()
-        conn.close()
+        with db_connection(tenant.db_path) as conn:
+            cursor = conn.cursor()
+            
+            # Проверяем что номер столика не занят
+            cursor.execute("SELECT COUNT(*) FROM tables WHERE table_number = ? AND restaurant_id = ?", (table_number, tenant.restaurant_id))
+            if cursor.fetchone()[0] > 0:
+                flash(f'Столик №{table_number} уже существует', 'error')
+                return redirect(url_for('add_table'))
+            
+            cursor.execute("""
+                INSERT INTO tables (restaurant_id, table_number, seats_count, location_type, description, status)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (tenant.restaurant_id, table_number, seats_count, location_type, description, 'active'))   
+            
         
         flash(f'Столик №{table_number} успешно добавлен!', 'success')
         return redirect(url_for('tables_list'))
@@ -174,6 +187,7 @@ def add_table():
 @app.route('/edit_table/<int:table_id>', methods=['GET', 'POST'])
 def edit_table(table_id):
     """Редактирование столика"""
+    tenant = current_tenant()
     if request.method == 'POST':
         table_number = request.form['table_number']
         seats_count = int(request.form['seats_count'])
@@ -181,27 +195,24 @@ def edit_table(table_id):
         description = request.form['description']
         status = request.form['status']
         
-        conn = sqlite3.connect('restaurant.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            UPDATE tables 
-            SET table_number=?, seats_count=?, location_type=?, description=?, status=?
-            WHERE id=? AND restaurant_id=1
-        """, (table_number, seats_count, location_type, description, status, table_id))
-        
-        conn.commit()
-        conn.close()
+        with db_connection(tenant.db_path) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                UPDATE tables 
+                SET table_number=?, seats_count=?, location_type=?, description=?, status=?
+                WHERE id=? AND restaurant_id=?
+            """, (table_number, seats_count, location_type, description, status, table_id, tenant.restaurant_id))
+            
         
         flash(f'Столик №{table_number} обновлен!', 'success')
         return redirect(url_for('tables_list'))
     
     # GET запрос - получаем данные столика
-    conn = sqlite3.connect('restaurant.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM tables WHERE id = ? AND restaurant_id = 1", (table_id,))
-    table_data = cursor.fetchone()
-    conn.close()
+    with db_connection(tenant.db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM tables WHERE id = ? AND restaurant_id = ?", (table_id, tenant.restaurant_id))
+        table_data = cursor.fetchone()
     
     if not table_data:
         flash('Столик не найден', 'error')
@@ -219,31 +230,33 @@ def edit_table(table_id):
 @app.route('/delete_table/<int:table_id>')
 def delete_table(table_id):
     """Удаление столика"""
-    conn = sqlite3.connect('restaurant.db')
-    cursor = conn.cursor()
-    
-    # Проверяем есть ли активные бронирования на этот столик
-    cursor.execute("""
-        SELECT COUNT(*) FROM bookings 
-        WHERE table_id = ? AND status NOT IN ('отменено', 'завершено')
-    """, (table_id,))
-    
-    active_bookings = cursor.fetchone()[0]
-    
-    if active_bookings > 0:
-        flash(f'Нельзя удалить столик - есть {active_bookings} активных бронирований', 'error')
-        conn.close()
-        return redirect(url_for('tables_list'))
-    
-    # Получаем номер столика для сообщения
-    cursor.execute("SELECT table_number FROM tables WHERE id = ?", (table_id,))
-    table_number = cursor.fetchone()[0]
-    
-    # Удаляем столик
-    cursor.execute("DELETE FROM tables WHERE id = ? AND restaurant_id = 1", (table_id,))
-    
-    conn.commit()
-    conn.close()
+    tenant = current_tenant()
+    with db_connection(tenant.db_path) as conn:
+        cursor = conn.cursor()
+        
+        # Проверяем есть ли активные бронирования на этот столик
+        cursor.execute("""
+            SELECT COUNT(*) FROM bookings 
+            WHERE table_id = ? AND status NOT IN ('отменено', 'завершено')
+        """, (table_id,))
+        
+        active_bookings = cursor.fetchone()[0]
+        
+        if active_bookings > 0:
+            flash(f'Нельзя удалить столик - есть {active_bookings} активных бронирований', 'error')
+            return redirect(url_for('tables_list'))
+        
+        # Получаем номер столика для сообщения
+        cursor.execute("SELECT table_number FROM tables WHERE id = ? AND restaurant_id = ?", (table_id, tenant.restaurant_id))
+        table_row = cursor.fetchone()
+        if not table_row:
+            flash('Столик не найден', 'error')
+            return redirect(url_for('tables_list'))
+        table_number = table_row[0]
+        
+        # Удаляем столик
+        cursor.execute("DELETE FROM tables WHERE id = ? AND restaurant_id = ?", (table_id, tenant.restaurant_id))
+        
     
     flash(f'Столик №{table_number} удален', 'success')
     return redirect(url_for('tables_list'))
@@ -253,6 +266,7 @@ def delete_table(table_id):
 @app.route('/edit_restaurant', methods=['GET', 'POST'])
 def edit_restaurant():
     """Редактирование информации о ресторане"""
+    tenant = current_tenant()
     if request.method == 'POST':
         name = request.form['name']
         phone = request.form['phone']
@@ -260,27 +274,24 @@ def edit_restaurant():
         working_hours = request.form['working_hours']
         
         # Прямое обновление через SQLite
-        conn = sqlite3.connect('restaurant.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            UPDATE restaurants 
-            SET name=?, phone=?, address=?, working_hours=?
-            WHERE id=1
-        """, (name, phone, address, working_hours))
-        
-        conn.commit()
-        conn.close()
+        with db_connection(tenant.db_path) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                UPDATE restaurants 
+                SET name=?, phone=?, address=?, working_hours=?
+                WHERE id=?
+            """, (name, phone, address, working_hours, tenant.restaurant_id))
+            
         
         flash('Информация о ресторане обновлена!', 'success')
         return redirect(url_for('dashboard'))
     
     # GET запрос - получаем данные для формы
-    conn = sqlite3.connect('restaurant.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT name, phone, address, working_hours FROM restaurants WHERE id = 1")
-    restaurant_data = cursor.fetchone()
-    conn.close()
+    with db_connection(tenant.db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, phone, address, working_hours FROM restaurants WHERE id = ?", (tenant.restaurant_id,))
+        restaurant_data = cursor.fetchone()
     
     if not restaurant_data:
         flash('Ресторан не найден', 'error')
@@ -298,32 +309,30 @@ def edit_restaurant():
 @app.route('/bot_settings', methods=['GET', 'POST'])
 def bot_settings():
     """Настройки бота"""
+    tenant = current_tenant()
     if request.method == 'POST':
         greeting_message = request.form['greeting_message']
         ai_personality = request.form['ai_personality']
         
         # Прямое обновление через SQLite
-        conn = sqlite3.connect('restaurant.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            UPDATE restaurants 
-            SET greeting_message=?, ai_personality=?
-            WHERE id=1
-        """, (greeting_message, ai_personality))
-        
-        conn.commit()
-        conn.close()
+        with db_connection(tenant.db_path) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                UPDATE restaurants 
+                SET greeting_message=?, ai_personality=?
+                WHERE id=?
+            """, (greeting_message, ai_personality, tenant.restaurant_id))
+            
         
         flash('Настройки бота обновлены!', 'success')
         return redirect(url_for('dashboard'))
     
     # GET запрос - показываем форму
-    conn = sqlite3.connect('restaurant.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT greeting_message, ai_personality FROM restaurants WHERE id = 1")
-    bot_data = cursor.fetchone()
-    conn.close()
+    with db_connection(tenant.db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT greeting_message, ai_personality FROM restaurants WHERE id = ?", (tenant.restaurant_id,))
+        bot_data = cursor.fetchone()
     
     if not bot_data:
         flash('Ресторан не найден', 'error')
@@ -339,12 +348,12 @@ def bot_settings():
 @app.route('/menu')
 def menu_list():
     """Список меню"""
+    tenant = current_tenant()
     # Используем прямой SQL запрос
-    conn = sqlite3.connect('restaurant.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT category, name, description, price FROM menu_items WHERE restaurant_id = 1")
-    menu_items = cursor.fetchall()
-    conn.close()
+    with db_connection(tenant.db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT category, name, description, price FROM menu_items WHERE restaurant_id = ?", (tenant.restaurant_id,))
+        menu_items = cursor.fetchall()
     
     # Группируем по категориям
     menu_by_category = {}
@@ -362,22 +371,21 @@ def menu_list():
 @app.route('/add_menu_item', methods=['GET', 'POST'])
 def add_menu_item():
     """Добавление нового блюда"""
+    tenant = current_tenant()
     if request.method == 'POST':
         category = request.form['category']
         name = request.form['name']
         description = request.form['description']
         price = float(request.form['price'])
         
-        conn = sqlite3.connect('restaurant.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO menu_items (restaurant_id, category, name, description, price)
-            VALUES (?, ?, ?, ?, ?)
-        """, (1, category, name, description, price))   
-        
-        conn.commit()
-        conn.close()
+        with db_connection(tenant.db_path) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                INSERT INTO menu_items (restaurant_id, category, name, description, price)
+                VALUES (?, ?, ?, ?, ?)
+            """, (tenant.restaurant_id, category, name, description, price))   
+            
         
         flash(f'Блюдо "{name}" добавлено в меню!', 'success')
         return redirect(url_for('menu_list'))
@@ -387,33 +395,31 @@ def add_menu_item():
 @app.route('/edit_menu_item/<item_name>', methods=['GET', 'POST'])
 def edit_menu_item(item_name):
     """Редактирование блюда"""
+    tenant = current_tenant()
     if request.method == 'POST':
         category = request.form['category']
         name = request.form['name']
         description = request.form['description']
         price = float(request.form['price'])
         
-        conn = sqlite3.connect('restaurant.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            UPDATE menu_items 
-            SET category=?, name=?, description=?, price=?
-            WHERE name=?
-        """, (category, name, description, price, item_name))
-        
-        conn.commit()
-        conn.close()
+        with db_connection(tenant.db_path) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                UPDATE menu_items 
+                SET category=?, name=?, description=?, price=?
+                WHERE name=? AND restaurant_id=?
+            """, (category, name, description, price, item_name, tenant.restaurant_id))
+            
         
         flash(f'Блюдо обновлено!', 'success')
         return redirect(url_for('menu_list'))
     
     # GET запрос - получаем данные блюда
-    conn = sqlite3.connect('restaurant.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM menu_items WHERE name = ?", (item_name,))
-    item_data = cursor.fetchone()
-    conn.close()
+    with db_connection(tenant.db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM menu_items WHERE name = ? AND restaurant_id = ?", (item_name, tenant.restaurant_id))
+        item_data = cursor.fetchone()
     
     if not item_data:
         flash('Блюдо не найдено', 'error')
@@ -429,13 +435,12 @@ def edit_menu_item(item_name):
 @app.route('/delete_menu_item/<item_name>')
 def delete_menu_item(item_name):
     """Удаление блюда"""
-    conn = sqlite3.connect('restaurant.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("DELETE FROM menu_items WHERE name = ?", (item_name,))
-    
-    conn.commit()
-    conn.close()
+    tenant = current_tenant()
+    with db_connection(tenant.db_path) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("DELETE FROM menu_items WHERE name = ? AND restaurant_id = ?", (item_name, tenant.restaurant_id))
+        
     
     flash(f'Блюдо "{item_name}" удалено из меню', 'success')
     return redirect(url_for('menu_list'))
@@ -443,33 +448,32 @@ def delete_menu_item(item_name):
 @app.route('/bookings')
 def bookings_list():
     """Список всех бронирований С УКАЗАНИЕМ СТОЛИКОВ"""
-    conn = sqlite3.connect('restaurant.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT b.id, b.customer_name, b.customer_phone, b.booking_date, b.booking_time, 
-               b.guests_count, b.status, b.notes, b.created_at, b.special_requests,
-               t.table_number, t.location_type, t.seats_count
-        FROM bookings b
-        LEFT JOIN tables t ON b.table_id = t.id
-        WHERE b.restaurant_id = 1 
-        ORDER BY b.booking_date DESC, b.booking_time DESC
-    """)
-    
-    bookings = cursor.fetchall()
-    conn.close()
+    tenant = current_tenant()
+    with db_connection(tenant.db_path) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT b.id, b.customer_name, b.customer_phone, b.booking_date, b.booking_time, 
+                   b.guests_count, b.status, b.notes, b.created_at, b.special_requests,
+                   t.table_number, t.location_type, t.seats_count
+            FROM bookings b
+            LEFT JOIN tables t ON b.table_id = t.id
+            WHERE b.restaurant_id = ? 
+            ORDER BY b.booking_date DESC, b.booking_time DESC
+        """, (tenant.restaurant_id,))
+        
+        bookings = cursor.fetchall()
     
     return render_template('bookings.html', bookings=bookings)
 
 @app.route('/booking/<int:booking_id>/status/<new_status>')
 def update_booking_status(booking_id, new_status):
     """Изменение статуса бронирования"""
-    conn = sqlite3.connect('restaurant.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("UPDATE bookings SET status = ? WHERE id = ?", (new_status, booking_id))
-    conn.commit()
-    conn.close()
+    tenant = current_tenant()
+    with db_connection(tenant.db_path) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("UPDATE bookings SET status = ? WHERE id = ? AND restaurant_id = ?", (new_status, booking_id, tenant.restaurant_id))
     
     flash(f'Статус бронирования изменен на "{new_status}"', 'success')
     return redirect(url_for('bookings_list'))